@@ -2,9 +2,10 @@ from datetime import datetime
 from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
-from sqlmodel import Column, Field, Relationship
+from sqlalchemy import ForeignKeyConstraint, Index, LargeBinary
+from sqlmodel import Column, Field, Relationship, UniqueConstraint
 
-from src.database import LONGTEXT, SQLModel
+from src.database import SQLModel
 from src.utils import now
 
 if TYPE_CHECKING:
@@ -19,12 +20,18 @@ class AIModelStatusEnum(str, Enum):
 
 
 class EndpointAIModelDB(SQLModel, table=True):
+    __table_args__ = (
+        # The available endpoints of a model, fastest first
+        Index("ix_endpoint_ai_model_model_status_tps", "ai_model_id", "status", "token_per_second"),
+    )
+
     endpoint_id: int = Field(foreign_key="endpoint.id", primary_key=True)
     ai_model_id: int = Field(foreign_key="ai_model.id", primary_key=True)
 
     status: AIModelStatusEnum = Field(default=AIModelStatusEnum.MISSING)
     token_per_second: float = Field(default=0)
     max_connection_time: float = Field(default=60)
+    last_confirmed_at: Optional[datetime] = Field(default=None)
 
     performances: list["AIModelPerformanceDB"] = Relationship(
         back_populates="link",
@@ -41,10 +48,24 @@ class EndpointAIModelDB(SQLModel, table=True):
 
 
 class AIModelDB(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("name", "tag", name="uq_ai_model_name_tag"),
+        Index(
+            "ft_ai_model_name_tag",
+            "name",
+            "tag",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)  # deepseek-r1
     tag: str = Field(index=True)  # 32b
     created_at: datetime = Field(default_factory=now)
+    # Maintained by the scan result writer, see `reconcile_endpoint_counts`
+    total_endpoint_count: int = Field(default=0, index=True)
+    available_endpoint_count: int = Field(default=0, index=True)
 
     endpoint_links: list["EndpointAIModelDB"] = Relationship(
         back_populates="ai_model",
@@ -58,6 +79,11 @@ class AIModelDB(SQLModel, table=True):
 
 
 class AIModelPerformanceDB(SQLModel, table=True):
+    __table_args__ = (
+        # The history of a model on an endpoint, latest first
+        Index("ix_ai_model_performance_link_time", "endpoint_id", "ai_model_id", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     status: AIModelStatusEnum = Field(default=AIModelStatusEnum.MISSING)
@@ -66,9 +92,12 @@ class AIModelPerformanceDB(SQLModel, table=True):
         default=60, description="The time from the request to the first response"
     )
     total_time: float = Field(default=120, description="The total time of the request")
-    output: str = Field(default="", sa_column=Column(LONGTEXT))
     output_tokens: int = Field(default=0)
-    created_at: datetime = Field(default_factory=now)
+    created_at: datetime = Field(default_factory=now, index=True)
+    # Unchanged results only confirm the latest row: it stands for `samples` tests run between
+    # `created_at` and `last_confirmed_at`
+    last_confirmed_at: Optional[datetime] = Field(default=None)
+    samples: int = Field(default=1)
 
     endpoint_id: Optional[int] = Field(default=None, foreign_key="endpoint.id")
     ai_model_id: Optional[int] = Field(default=None, foreign_key="ai_model.id")
@@ -81,3 +110,27 @@ class AIModelPerformanceDB(SQLModel, table=True):
             "foreign_keys": "[AIModelPerformanceDB.endpoint_id, AIModelPerformanceDB.ai_model_id]",
         },
     )
+
+
+class EndpointAIModelOutputDB(SQLModel, table=True):
+    """
+    The output of the latest benchmark of a model on an endpoint, zlib-compressed.
+
+    Kept apart from the performance rows so that loading performances never loads outputs.
+    """
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["endpoint_id", "ai_model_id"],
+            ["endpoint_ai_model.endpoint_id", "endpoint_ai_model.ai_model_id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    endpoint_id: int = Field(primary_key=True)
+    ai_model_id: int = Field(primary_key=True)
+
+    data: bytes = Field(sa_column=Column(LargeBinary(length=2**24 - 1), nullable=False))
+    original_length: int = Field(default=0, description="Length of the output before truncation")
+    truncated: bool = Field(default=False)
+    created_at: datetime = Field(default_factory=now)
@@ -1,10 +1,21 @@
-from fastapi import APIRouter, Depends
-from fastapi_pagination import Page
+from fastapi import APIRouter, Depends, status
 
-from src.user.service import get_current_user
+from src.pagination import CountedCursorPage, CountedPage
+from src.user.service import get_current_admin_user, get_current_user
 
-from .schemas import AIModelInfoWithEndpoint, AIModelInfoWithEndpointCount
-from .service import get_ai_model_with_endpoints, get_ai_models_endpoint_counts
+from .schemas import (
+    AIModelInfoWithEndpoint,
+    AIModelInfoWithEndpointCount,
+    AIModelOutputInfo,
+    ModelFromEndpointInfo,
+)
+from .service import (
+    get_ai_model_endpoints_by_cursor,
+    get_ai_model_output,
+    get_ai_model_with_endpoints,
+    get_ai_models_endpoint_counts,
+    start_endpoint_count_reconciliation,
+)
 
 ai_model_router = APIRouter(
     prefix="/ai_model", tags=["ai_model"], dependencies=[Depends(get_current_user)]
@@ -13,13 +24,15 @@ ai_model_router = APIRouter(
 
 @ai_model_router.get(
     "/",
-    response_model=Page[AIModelInfoWithEndpointCount],
+    response_model=CountedPage[AIModelInfoWithEndpointCount],
     description="Get all AI models with recent performance tests, with support for filtering, searching and sorting",
     response_description="List of AI models with their recent performance tests",
 )
 async def _get_ai_models(
-    ai_model_pages: Page[AIModelInfoWithEndpointCount] = Depends(get_ai_models_endpoint_counts),
-) -> Page[AIModelInfoWithEndpointCount]:
+    ai_model_pages: CountedPage[AIModelInfoWithEndpointCount] = Depends(
+        get_ai_models_endpoint_counts
+    ),
+) -> CountedPage[AIModelInfoWithEndpointCount]:
     return ai_model_pages
 
 
@@ -33,3 +46,41 @@ async def _get_ai_model_with_endpoints(
     ai_model_with_endpoints: AIModelInfoWithEndpoint = Depends(get_ai_model_with_endpoints),
 ) -> AIModelInfoWithEndpoint:
     return ai_model_with_endpoints
+
+
+@ai_model_router.get(
+    "/{ai_model_id}/endpoints",
+    response_model=CountedCursorPage[ModelFromEndpointInfo],
+    description="Get the endpoints of an AI model by cursor, fastest first",
+    response_description="A page of endpoints with their recent performance tests and the cursors of its neighbours",
+)
+async def _get_ai_model_endpoints(
+    endpoint_page: CountedCursorPage[ModelFromEndpointInfo] = Depends(
+        get_ai_model_endpoints_by_cursor
+    ),
+) -> CountedCursorPage[ModelFromEndpointInfo]:
+    return endpoint_page
+
+
+@ai_model_router.get(
+    "/{ai_model_id}/endpoints/{endpoint_id}/output",
+    response_model=AIModelOutputInfo,
+    description="Get the output of the latest benchmark of an AI model on an endpoint",
+    response_description="The benchmark output, possibly truncated",
+)
+async def _get_ai_model_output(
+    output: AIModelOutputInfo = Depends(get_ai_model_output),
+) -> AIModelOutputInfo:
+    return output
+
+
+@ai_model_router.post(
+    "/endpoint-counts/reconcile",
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Recount the endpoints of all AI models in the background (admin only)",
+    dependencies=[Depends(get_current_admin_user)],
+)
+async def _reconcile_endpoint_counts(
+    result: None = Depends(start_endpoint_count_reconciliation),
+) -> None:
+    return None
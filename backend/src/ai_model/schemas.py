@@ -15,6 +15,8 @@ class AIModelSortField(StrEnum):
     NAME = "name"
     TAG = "tag"
     CREATED_AT = "created_at"
+    TOTAL_ENDPOINT_COUNT = "total_endpoint_count"
+    AVAILABLE_ENDPOINT_COUNT = "available_endpoint_count"
 
 
 class AIModelFilterParams(FilterParams[AIModelSortField]):
@@ -45,6 +47,17 @@ class AIModelPerformance(BaseModel):
     connection_time: Optional[float] = None
     total_time: Optional[float] = None
     created_at: datetime
+    last_confirmed_at: Optional[datetime] = None
+    samples: int = 1
+
+
+class AIModelOutputInfo(BaseModel):
+    endpoint_id: int
+    ai_model_id: int
+    output: str
+    original_length: int
+    truncated: bool
+    created_at: datetime
 
 
 class ModelFromEndpointInfo(BaseModel):
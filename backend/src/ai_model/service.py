@@ -1,51 +1,82 @@
-from fastapi import Depends, HTTPException, status
+from typing import Optional, Sequence
+
+from fastapi import BackgroundTasks, Depends, HTTPException, status
 from fastapi_pagination import Page, Params, set_page
 from fastapi_pagination.ext.sqlmodel import apaginate
-from sqlalchemy import and_, exists, func, or_
+from sqlalchemy import case, func, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlmodel import col, select
 
-from src.database import DBSessionDep
+from src.config import get_config
+from src.database import (
+    DBSessionDep,
+    RecentPerGroupQuery,
+    load_recent_per_group,
+    recent_per_group_query,
+    sessionmanager,
+)
+from src.logging import get_logger
+from src.pagination import (
+    CountedCursorPage,
+    CountedPage,
+    CountStrategy,
+    KeysetParams,
+    keyset_keys,
+    keyset_paginate,
+    paginate,
+)
 from src.schema import SortOrder
+from src.search import escape_like, fulltext_search
 
-from .models import AIModelDB, AIModelStatusEnum, EndpointAIModelDB
+from .models import (
+    AIModelDB,
+    AIModelPerformanceDB,
+    AIModelStatusEnum,
+    EndpointAIModelDB,
+    EndpointAIModelOutputDB,
+)
 from .schemas import (
     AIModelFilterParams,
     AIModelInfoWithEndpoint,
     AIModelInfoWithEndpointCount,
+    AIModelOutputInfo,
     AIModelPerformance,
     AIModelWithEndpointRequest,
     ModelFromEndpointInfo,
 )
+from .utils import decompress_output
+
+logger = get_logger(__name__)
+config = get_config()
 
 
 async def get_ai_models(
     session: DBSessionDep,
     params: AIModelFilterParams = Depends(),
-) -> Page[AIModelDB]:
+) -> CountedPage[AIModelDB]:
     """
-    Get all AI models with filtering, searching and sorting.
+    Get all AI models with filtering, searching and sorting. The total is cached for a while.
     """
-    set_page(Page[AIModelDB])
-    query = select(AIModelDB).options(selectinload(AIModelDB.endpoint_links))  # type: ignore
+    query = select(AIModelDB)
 
     # 添加搜索条件
+    relevance = None
     if params.search:
+        columns = [col(AIModelDB.name), col(AIModelDB.tag)]
         if ":" in params.search:
             model_name, model_tag = params.search.split(":", 1)
+            # 全文索引缩小范围，再分别匹配名称和标签
+            condition, relevance = fulltext_search(columns, f"{model_name} {model_tag}")
             query = query.where(
-                and_(
-                    col(AIModelDB.name).ilike(f"%{model_name}%"),
-                    col(AIModelDB.tag).ilike(f"%{model_tag}%"),
-                )
+                col(AIModelDB.name).ilike(f"%{escape_like(model_name)}%"),
+                col(AIModelDB.tag).ilike(f"%{escape_like(model_tag)}%"),
             )
+            if relevance is not None:
+                query = query.where(condition)
         else:
-            query = query.where(
-                or_(
-                    col(AIModelDB.name).ilike(f"%{params.search}%"),
-                    col(AIModelDB.tag).ilike(f"%{params.search}%"),
-                )
-            )
+            condition, relevance = fulltext_search(columns, params.search)
+            query = query.where(condition)
 
     # 添加基本排序
     if params.order_by:
@@ -53,77 +84,74 @@ async def get_ai_models(
         if params.order == SortOrder.DESC:
             order_column = order_column.desc()
         query = query.order_by(order_column)
+    elif relevance is not None:
+        query = query.order_by(relevance.desc())
 
     if params.is_available:
-        subquery = select(EndpointAIModelDB).where(
-            (EndpointAIModelDB.ai_model_id == AIModelDB.id)
-            & (EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE)
-        )
-        query = query.where(exists(subquery))
+        query = query.where(col(AIModelDB.available_endpoint_count) > 0)
 
-    return await apaginate(session, query, params)
-
-
-async def get_endpoint_count(session: DBSessionDep, ai_model_id: int) -> tuple[int, int]:
-    """
-    Get the count of endpoints for an AI model.
-    """
-    query = select(func.count()).where(EndpointAIModelDB.ai_model_id == ai_model_id)
-    result = await session.execute(query)
-    total_endpoint_count = result.scalar_one()
-    query = query.where(EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE)
-    result = await session.execute(query)
-    avaliable_endpoint_count = result.scalar_one()
-    return total_endpoint_count, avaliable_endpoint_count
+    return await paginate(session, query, params, CountStrategy.CACHED)
 
 
 async def get_ai_models_endpoint_counts(
     session: DBSessionDep, filter_params: AIModelFilterParams = Depends()
-) -> Page[AIModelInfoWithEndpointCount]:
+) -> CountedPage[AIModelInfoWithEndpointCount]:
     """
     Get all AI models with endpoint count, with support for filtering, searching and sorting.
     """
     ai_models = await get_ai_models(session, filter_params)
 
-    set_page(Page[AIModelInfoWithEndpointCount])
-
     ai_models_with_endpoint_count = []
     for ai_model in ai_models.items:
         if ai_model.id is None:
             continue
-        total_endpoint_count, avaliable_endpoint_count = await get_endpoint_count(
-            session, ai_model.id
-        )
         ai_models_with_endpoint_count.append(
             AIModelInfoWithEndpointCount(
                 id=ai_model.id,
                 name=ai_model.name,
                 tag=ai_model.tag,
                 created_at=ai_model.created_at,
-                total_endpoint_count=total_endpoint_count,
-                avaliable_endpoint_count=avaliable_endpoint_count,
+                total_endpoint_count=ai_model.total_endpoint_count,
+                avaliable_endpoint_count=ai_model.available_endpoint_count,
             )
         )
 
-    return Page(
+    return CountedPage(
         items=ai_models_with_endpoint_count,
         total=ai_models.total,
         page=ai_models.page,
         size=ai_models.size,
         pages=ai_models.pages,
+        count_strategy=ai_models.count_strategy,
     )
 
 
-async def get_ai_model_with_endpoints(
-    session: DBSessionDep, request: AIModelWithEndpointRequest = Depends()
-) -> AIModelInfoWithEndpoint:
+def _recent_performances_query(
+    ai_model_id: int, endpoint_ids: Sequence[int]
+) -> RecentPerGroupQuery:
     """
-    Get an AI model with its endpoints.
+    The 10 latest performances of an AI model on each of some endpoints.
     """
-    ai_model = await get_ai_model_by_id(session, request.ai_model_id)
-    links = await get_endpoint_links_by_ai_model_id(session, request.ai_model_id, request)
+    return recent_per_group_query(
+        [col(getattr(AIModelPerformanceDB, name)) for name in AIModelPerformance.model_fields],
+        [col(AIModelPerformanceDB.endpoint_id)],
+        [col(AIModelPerformanceDB.created_at).desc(), col(AIModelPerformanceDB.id).desc()],
+        10,
+        col(AIModelPerformanceDB.ai_model_id) == ai_model_id,
+        col(AIModelPerformanceDB.endpoint_id).in_(endpoint_ids),
+    )
+
+
+async def _to_endpoint_infos(
+    session: DBSessionDep,
+    ai_model_id: int,
+    links: Sequence[EndpointAIModelDB],
+) -> list[ModelFromEndpointInfo]:
+    recent_performances = await load_recent_per_group(
+        session, _recent_performances_query(ai_model_id, [link.endpoint_id for link in links])
+    )
     endpoints: list[ModelFromEndpointInfo] = []
-    for link in links.items:
+    for link in links:
         endpoint = ModelFromEndpointInfo(
             id=link.endpoint_id,
             url=link.endpoint.url,
@@ -133,22 +161,31 @@ async def get_ai_model_with_endpoints(
             token_per_second=link.token_per_second,
             max_connection_time=link.max_connection_time,
             model_performances=[
-                AIModelPerformance(**performance.model_dump())
-                for performance in link.performances[:10]
+                AIModelPerformance.model_validate(performance, from_attributes=True)
+                for performance in recent_performances.get((link.endpoint_id,), [])
             ],
         )
         endpoints.append(endpoint)
-    total_endpoint_count, avaliable_endpoint_count = await get_endpoint_count(
-        session, request.ai_model_id
-    )
+    return endpoints
+
+
+async def get_ai_model_with_endpoints(
+    session: DBSessionDep, request: AIModelWithEndpointRequest = Depends()
+) -> AIModelInfoWithEndpoint:
+    """
+    Get an AI model with its endpoints.
+    """
+    ai_model = await get_ai_model_by_id(session, request.ai_model_id)
+    links = await get_endpoint_links_by_ai_model_id(session, request.ai_model_id, request)
+    endpoints = await _to_endpoint_infos(session, request.ai_model_id, links.items)
 
     return AIModelInfoWithEndpoint(
         id=ai_model.id,
         name=ai_model.name,
         tag=ai_model.tag,
         created_at=ai_model.created_at,
-        total_endpoint_count=total_endpoint_count,
-        avaliable_endpoint_count=avaliable_endpoint_count,
+        total_endpoint_count=ai_model.total_endpoint_count,
+        avaliable_endpoint_count=ai_model.available_endpoint_count,
         endpoints=Page(
             items=endpoints,
             total=links.total,
@@ -186,11 +223,154 @@ async def get_endpoint_links_by_ai_model_id(
     # Base query to get endpoints through the association table
     query = (
         select(EndpointAIModelDB)
-        .options(
-            selectinload(EndpointAIModelDB.performances),  # type: ignore
-            selectinload(EndpointAIModelDB.endpoint),  # type: ignore
-        )
+        .options(selectinload(EndpointAIModelDB.endpoint))  # type: ignore
         .where(EndpointAIModelDB.ai_model_id == ai_model_id)
         .order_by(col(EndpointAIModelDB.token_per_second).desc())
     )
     return await apaginate(session, query, params)
+
+
+async def get_ai_model_endpoints_by_cursor(
+    session: DBSessionDep,
+    ai_model_id: int,
+    params: KeysetParams = Depends(),
+) -> CountedCursorPage[ModelFromEndpointInfo]:
+    """
+    Get the endpoints of an AI model by cursor, fastest first. The total is cached for a while.
+    """
+    await get_ai_model_by_id(session, ai_model_id)
+
+    query = (
+        select(EndpointAIModelDB)
+        .options(selectinload(EndpointAIModelDB.endpoint))  # type: ignore
+        .where(EndpointAIModelDB.ai_model_id == ai_model_id)
+    )
+    page = await keyset_paginate(
+        session,
+        query,
+        params,
+        keyset_keys(col(EndpointAIModelDB.token_per_second), col(EndpointAIModelDB.endpoint_id)),
+        SortOrder.DESC,
+        count_strategy=CountStrategy.CACHED,
+    )
+    return page.model_copy(
+        update={"items": await _to_endpoint_infos(session, ai_model_id, page.items)}
+    )
+
+
+async def get_ai_model_output(
+    session: DBSessionDep,
+    ai_model_id: int,
+    endpoint_id: int,
+) -> AIModelOutputInfo:
+    """
+    Get the output of the latest benchmark of an AI model on an endpoint.
+    """
+    query = select(EndpointAIModelOutputDB).where(
+        col(EndpointAIModelOutputDB.ai_model_id) == ai_model_id,
+        col(EndpointAIModelOutputDB.endpoint_id) == endpoint_id,
+    )
+    result = await session.execute(query)
+    output = result.scalars().first()
+    if output is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Output not found")
+    return AIModelOutputInfo(
+        endpoint_id=output.endpoint_id,
+        ai_model_id=output.ai_model_id,
+        output=decompress_output(output.data),
+        original_length=output.original_length,
+        truncated=output.truncated,
+        created_at=output.created_at,
+    )
+
+
+async def update_endpoint_counts(
+    session: AsyncSession,
+    deltas: dict[int, tuple[int, int]],
+) -> None:
+    """
+    Add (total, available) changes to the endpoint counts of AI models in one statement.
+    The caller commits.
+    """
+    deltas = {model_id: delta for model_id, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+    model_id = col(AIModelDB.id)
+    await session.execute(
+        update(AIModelDB)
+        .where(model_id.in_(list(deltas)))
+        .values(
+            total_endpoint_count=col(AIModelDB.total_endpoint_count)
+            + case({id_: total for id_, (total, _) in deltas.items()}, value=model_id, else_=0),
+            available_endpoint_count=col(AIModelDB.available_endpoint_count)
+            + case(
+                {id_: available for id_, (_, available) in deltas.items()},
+                value=model_id,
+                else_=0,
+            ),
+        )
+    )
+
+
+async def _reconcile_chunk(model_ids: Sequence[int]) -> int:
+    of_model = col(EndpointAIModelDB.ai_model_id) == AIModelDB.id
+    total = select(func.count()).where(of_model).scalar_subquery()
+    available = (
+        select(func.count())
+        .where(of_model, col(EndpointAIModelDB.status) == AIModelStatusEnum.AVAILABLE)
+        .scalar_subquery()
+    )
+    async with sessionmanager.session() as session:
+        # Only the drifted rows are written
+        result = await session.execute(
+            update(AIModelDB)
+            .where(
+                col(AIModelDB.id).in_(model_ids),
+                or_(
+                    col(AIModelDB.total_endpoint_count) != total,
+                    col(AIModelDB.available_endpoint_count) != available,
+                ),
+            )
+            .values(total_endpoint_count=total, available_endpoint_count=available)
+        )
+        await session.commit()
+    return result.rowcount
+
+
+async def reconcile_endpoint_counts(model_ids: Optional[Sequence[int]] = None) -> int:
+    """
+    Recount the endpoints of AI models, all of them by default, chunk by chunk.
+
+    Fixes any drift of the counts maintained by the scan result writer, and updates them after
+    links were deleted. Returns the number of models whose counts changed.
+    """
+    chunk_size = config.ai_model.count_reconcile_chunk_size
+    fixed = 0
+    if model_ids is not None:
+        for i in range(0, len(model_ids), chunk_size):
+            fixed += await _reconcile_chunk(model_ids[i : i + chunk_size])
+    else:
+        last_id = 0
+        while True:
+            async with sessionmanager.session() as session:
+                result = await session.execute(
+                    select(col(AIModelDB.id))
+                    .where(col(AIModelDB.id) > last_id)
+                    .order_by(col(AIModelDB.id))
+                    .limit(chunk_size)
+                )
+                chunk = list(result.scalars().all())
+            if not chunk:
+                break
+            fixed += await _reconcile_chunk(chunk)
+            last_id = chunk[-1]
+        if fixed:
+            logger.warning(f"Fixed drifted endpoint counts of {fixed} AI models")
+    return fixed
+
+
+async def start_endpoint_count_reconciliation(background_task: BackgroundTasks) -> None:
+    """
+    Recount the endpoints of all AI models in the background.
+    """
+    background_task.add_task(reconcile_endpoint_counts)
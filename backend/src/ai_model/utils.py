@@ -0,0 +1,19 @@
+import zlib
+from typing import Tuple
+
+
+def compress_output(output: str, max_chars: int, level: int = 6) -> Tuple[bytes, bool]:
+    """
+    Compress a benchmark output, cut at `max_chars` characters. Returns (data, truncated).
+    """
+    truncated = len(output) > max_chars
+    if truncated:
+        output = output[:max_chars]
+    return zlib.compress(output.encode(), level), truncated
+
+
+def decompress_output(data: bytes) -> str:
+    """
+    Decompress a benchmark output stored by `compress_output`.
+    """
+    return zlib.decompress(data).decode(errors="replace")
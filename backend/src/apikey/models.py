@@ -1,6 +1,7 @@
 import datetime
 from typing import List, Optional
 
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship
 
 from src.database import SQLModel
@@ -29,8 +30,13 @@ class ApiKeyDB(SQLModel, table=True):
 class ApiKeyUsageLogDB(SQLModel, table=True):
     """API key usage log model for tracking API usage"""
 
+    __table_args__ = (
+        # Rate limits and usage stats of a key over a time range
+        Index("ix_api_key_usage_log_key_time_status", "api_key_id", "timestamp", "status_code"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    timestamp: datetime.datetime = Field(default_factory=now)
+    timestamp: datetime.datetime = Field(default_factory=now, index=True)
     endpoint: str = Field(index=True)
     method: str
     model: Optional[str] = Field(default=None)
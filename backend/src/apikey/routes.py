@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, status
-from fastapi_pagination import Page
+
+from src.pagination import CountedCursorPage, CountedPage
+from src.user.service import get_current_admin_user
 
 from .schemas import (
     ApiKeyInfo,
@@ -12,6 +14,9 @@ from .service import (
     get_api_key_by_id,
     get_api_key_usage_stats,
     get_api_keys_for_user,
+    get_api_keys_for_user_by_cursor,
+    get_global_usage_stats,
+    get_user_usage_stats,
 )
 
 apikey_router = APIRouter(prefix="/apikey", tags=["apikey"])
@@ -32,16 +37,53 @@ async def _create_api_key(
 
 @apikey_router.get(
     "/",
-    response_model=Page[ApiKeyInfo],
+    response_model=CountedPage[ApiKeyInfo],
     description="List all API keys for the current user with support for filtering, searching and sorting",
 )
 async def _get_api_keys(
-    api_keys: Page[ApiKeyInfo] = Depends(get_api_keys_for_user),
-) -> Page[ApiKeyInfo]:
+    api_keys: CountedPage[ApiKeyInfo] = Depends(get_api_keys_for_user),
+) -> CountedPage[ApiKeyInfo]:
     """List all API keys for the current user"""
     return api_keys
 
 
+@apikey_router.get(
+    "/cursor",
+    response_model=CountedCursorPage[ApiKeyInfo],
+    description="List the API keys for the current user by cursor, with support for filtering, searching and sorting",
+)
+async def _get_api_keys_by_cursor(
+    api_keys: CountedCursorPage[ApiKeyInfo] = Depends(get_api_keys_for_user_by_cursor),
+) -> CountedCursorPage[ApiKeyInfo]:
+    """List the API keys for the current user by cursor"""
+    return api_keys
+
+
+@apikey_router.get(
+    "/stats",
+    response_model=ApiKeyUsageStats,
+    description="Get usage statistics over all API keys of the current user",
+)
+async def _get_user_stats(
+    stats: ApiKeyUsageStats = Depends(get_user_usage_stats),
+) -> ApiKeyUsageStats:
+    """Get usage statistics over all API keys of the current user"""
+    return stats
+
+
+@apikey_router.get(
+    "/stats/global",
+    response_model=ApiKeyUsageStats,
+    dependencies=[Depends(get_current_admin_user)],
+    description="Get usage statistics over all API keys (admin only)",
+)
+async def _get_global_stats(
+    stats: ApiKeyUsageStats = Depends(get_global_usage_stats),
+) -> ApiKeyUsageStats:
+    """Get usage statistics over all API keys"""
+    return stats
+
+
 @apikey_router.get(
     "/{api_key_id}",
     response_model=ApiKeyInfo,
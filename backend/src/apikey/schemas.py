@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from pydantic import BaseModel
 
+from src.pagination import KeysetFilterParams
 from src.schema import FilterParams
 
 
@@ -19,6 +20,10 @@ class ApiKeyFilterParams(FilterParams[ApiKeySortField]):
     pass
 
 
+class ApiKeyKeysetParams(KeysetFilterParams[ApiKeySortField]):
+    pass
+
+
 class ApiKeyCreate(BaseModel):
     """Schema for creating a new API key"""
 
@@ -74,4 +79,7 @@ class ApiKeyUsageStats(BaseModel):
     requests_today: int
     successful_requests: int
     failed_requests: int
+    # Last 30 days, most recent first
     requests_per_day: List[dict]
+    # Last 30 days, most used first
+    requests_per_model: List[dict] = []
@@ -1,16 +1,15 @@
 import datetime
 import uuid
-from typing import Optional, Tuple
+from typing import Any, Optional, Sequence, Tuple
 
 from fastapi import Depends, HTTPException, Request, status
-from fastapi_pagination import Page, set_page
-from fastapi_pagination.ext.sqlmodel import apaginate
-from sqlalchemy import false, func, or_
+from sqlalchemy import case, false, func, literal, or_, union_all
 from sqlalchemy.orm import selectinload
 from sqlmodel import col, select
 
 from src.database import DBSessionDep
 from src.logging import get_logger
+from src.pagination import CountedCursorPage, CountedPage, keyset_keys, keyset_paginate, paginate
 from src.plan.models import PlanDB
 from src.plan.service import get_user_plan
 from src.schema import SortOrder
@@ -23,6 +22,7 @@ from .schemas import (
     ApiKeyCreate,
     ApiKeyFilterParams,
     ApiKeyInfo,
+    ApiKeyKeysetParams,
     ApiKeyUsageStats,
 )
 
@@ -55,12 +55,8 @@ async def create_api_key(
     return api_key
 
 
-async def get_api_keys_for_user(
-    session: DBSessionDep,
-    user: UserDB = Depends(get_current_user),
-    params: ApiKeyFilterParams = Depends(),
-) -> Page[ApiKeyInfo]:
-    """Get all API keys for the current user with filtering, searching and sorting"""
+def _api_keys_query(user: UserDB, params: ApiKeyFilterParams | ApiKeyKeysetParams) -> Any:
+    """Select the API keys a user can see, filtered by the search"""
     # For admin users, return all API keys
     query = (
         select(ApiKeyDB)
@@ -76,6 +72,21 @@ async def get_api_keys_for_user(
         search_term = f"%{params.search}%"
         query = query.where(or_(col(ApiKeyDB.name).ilike(search_term)))
 
+    return query
+
+
+def _to_api_key_infos(api_keys: Sequence[ApiKeyDB]) -> list[ApiKeyInfo]:
+    return [ApiKeyInfo(user_name=item.user.username, **item.model_dump()) for item in api_keys]
+
+
+async def get_api_keys_for_user(
+    session: DBSessionDep,
+    user: UserDB = Depends(get_current_user),
+    params: ApiKeyFilterParams = Depends(),
+) -> CountedPage[ApiKeyInfo]:
+    """Get all API keys for the current user with filtering, searching and sorting"""
+    query = _api_keys_query(user, params)
+
     # 添加排序
     if params.order_by:
         order_column = getattr(ApiKeyDB, params.order_by.value)
@@ -83,22 +94,23 @@ async def get_api_keys_for_user(
             order_column = order_column.desc()
         query = query.order_by(order_column)
 
-    set_page(Page[ApiKeyDB])
-    api_key_db_page: Page[ApiKeyDB] = await apaginate(session, query, params)
-
-    set_page(Page[ApiKeyInfo])
-    return Page(
-        items=[
-            ApiKeyInfo(
-                user_name=item.user.username,
-                **item.model_dump(),
-            )
-            for item in api_key_db_page.items
-        ],
-        page=api_key_db_page.page,
-        size=api_key_db_page.size,
-        total=api_key_db_page.total,
-        pages=api_key_db_page.pages,
+    return await paginate(session, query, params, transformer=_to_api_key_infos)
+
+
+async def get_api_keys_for_user_by_cursor(
+    session: DBSessionDep,
+    user: UserDB = Depends(get_current_user),
+    params: ApiKeyKeysetParams = Depends(),
+) -> CountedCursorPage[ApiKeyInfo]:
+    """Get the API keys for the current user by cursor, with filtering, searching and sorting"""
+    order_column = getattr(ApiKeyDB, params.order_by.value) if params.order_by else ApiKeyDB.id
+    return await keyset_paginate(
+        session,
+        _api_keys_query(user, params),
+        params,
+        keyset_keys(col(order_column), col(ApiKeyDB.id)),
+        params.order,
+        transformer=_to_api_key_infos,
     )
 
 
@@ -236,6 +248,19 @@ async def get_api_key_from_request(
     return await validate_api_key(session, api_key)
 
 
+def _successful_requests_query(api_key_id: Optional[int], since: datetime.datetime) -> Any:
+    """The number of successful requests of an API key since a time"""
+    return (
+        select(func.count())
+        .select_from(ApiKeyUsageLogDB)
+        .where(
+            ApiKeyUsageLogDB.api_key_id == api_key_id,
+            ApiKeyUsageLogDB.timestamp >= since,
+            ApiKeyUsageLogDB.status_code < 400,
+        )
+    )
+
+
 async def check_rate_limits(
     session: DBSessionDep,
     api_key: ApiKeyDB,
@@ -248,15 +273,7 @@ async def check_rate_limits(
 
     # Check RPM (requests per minute)
     one_minute_ago = _now - datetime.timedelta(minutes=1)
-    rpm_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.timestamp >= one_minute_ago,
-            ApiKeyUsageLogDB.status_code < 400,
-        )
-    )
+    rpm_result = await session.execute(_successful_requests_query(api_key.id, one_minute_ago))
     rpm_count = rpm_result.scalar_one()
 
     if rpm_count >= plan.rpm:
@@ -267,15 +284,7 @@ async def check_rate_limits(
 
     # Check RPD (requests per day)
     today_start = datetime.datetime(_now.year, _now.month, _now.day)
-    rpd_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.timestamp >= today_start,
-            ApiKeyUsageLogDB.status_code < 400,
-        )
-    )
+    rpd_result = await session.execute(_successful_requests_query(api_key.id, today_start))
     rpd_count = rpd_result.scalar_one()
 
     if rpd_count >= plan.rpd:
@@ -285,6 +294,100 @@ async def check_rate_limits(
         )
 
 
+def _usage_query(
+    api_key_ids: Optional[Any],
+    rolled_up_until: Optional[datetime.datetime],
+    first_day: datetime.date,
+) -> Any:
+    """
+    The (day, model, requests, failed requests) of some API keys, all keys if `api_key_ids` is
+    None, from the daily rollups and the logs written since `rolled_up_until`.
+    """
+    # Imported here because the models of this module are loaded with the users, before the
+    # modules the retention service depends on
+    from src.retention.models import ApiKeyUsageRollupDB, RollupPeriod
+    from src.retention.usage import usage_failed, usage_model
+
+    rollup, log = ApiKeyUsageRollupDB, ApiKeyUsageLogDB
+    rollups = select(
+        func.date(col(rollup.bucket_start)).label("day"),
+        col(rollup.model).label("model"),
+        col(rollup.requests).label("requests"),
+        col(rollup.failed_requests).label("failed_requests"),
+    ).where(col(rollup.period) == RollupPeriod.DAY)
+    recent_logs = select(
+        func.date(col(log.timestamp)).label("day"),
+        usage_model(col(log.model)).label("model"),
+        literal(1).label("requests"),
+        usage_failed(col(log.status_code)).label("failed_requests"),
+    )
+    if rolled_up_until is not None:
+        recent_logs = recent_logs.where(col(log.timestamp) >= rolled_up_until)
+    if api_key_ids is not None:
+        rollups = rollups.where(col(rollup.api_key_id).in_(api_key_ids))
+        recent_logs = recent_logs.where(col(log.api_key_id).in_(api_key_ids))
+
+    usage = union_all(rollups, recent_logs).subquery()
+    # Older days are not split by model, so the result grows with the days only
+    model = case((usage.c.day >= first_day, usage.c.model), else_="").label("model")
+    return select(
+        usage.c.day,
+        model,
+        func.sum(usage.c.requests),
+        func.sum(usage.c.failed_requests),
+    ).group_by(usage.c.day, model)
+
+
+async def _get_usage_stats(session: DBSessionDep, api_key_ids: Optional[Any]) -> ApiKeyUsageStats:
+    """
+    Usage statistics of some API keys, all keys if `api_key_ids` is None.
+
+    Counted with one `GROUP BY` over the daily rollups and the few logs written since the last
+    rollup, by day and, over the last 30 days, by model.
+    """
+    # Imported here because the models of this module are loaded with the users, before the
+    # modules the retention service depends on
+    from src.retention.models import RetentionWatermarkDB
+    from src.retention.usage import USAGE_WATERMARK
+
+    _now = now()
+    today = datetime.date(_now.year, _now.month, _now.day)
+    first_day = today - datetime.timedelta(days=29)
+
+    watermark = await session.get(RetentionWatermarkDB, USAGE_WATERMARK)
+    result = await session.execute(
+        _usage_query(
+            api_key_ids, watermark.rolled_up_until if watermark is not None else None, first_day
+        )
+    )
+
+    total_requests = failed_requests = 0
+    per_day: dict[datetime.date, int] = {}
+    per_model: dict[str, int] = {}
+    for day, model_name, requests, failed in result.tuples().all():
+        total_requests += int(requests)
+        failed_requests += int(failed)
+        per_day[day] = per_day.get(day, 0) + int(requests)
+        if day >= first_day:
+            per_model[model_name] = per_model.get(model_name, 0) + int(requests)
+
+    days = [today - datetime.timedelta(days=i) for i in range(30)]
+    return ApiKeyUsageStats(
+        total_requests=total_requests,
+        last_30_days_requests=sum(per_day.get(day, 0) for day in days),
+        requests_today=per_day.get(today, 0),
+        successful_requests=total_requests - failed_requests,
+        failed_requests=failed_requests,
+        requests_per_day=[
+            {"date": day.strftime("%Y-%m-%d"), "count": per_day.get(day, 0)} for day in days
+        ],
+        requests_per_model=[
+            {"model": model_name or None, "count": count}
+            for model_name, count in sorted(per_model.items(), key=lambda item: -item[1])
+        ],
+    )
+
+
 async def get_api_key_usage_stats(
     session: DBSessionDep,
     api_key_id: int,
@@ -293,88 +396,17 @@ async def get_api_key_usage_stats(
     """Get usage statistics for an API key"""
     # Get the API key (this function now handles admin permissions)
     api_key = await get_api_key_by_id(session, api_key_id, user)
+    return await _get_usage_stats(session, [api_key.id])
 
-    _now = now()
-    today_start = datetime.datetime(_now.year, _now.month, _now.day)
-    thirty_days_ago = _now - datetime.timedelta(days=30)
-
-    # Total requests
-    total_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(ApiKeyUsageLogDB.api_key_id == api_key.id)
-    )
-    total_requests = total_result.scalar_one()
-
-    # Last 30 days requests
-    month_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.timestamp >= thirty_days_ago,
-        )
-    )
-    last_30_days_requests = month_result.scalar_one()
 
-    # Today's requests
-    today_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.timestamp >= today_start,
-        )
-    )
-    requests_today = today_result.scalar_one()
-
-    # Successful requests (status code < 400)
-    success_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.status_code < 400,
-        )
-    )
-    successful_requests = success_result.scalar_one()
-
-    # Failed requests (status code >= 400)
-    failed_result = await session.execute(
-        select(func.count())
-        .select_from(ApiKeyUsageLogDB)
-        .where(
-            ApiKeyUsageLogDB.api_key_id == api_key.id,
-            ApiKeyUsageLogDB.status_code >= 400,
-        )
-    )
-    failed_requests = failed_result.scalar_one()
-
-    # Requests per day in the last 30 days
-    daily_stats = []
-    for i in range(30):
-        day = _now - datetime.timedelta(days=i)
-        day_start = datetime.datetime(day.year, day.month, day.day)
-        day_end = day_start + datetime.timedelta(days=1)
-
-        day_result = await session.execute(
-            select(func.count())
-            .select_from(ApiKeyUsageLogDB)
-            .where(
-                ApiKeyUsageLogDB.api_key_id == api_key.id,
-                ApiKeyUsageLogDB.timestamp >= day_start,
-                ApiKeyUsageLogDB.timestamp < day_end,
-            )
-        )
-        count = day_result.scalar_one()
+async def get_user_usage_stats(
+    session: DBSessionDep,
+    user: UserDB = Depends(get_current_user),
+) -> ApiKeyUsageStats:
+    """Get usage statistics over all API keys of the current user"""
+    return await _get_usage_stats(session, select(ApiKeyDB.id).where(ApiKeyDB.user_id == user.id))
 
-        daily_stats.append({"date": day_start.strftime("%Y-%m-%d"), "count": count})
 
-    return ApiKeyUsageStats(
-        total_requests=total_requests,
-        last_30_days_requests=last_30_days_requests,
-        requests_today=requests_today,
-        successful_requests=successful_requests,
-        failed_requests=failed_requests,
-        requests_per_day=daily_stats,
-    )
+async def get_global_usage_stats(session: DBSessionDep) -> ApiKeyUsageStats:
+    """Get usage statistics over all API keys (admin only)"""
+    return await _get_usage_stats(session, None)
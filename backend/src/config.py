@@ -1,5 +1,6 @@
 from enum import StrEnum
 from functools import lru_cache
+from typing import Optional
 
 from pydantic_settings import BaseSettings
 
@@ -36,11 +37,188 @@ class DatabaseConfig(BaseSettings):
     username: str = "ollama_hack"
     password: str = "0llama_H4ck"
     db: str = "ollama_hack"
+    # Must match the ngram_token_size of the MySQL server, terms shorter than this cannot be
+    # searched with the FULLTEXT indexes
+    ngram_token_size: int = 2
+
+
+class TokenizerConfig(BaseSettings):
+    encoding: str = "cl100k_base"
+    # Directory holding pre-downloaded tiktoken BPE files, set as TIKTOKEN_CACHE_DIR at startup
+    cache_dir: Optional[str] = None
+    # Whether the BPE file may be downloaded when it is missing from the cache
+    allow_download: bool = False
+    max_workers: int = 4
+    # Texts longer than this (in characters) are encoded in the worker thread pool
+    offload_threshold: int = 2048
+
+
+class ScannerConfig(BaseSettings):
+    # Set to false when tests run in separate `python -m src.endpoint.worker` processes, the API
+    # process then only enqueues them
+    run_workers_in_api: bool = True
+    # Number of endpoint tests running at the same time in one process
+    concurrency: int = 50
+    # Maximum number of due tasks claimed from the queue in one query
+    claim_batch_size: int = 100
+    poll_interval_seconds: float = 2
+    # A running task whose lease is not renewed within this time is handed to another worker
+    lease_seconds: int = 300
+    max_attempts: int = 3
+    retry_delay_seconds: int = 60
+    # Periodic sweep rate in tests per minute, 0 spreads the fleet evenly over the update interval
+    target_rate_per_minute: float = 0
+    pacing_tick_seconds: int = 60
+    # Random shift of each run date, as a fraction of the spacing between two tests
+    pacing_jitter: float = 0.5
+    # The sweep slows down while the DB is slower than this or the queue is backing up
+    max_db_latency_ms: float = 500
+    min_rate_factor: float = 0.2
+    # The sweep does not speed up while workers are busier than this
+    high_utilization: float = 0.9
+    # Number of recent results used to classify an endpoint's stability
+    history_window: int = 10
+    # Endpoints failing this many tests in a row are backed off exponentially
+    dead_after_failures: int = 3
+    dead_backoff_max_hours: float = 24 * 7
+    # Interval multipliers for stable endpoints, and flapping or top-ranked ones
+    stable_interval_factor: float = 3
+    frequent_interval_factor: float = 0.25
+    flapping_min_changes: int = 3
+    # Endpoints among the N fastest for a model are considered top-ranked
+    top_rank: int = 10
+    # Workers kept free for each lane, lower-priority lanes cannot use them
+    manual_reserved_workers: int = 5
+    circuit_breaker_reserved_workers: int = 5
+    import_reserved_workers: int = 10
+    # Consecutive proxy failures of an endpoint before it is re-tested in the circuit breaker lane
+    circuit_breaker_threshold: int = 3
+    # Test results are written in batches of this size, or after this delay
+    result_batch_size: int = 50
+    result_flush_seconds: float = 1
+    # Workers wait while this many results are waiting to be written
+    result_queue_size: int = 500
+    # Shared HTTP connector used by endpoint tests
+    connector_limit: int = 500
+    connector_limit_per_host: int = 4
+    dns_cache_ttl_seconds: int = 300
+    connect_timeout_seconds: float = 5
+    happy_eyeballs_delay: float = 0.25
+    # Whether endpoint tests verify the TLS certificates of https:// endpoints
+    verify_ssl: bool = True
+    # Benchmark outputs are stored compressed, cut at this number of characters
+    output_max_chars: int = 4000
+    output_compression_level: int = 6
+    # A test result equal to the latest history row only confirms that row (last_confirmed_at,
+    # samples) instead of inserting a new one. Equal means same status, and throughput and
+    # connection time within these relative tolerances
+    suppress_unchanged_results: bool = True
+    result_tps_tolerance: float = 0.2
+    result_latency_tolerance: float = 0.5
+    # A new history row is inserted anyway once the latest one started this long ago
+    result_max_confirm_hours: float = 24
+
+
+class AvailabilityConfig(BaseSettings):
+    # Width of one slot of the daily availability bitmaps, in minutes
+    slot_minutes: int = 15
+    # Routing prefers fast endpoints that were also up over this many days
+    routing_days: int = 7
+    # Exponent applied to the uptime when ranking endpoints, 0 ranks by throughput only
+    routing_weight: float = 2
+    # Number of fastest endpoints reranked by uptime
+    routing_candidates: int = 50
+
+
+class EndpointImportConfig(BaseSettings):
+    # URLs upserted per statement
+    chunk_size: int = 1000
+    max_upload_mb: int = 1024
+    # Uploads are spooled here until imported, defaults to the system temp dir
+    spool_dir: Optional[str] = None
+
+
+class BulkDeleteConfig(BaseSettings):
+    # Endpoints deleted per transaction
+    endpoint_chunk_size: int = 500
+    # Child rows (test history, tasks, ...) deleted per statement, with a pause in between
+    row_chunk_size: int = 5000
+    chunk_pause_seconds: float = 0.05
+    # Batch deletes of up to this many endpoints finish before the request returns
+    inline_max_endpoints: int = 100
+
+
+class AIModelConfig(BaseSettings):
+    # The endpoint counts of the models are maintained by the scan result writer and recounted
+    # this often to fix any drift, 0 disables the recount
+    count_reconcile_interval_hours: float = 6
+    # Models recounted per statement
+    count_reconcile_chunk_size: int = 1000
+
+
+class ApiKeyUsageConfig(BaseSettings):
+    # Usage logs are rolled up into hourly and daily counts this often, 0 disables it. Stats
+    # count the logs written since the last rollup one by one.
+    rollup_interval_minutes: float = 5
+
+
+class PaginationConfig(BaseSettings):
+    # Totals of lists counted with the cached strategy are reused this long
+    count_cache_ttl_seconds: float = 60
+    count_cache_max_entries: int = 1000
+
+
+class RetentionConfig(BaseSettings):
+    enabled: bool = True
+    run_interval_hours: float = 6
+    # Raw test results are kept this long, then only their hourly rollups
+    raw_days: int = 60
+    # Hourly rollups are kept this long, then only daily rollups, kept for daily_rollup_days
+    # (0 keeps them forever)
+    hourly_rollup_days: int = 180
+    daily_rollup_days: int = 0
+    # Finished test tasks are deleted after this many days
+    task_days: int = 7
+    # API key usage logs are deleted after this many days, 0 keeps them forever
+    usage_log_days: int = 0
+    # Daily availability bitmaps are deleted after this many days, 0 keeps them forever
+    availability_days: int = 90
+    # Rows deleted per statement, with a pause in between to keep locks short
+    chunk_size: int = 1000
+    chunk_pause_seconds: float = 0.1
+
+
+class LeaderConfig(BaseSettings):
+    # Whether processes elect a leader to run the scheduler and scan workers, disable for a
+    # single process
+    enabled: bool = True
+    lock_name: str = "ollama_hack_leader"
+    # How often followers try to take over, and the leader checks it still holds the lock
+    check_interval_seconds: float = 10
+
+
+class StatsConfig(BaseSettings):
+    # How often every process reports its in-memory metrics (token counter, connector) to the
+    # database, where the stats routes read them from
+    publish_interval_seconds: float = 30
+    # Metrics of processes that stopped reporting are removed after this many minutes
+    expire_minutes: float = 10
 
 
 class Config(BaseSettings):
     database: DatabaseConfig = DatabaseConfig()
     app: AppConfig = AppConfig()
+    tokenizer: TokenizerConfig = TokenizerConfig()
+    scanner: ScannerConfig = ScannerConfig()
+    availability: AvailabilityConfig = AvailabilityConfig()
+    endpoint_import: EndpointImportConfig = EndpointImportConfig()
+    bulk_delete: BulkDeleteConfig = BulkDeleteConfig()
+    ai_model: AIModelConfig = AIModelConfig()
+    api_key_usage: ApiKeyUsageConfig = ApiKeyUsageConfig()
+    pagination: PaginationConfig = PaginationConfig()
+    leader: LeaderConfig = LeaderConfig()
+    retention: RetentionConfig = RetentionConfig()
+    stats: StatsConfig = StatsConfig()
 
     class Config:
         env_file = ".env"
@@ -1,15 +1,17 @@
 import contextlib
-from typing import Annotated, Any, AsyncIterator
+from typing import Annotated, Any, AsyncIterator, NamedTuple, Sequence
 
 from fastapi import Depends
-from sqlalchemy import TEXT
+from sqlalchemy import TEXT, ColumnElement, Row, Select, func, select, text
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import declared_attr
+from sqlalchemy.sql.expression import ClauseElement, Executable
 from sqlmodel import SQLModel as _SQLModel
 
 from .config import DatabaseEngine, LogLevels, get_config
@@ -61,6 +63,15 @@ class DatabaseSessionManager:
                 await connection.rollback()
                 raise
 
+    async def detached_connection(self) -> AsyncConnection:
+        """
+        Get a connection that stays checked out until the caller closes it.
+        """
+        if self._engine is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+
+        return await self._engine.connect()
+
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
         if self._sessionmaker is None:
@@ -97,8 +108,79 @@ sessionmanager = DatabaseSessionManager(
 )
 
 
+class Explain(Executable, ClauseElement):
+    """
+    `EXPLAIN` of a statement, executed like one, with its bound parameters.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement: Any):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element: Explain, compiler: Any, **kw: Any) -> str:
+    return f"EXPLAIN {compiler.process(element.statement, **kw)}"
+
+
+class RecentPerGroupQuery(NamedTuple):
+    query: Select
+    group_columns: list[ColumnElement]
+
+
+def recent_per_group_query(
+    columns: Sequence[ColumnElement],
+    group_by: Sequence[ColumnElement],
+    order_by: Sequence[ColumnElement],
+    limit: int,
+    *where: ColumnElement[bool],
+) -> RecentPerGroupQuery:
+    """
+    Select at most `limit` rows per group, ranked with `ROW_NUMBER()`.
+
+    Only `columns` are selected, so large columns are never read. The rows are ordered by group,
+    then in `order_by` order.
+    """
+    ranked = (
+        select(
+            *columns,
+            *(column.label(f"group_{i}") for i, column in enumerate(group_by)),
+            func.row_number().over(partition_by=group_by, order_by=order_by).label("group_rank"),
+        )
+        .where(*where)
+        .subquery()
+    )
+    group_columns = [ranked.c[f"group_{i}"] for i in range(len(group_by))]
+    query = (
+        select(ranked)
+        .where(ranked.c.group_rank <= limit)
+        .order_by(*group_columns, ranked.c.group_rank)
+    )
+    return RecentPerGroupQuery(query, group_columns)
+
+
+async def load_recent_per_group(
+    session: AsyncSession, recent: RecentPerGroupQuery
+) -> dict[tuple, list[Row]]:
+    """
+    Load the rows of a `recent_per_group_query` in one query.
+
+    Returns the rows by the values of the group columns. Groups without rows are left out.
+    """
+    result = await session.execute(recent.query)
+    groups: dict[tuple, list[Row]] = {}
+    for row in result.all():
+        key = tuple(row._mapping[column] for column in recent.group_columns)
+        groups.setdefault(key, []).append(row)
+    return groups
+
+
 async def create_db_and_tables():
     async with sessionmanager.connect() as connection:
+        # The default stopwords drop every n-gram containing one, e.g. every bigram with an "a",
+        # from the FULLTEXT indexes created here
+        await connection.execute(text("SET SESSION innodb_ft_enable_stopword = OFF"))
         await connection.run_sync(SQLModel.metadata.create_all)
 
 
@@ -0,0 +1,138 @@
+import datetime
+from enum import StrEnum
+from typing import Sequence
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlmodel import col
+
+from src.ai_model.models import AIModelStatusEnum, EndpointAIModelDB
+from src.config import ScannerConfig, get_config
+from src.logging import get_logger
+from src.setting.models import SystemSettingKey
+from src.setting.service import get_setting
+from src.utils import now
+
+from .models import EndpointDB, EndpointPerformanceDB, EndpointStatusEnum
+
+logger = get_logger(__name__)
+config = get_config()
+
+
+class StabilityClass(StrEnum):
+    NEW = "new"
+    DEAD = "dead"
+    STABLE = "stable"
+    FLAPPING = "flapping"
+    TOP_RANKED = "top_ranked"
+    NORMAL = "normal"
+
+
+def classify_history(
+    statuses: Sequence[EndpointStatusEnum],
+    top_ranked: bool,
+    scanner_config: ScannerConfig,
+) -> StabilityClass:
+    """
+    Classify an endpoint from its most recent test statuses, newest first.
+    """
+    if not statuses:
+        return StabilityClass.NEW
+
+    changes = sum(1 for newer, older in zip(statuses, statuses[1:], strict=False) if newer != older)
+    if changes >= scanner_config.flapping_min_changes:
+        return StabilityClass.FLAPPING
+    if top_ranked and statuses[0] == EndpointStatusEnum.AVAILABLE:
+        return StabilityClass.TOP_RANKED
+    if (
+        len(statuses) >= scanner_config.dead_after_failures
+        and EndpointStatusEnum.AVAILABLE not in statuses[: scanner_config.dead_after_failures]
+    ):
+        return StabilityClass.DEAD
+    if len(statuses) >= scanner_config.history_window and changes == 0:
+        return StabilityClass.STABLE
+    return StabilityClass.NORMAL
+
+
+def next_test_delay(
+    statuses: Sequence[EndpointStatusEnum],
+    top_ranked: bool,
+    base_interval: datetime.timedelta,
+    scanner_config: ScannerConfig,
+) -> datetime.timedelta:
+    """
+    Compute the delay until the next test of an endpoint.
+
+    Dead endpoints back off exponentially up to a ceiling, stable ones get a long interval, and
+    flapping or top-ranked ones are tested more often than the base interval.
+    """
+    match classify_history(statuses, top_ranked, scanner_config):
+        case StabilityClass.DEAD:
+            failures = next(
+                (i for i, s in enumerate(statuses) if s == EndpointStatusEnum.AVAILABLE),
+                len(statuses),
+            )
+            exponent = failures - scanner_config.dead_after_failures + 1
+            ceiling = datetime.timedelta(hours=scanner_config.dead_backoff_max_hours)
+            return max(min(base_interval * 2**exponent, ceiling), base_interval)
+        case StabilityClass.STABLE:
+            return base_interval * scanner_config.stable_interval_factor
+        case StabilityClass.FLAPPING | StabilityClass.TOP_RANKED:
+            return base_interval * scanner_config.frequent_interval_factor
+        case _:
+            return base_interval
+
+
+async def is_top_ranked(session: AsyncSession, endpoint_id: int, top_n: int) -> bool:
+    """
+    Check whether the endpoint is among the `top_n` fastest available endpoints of any model.
+    """
+    link = aliased(EndpointAIModelDB)
+    faster = aliased(EndpointAIModelDB)
+    faster_count = (
+        select(func.count())
+        .where(
+            faster.ai_model_id == link.ai_model_id,
+            faster.status == AIModelStatusEnum.AVAILABLE,
+            faster.token_per_second > link.token_per_second,
+        )
+        .scalar_subquery()
+    )
+    query = select(
+        exists().where(
+            link.endpoint_id == endpoint_id,
+            link.status == AIModelStatusEnum.AVAILABLE,
+            faster_count < top_n,
+        )
+    )
+    return bool((await session.execute(query)).scalar())
+
+
+async def update_next_test_at(session: AsyncSession, endpoint_id: int) -> datetime.datetime:
+    """
+    Compute and store the next test time of an endpoint from its test history. The caller commits.
+    """
+    setting = await get_setting(session, SystemSettingKey.UPDATE_ENDPOINT_TASK_INTERVAL_HOURS)
+    base_interval = datetime.timedelta(hours=max(int(setting.value), 1))
+
+    result = await session.execute(
+        select(col(EndpointPerformanceDB.status), col(EndpointPerformanceDB.samples))
+        .where(col(EndpointPerformanceDB.endpoint_id) == endpoint_id)
+        .order_by(col(EndpointPerformanceDB.created_at).desc())
+        .limit(config.scanner.history_window)
+    )
+    # A history row stands for `samples` consecutive tests with the same result
+    statuses = [
+        status for status, samples in result.tuples().all() for _ in range(max(samples, 1))
+    ][: config.scanner.history_window]
+    top_ranked = await is_top_ranked(session, endpoint_id, config.scanner.top_rank)
+
+    next_test_at = now() + next_test_delay(statuses, top_ranked, base_interval, config.scanner)
+    await session.execute(
+        update(EndpointDB)
+        .where(col(EndpointDB.id) == endpoint_id)
+        .values(next_test_at=next_test_at)
+    )
+    logger.debug(f"Next test of endpoint {endpoint_id} at {next_test_at}")
+    return next_test_at
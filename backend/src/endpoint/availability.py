@@ -0,0 +1,169 @@
+import datetime
+import math
+from typing import Optional, Sequence
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from src.config import AvailabilityConfig, get_config
+from src.utils import now
+
+from .models import EndpointAvailabilityDayDB
+from .schemas import AvailabilityDay, EndpointAvailability
+
+config = get_config()
+
+_MINUTES_PER_DAY = 24 * 60
+
+
+def bitmap_size(availability_config: AvailabilityConfig) -> int:
+    """
+    Number of bytes of a daily bitmap.
+    """
+    slots = math.ceil(_MINUTES_PER_DAY / availability_config.slot_minutes)
+    return math.ceil(slots / 8)
+
+
+def slot_mask(at: datetime.datetime, availability_config: AvailabilityConfig) -> bytes:
+    """
+    A daily bitmap with only the bit of the slot containing `at` set, first slot in the most
+    significant bit.
+    """
+    slot = (at.hour * 60 + at.minute) // availability_config.slot_minutes
+    mask = bytearray(bitmap_size(availability_config))
+    mask[slot // 8] = 0x80 >> (slot % 8)
+    return bytes(mask)
+
+
+async def record_availability(
+    session: AsyncSession,
+    endpoint_id: int,
+    available: bool,
+    at: datetime.datetime,
+) -> None:
+    """
+    Set the bit of a test in the daily bitmaps of an endpoint, in place. The caller commits.
+    """
+    availability_config = config.availability
+    at = at.astimezone(datetime.timezone.utc)
+    mask = slot_mask(at, availability_config)
+    statement = mysql_insert(EndpointAvailabilityDayDB).values(
+        endpoint_id=endpoint_id,
+        day=at.date(),
+        slot_minutes=availability_config.slot_minutes,
+        tested=mask,
+        available=mask if available else bytes(len(mask)),
+    )
+    # A bitmap written with another slot width is started over
+    same_slots = col(EndpointAvailabilityDayDB.slot_minutes) == statement.inserted.slot_minutes
+    await session.execute(
+        statement.on_duplicate_key_update(
+            # MySQL applies the assignments in order, slot_minutes has to come last
+            [
+                (
+                    "tested",
+                    case(
+                        (
+                            same_slots,
+                            col(EndpointAvailabilityDayDB.tested).op("|")(
+                                statement.inserted.tested
+                            ),
+                        ),
+                        else_=statement.inserted.tested,
+                    ),
+                ),
+                (
+                    "available",
+                    case(
+                        (
+                            same_slots,
+                            col(EndpointAvailabilityDayDB.available).op("|")(
+                                statement.inserted.available
+                            ),
+                        ),
+                        else_=statement.inserted.available,
+                    ),
+                ),
+                ("slot_minutes", statement.inserted.slot_minutes),
+            ]
+        )
+    )
+
+
+def _uptime(tested: int, available: int) -> Optional[float]:
+    return available / tested if tested else None
+
+
+async def get_availability_timelines(
+    session: AsyncSession,
+    endpoint_ids: Sequence[int],
+    days: int,
+) -> list[EndpointAvailability]:
+    """
+    Get the uptime of endpoints over the last `days` days, overall and per day, in one query.
+    """
+    start = now().date() - datetime.timedelta(days=days - 1)
+    result = await session.execute(
+        select(
+            col(EndpointAvailabilityDayDB.endpoint_id),
+            col(EndpointAvailabilityDayDB.day),
+            func.bit_count(col(EndpointAvailabilityDayDB.tested)),
+            func.bit_count(col(EndpointAvailabilityDayDB.available)),
+        ).where(
+            col(EndpointAvailabilityDayDB.endpoint_id).in_(endpoint_ids),
+            col(EndpointAvailabilityDayDB.day) >= start,
+        )
+    )
+    counts: dict[int, dict[datetime.date, tuple[int, int]]] = {
+        endpoint_id: {} for endpoint_id in endpoint_ids
+    }
+    for endpoint_id, day, tested, available in result.tuples().all():
+        counts[endpoint_id][day] = (tested, available)
+
+    timelines = []
+    for endpoint_id, per_day in counts.items():
+        tested = sum(day_tested for day_tested, _ in per_day.values())
+        available = sum(day_available for _, day_available in per_day.values())
+        timelines.append(
+            EndpointAvailability(
+                endpoint_id=endpoint_id,
+                uptime=_uptime(tested, available),
+                tested_slots=tested,
+                available_slots=available,
+                days=[
+                    AvailabilityDay(day=day, uptime=_uptime(*per_day.get(day, (0, 0))))
+                    for day in (start + datetime.timedelta(days=i) for i in range(days))
+                ],
+            )
+        )
+    return timelines
+
+
+async def get_uptimes(
+    session: AsyncSession,
+    endpoint_ids: Sequence[int],
+    days: int,
+) -> dict[int, float]:
+    """
+    Get the uptime of endpoints over the last `days` days. Endpoints never tested are left out.
+    """
+    if not endpoint_ids:
+        return {}
+    start = now().date() - datetime.timedelta(days=days - 1)
+    tested = func.sum(func.bit_count(col(EndpointAvailabilityDayDB.tested)))
+    available = func.sum(func.bit_count(col(EndpointAvailabilityDayDB.available)))
+    result = await session.execute(
+        select(col(EndpointAvailabilityDayDB.endpoint_id), available / func.nullif(tested, 0))
+        .where(
+            col(EndpointAvailabilityDayDB.endpoint_id).in_(endpoint_ids),
+            col(EndpointAvailabilityDayDB.day) >= start,
+        )
+        .group_by(col(EndpointAvailabilityDayDB.endpoint_id))
+    )
+    return {
+        endpoint_id: float(uptime)
+        for endpoint_id, uptime in result.tuples().all()
+        if uptime is not None
+    }
@@ -0,0 +1,173 @@
+import asyncio
+from typing import Any, Sequence, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import OperationalError
+from sqlmodel import col
+
+from src.ai_model.models import AIModelPerformanceDB, EndpointAIModelDB, EndpointAIModelOutputDB
+from src.ai_model.service import reconcile_endpoint_counts
+from src.config import get_config
+from src.database import SQLModel, sessionmanager
+from src.logging import get_logger
+from src.retention.models import AIModelPerformanceRollupDB, EndpointAvailabilityRollupDB
+from src.utils import now
+
+from .models import (
+    EndpointAvailabilityDayDB,
+    EndpointDB,
+    EndpointDeleteJobDB,
+    EndpointPerformanceDB,
+    EndpointTestTask,
+    JobStatus,
+)
+
+logger = get_logger(__name__)
+config = get_config()
+
+# Every table with an `endpoint_id`, children before their parents
+_CHILD_MODELS: list[type[SQLModel]] = [
+    EndpointTestTask,
+    AIModelPerformanceDB,
+    EndpointAIModelOutputDB,
+    EndpointAIModelDB,
+    EndpointPerformanceDB,
+    EndpointAvailabilityDayDB,
+    AIModelPerformanceRollupDB,
+    EndpointAvailabilityRollupDB,
+]
+
+
+# MySQL errors of a transaction rolled back by a deadlock or a lock wait timeout
+_LOCK_ERRORS = (1213, 1205)
+_FINAL_ATTEMPTS = 3
+
+
+def _is_lock_error(error: OperationalError) -> bool:
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] in _LOCK_ERRORS
+
+
+def _of_endpoints(model: type[SQLModel], endpoint_ids: Sequence[int]) -> Any:
+    return col(model.endpoint_id).in_(endpoint_ids)  # type: ignore
+
+
+async def _delete_child_rows(model: type[SQLModel], endpoint_ids: Sequence[int]) -> int:
+    """
+    Delete the rows of the endpoints from a child table in small chunks, pausing in between to
+    keep locks short.
+    """
+    chunk_size = config.bulk_delete.row_chunk_size
+    deleted = 0
+    while True:
+        async with sessionmanager.session() as session:
+            result = await session.execute(
+                delete(model)
+                .where(_of_endpoints(model, endpoint_ids))
+                .with_dialect_options(mysql_limit=chunk_size)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted
+        await asyncio.sleep(config.bulk_delete.chunk_pause_seconds)
+
+
+async def _delete_endpoints(endpoint_ids: Sequence[int]) -> Tuple[int, int]:
+    async with sessionmanager.session() as session:
+        # The endpoints are locked first and in ID order, like the result sink does before writing
+        # results, so that both wait for each other instead of deadlocking
+        await session.execute(
+            select(col(EndpointDB.id))
+            .where(col(EndpointDB.id).in_(endpoint_ids))
+            .order_by(col(EndpointDB.id))
+            .with_for_update()
+        )
+        deleted_rows = 0
+        for model in _CHILD_MODELS:
+            result = await session.execute(delete(model).where(_of_endpoints(model, endpoint_ids)))
+            deleted_rows += result.rowcount
+        result = await session.execute(
+            delete(EndpointDB).where(col(EndpointDB.id).in_(endpoint_ids))
+        )
+        await session.commit()
+    return deleted_rows, result.rowcount
+
+
+async def delete_endpoint_rows(endpoint_ids: Sequence[int]) -> Tuple[int, int]:
+    """
+    Delete one chunk of endpoints with all their rows, with set-based deletes.
+
+    The bulk of the child rows is deleted in small chunks first. The endpoints are then deleted in
+    one transaction together with any child row written meanwhile, e.g. by a running test. That
+    transaction is retried if it deadlocks or times out waiting for a lock. The endpoint counts
+    of the models the endpoints had are recounted afterwards.
+    Returns (deleted endpoints, deleted rows including the endpoints).
+    """
+    async with sessionmanager.session() as session:
+        result = await session.execute(
+            select(col(EndpointAIModelDB.ai_model_id))
+            .where(_of_endpoints(EndpointAIModelDB, endpoint_ids))
+            .distinct()
+        )
+        model_ids = list(result.scalars().all())
+
+    deleted_rows = 0
+    for model in _CHILD_MODELS:
+        deleted_rows += await _delete_child_rows(model, endpoint_ids)
+
+    for attempt in range(1, _FINAL_ATTEMPTS + 1):
+        try:
+            rows, deleted_endpoints = await _delete_endpoints(endpoint_ids)
+            break
+        except OperationalError as e:
+            if attempt == _FINAL_ATTEMPTS or not _is_lock_error(e):
+                raise
+            logger.warning(f"Retrying the deletion of {len(endpoint_ids)} endpoints: {e}")
+            await asyncio.sleep(config.bulk_delete.chunk_pause_seconds * attempt)
+    deleted_rows += rows
+
+    # Imported here because the service imports this module
+    from .service import forget_endpoints
+
+    forget_endpoints(endpoint_ids)
+    await reconcile_endpoint_counts(model_ids)
+    return deleted_endpoints, deleted_rows + deleted_endpoints
+
+
+async def run_delete_job(job_id: int, endpoint_ids: Sequence[int]) -> None:
+    """
+    Delete endpoints chunk by chunk, recording the progress in the job.
+    """
+    chunk_size = config.bulk_delete.endpoint_chunk_size
+    logger.info(f"Starting endpoint delete job {job_id} ({len(endpoint_ids)} endpoints)")
+    try:
+        for i in range(0, len(endpoint_ids), chunk_size):
+            deleted_endpoints, deleted_rows = await delete_endpoint_rows(
+                endpoint_ids[i : i + chunk_size]
+            )
+            async with sessionmanager.session() as session:
+                await session.execute(
+                    update(EndpointDeleteJobDB)
+                    .where(col(EndpointDeleteJobDB.id) == job_id)
+                    .values(
+                        deleted_endpoints=col(EndpointDeleteJobDB.deleted_endpoints)
+                        + deleted_endpoints,
+                        deleted_rows=col(EndpointDeleteJobDB.deleted_rows) + deleted_rows,
+                    )
+                )
+                await session.commit()
+    except Exception as e:
+        logger.error(f"Endpoint delete job {job_id} failed: {e}")
+        status, error = JobStatus.FAILED, str(e)
+    else:
+        logger.info(f"Endpoint delete job {job_id} finished")
+        status, error = JobStatus.DONE, None
+
+    async with sessionmanager.session() as session:
+        await session.execute(
+            update(EndpointDeleteJobDB)
+            .where(col(EndpointDeleteJobDB.id) == job_id)
+            .values(status=status, error=error, finished_at=now())
+        )
+        await session.commit()
@@ -0,0 +1,258 @@
+import asyncio
+import csv
+import datetime
+import itertools
+import json
+import os
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from src.config import get_config
+from src.database import sessionmanager
+from src.logging import get_logger
+from src.utils import now
+
+from .models import EndpointDB, EndpointImportJobDB, JobStatus, TaskLane
+from .schemas import EndpointImportFormat
+from .search import url_search_fields
+
+logger = get_logger(__name__)
+config = get_config()
+
+# (url, name), url is None for invalid lines
+ImportEntry = Tuple[Optional[str], Optional[str]]
+
+# Length of the VARCHAR(255) url and name columns of EndpointDB
+MAX_COLUMN_LENGTH = 255
+
+
+def normalize_url(raw: str) -> Optional[str]:
+    """
+    Normalize an endpoint URL, or return None if it is not one.
+
+    Bare `host:port` gets `http://`, scheme and host are lowercased, a trailing slash, query
+    and fragment are dropped. URLs containing whitespace or longer than the url column are
+    rejected.
+    """
+    raw = raw.strip()
+    if not raw or any(char.isspace() for char in raw):
+        return None
+    if "://" not in raw:
+        raw = f"http://{raw}"
+    try:
+        parts = urlsplit(raw)
+        # Raises on an invalid port
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ("http", "https") or not parts.hostname or port == 0:
+        return None
+    url = urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"), "", ""))
+    if len(url) > MAX_COLUMN_LENGTH:
+        return None
+    return url
+
+
+def _parse_text(lines: Iterable[str]) -> Iterator[ImportEntry]:
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield normalize_url(line), None
+
+
+def _parse_csv(lines: Iterable[str]) -> Iterator[ImportEntry]:
+    url_index, name_index = 0, None
+    for index, row in enumerate(csv.reader(lines)):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        header = [cell.strip().lower() for cell in row]
+        if index == 0 and "url" in header:
+            url_index = header.index("url")
+            name_index = header.index("name") if "name" in header else None
+            continue
+        if url_index >= len(row):
+            yield None, None
+            continue
+        name = row[name_index].strip() if name_index is not None and name_index < len(row) else None
+        yield normalize_url(row[url_index]), name or None
+
+
+def _parse_ndjson(lines: Iterable[str]) -> Iterator[ImportEntry]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield None, None
+            continue
+        if isinstance(item, str):
+            yield normalize_url(item), None
+        elif isinstance(item, dict) and isinstance(item.get("url"), str):
+            name = item.get("name")
+            yield normalize_url(item["url"]), name if isinstance(name, str) and name else None
+        else:
+            yield None, None
+
+
+_PARSERS = {
+    EndpointImportFormat.TEXT: _parse_text,
+    EndpointImportFormat.CSV: _parse_csv,
+    EndpointImportFormat.NDJSON: _parse_ndjson,
+}
+
+
+async def upsert_endpoint_urls(
+    session: AsyncSession,
+    entries: dict[str, Optional[str]],
+) -> Tuple[list[int], list[int]]:
+    """
+    Insert the URLs that do not exist yet, named after their URL unless a name is given.
+
+    Existing endpoints are left untouched and names are cut to the column length. Returns
+    (new IDs, existing IDs). The caller commits.
+
+    Only rows this insert added count as new: the lookups before and after the insert are
+    consistent reads of one snapshot (MySQL's default REPEATABLE READ), which does not see rows
+    committed concurrently by others. Those are picked up by the locking read at the end, which
+    sees the latest committed rows, and count as existing.
+    """
+    if not entries:
+        return [], []
+    urls = list(entries)
+    result = await session.execute(
+        select(col(EndpointDB.url), col(EndpointDB.id)).where(col(EndpointDB.url).in_(urls))
+    )
+    existing = dict(result.tuples().all())
+
+    new_urls = [url for url in urls if url not in existing]
+    if not new_urls:
+        return [], list(existing.values())
+
+    # A no-op update for URLs inserted concurrently since the lookup above
+    await session.execute(
+        mysql_insert(EndpointDB)
+        .values(
+            [
+                EndpointDB(
+                    url=url,
+                    name=(entries[url] or url)[:MAX_COLUMN_LENGTH],
+                    **url_search_fields(url),
+                ).model_dump(exclude={"id"})
+                for url in new_urls
+            ]
+        )
+        .on_duplicate_key_update(id=EndpointDB.id)
+    )
+    result = await session.execute(
+        select(col(EndpointDB.url), col(EndpointDB.id)).where(col(EndpointDB.url).in_(new_urls))
+    )
+    inserted = dict(result.tuples().all())
+
+    concurrent_urls = [url for url in new_urls if url not in inserted]
+    if concurrent_urls:
+        result = await session.execute(
+            select(col(EndpointDB.url), col(EndpointDB.id))
+            .where(col(EndpointDB.url).in_(concurrent_urls))
+            .with_for_update(read=True)
+        )
+        existing.update(result.tuples().all())
+    return list(inserted.values()), list(existing.values())
+
+
+def _read_chunk(entries: Iterator[ImportEntry], size: int) -> list[ImportEntry]:
+    return list(itertools.islice(entries, size))
+
+
+async def _schedule_tests(endpoint_ids: Sequence[int]) -> int:
+    if not endpoint_ids:
+        return 0
+    from .scheduler import get_scheduler
+
+    tasks = await get_scheduler().schedule_endpoint_tests(
+        endpoint_ids,
+        now() + datetime.timedelta(seconds=5),
+        check_endpoints=False,
+        lane=TaskLane.IMPORT,
+    )
+    return len(tasks)
+
+
+async def _import_chunk(job_id: int, chunk: list[ImportEntry]) -> None:
+    entries: dict[str, Optional[str]] = {}
+    invalid = duplicates = 0
+    for url, name in chunk:
+        if url is None:
+            invalid += 1
+        elif url in entries:
+            duplicates += 1
+        else:
+            entries[url] = name
+
+    async with sessionmanager.session() as session:
+        new_ids, existing_ids = await upsert_endpoint_urls(session, entries)
+        await session.commit()
+    scheduled = await _schedule_tests(new_ids)
+
+    async with sessionmanager.session() as session:
+        await session.execute(
+            update(EndpointImportJobDB)
+            .where(col(EndpointImportJobDB.id) == job_id)
+            .values(
+                lines_read=col(EndpointImportJobDB.lines_read) + len(chunk),
+                invalid_lines=col(EndpointImportJobDB.invalid_lines) + invalid,
+                duplicate_urls=col(EndpointImportJobDB.duplicate_urls) + duplicates,
+                inserted=col(EndpointImportJobDB.inserted) + len(new_ids),
+                existing=col(EndpointImportJobDB.existing) + len(existing_ids),
+                scheduled=col(EndpointImportJobDB.scheduled) + scheduled,
+            )
+        )
+        await session.commit()
+
+
+async def _finish_job(job_id: int, status: JobStatus, error: Optional[str] = None) -> None:
+    async with sessionmanager.session() as session:
+        await session.execute(
+            update(EndpointImportJobDB)
+            .where(col(EndpointImportJobDB.id) == job_id)
+            .values(status=status, error=error, finished_at=now())
+        )
+        await session.commit()
+
+
+async def run_import_job(job_id: int, path: str, import_format: EndpointImportFormat) -> None:
+    """
+    Import the endpoints of a spooled upload chunk by chunk, then delete the file.
+
+    Only one chunk of URLs is in memory at a time. URLs are deduplicated within each chunk, and
+    across chunks by the unique URL key. Endpoints that did not exist are queued for testing.
+    """
+    chunk_size = config.endpoint_import.chunk_size
+    logger.info(f"Starting endpoint import job {job_id}")
+    try:
+        file = await asyncio.to_thread(open, path, encoding="utf-8", errors="replace", newline="")
+        try:
+            entries = _PARSERS[import_format](file)
+            # Reading and parsing run in a thread, only one chunk at a time
+            while chunk := await asyncio.to_thread(_read_chunk, entries, chunk_size):
+                await _import_chunk(job_id, chunk)
+        finally:
+            file.close()
+    except Exception as e:
+        logger.error(f"Endpoint import job {job_id} failed: {e}")
+        await _finish_job(job_id, JobStatus.FAILED, str(e))
+        return
+    finally:
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except OSError:
+            pass
+
+    await _finish_job(job_id, JobStatus.DONE)
+    logger.info(f"Endpoint import job {job_id} finished")
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from enum import Enum
 from typing import Optional
 
+from sqlalchemy import VARBINARY, BigInteger, Column, ForeignKey, Index
 from sqlmodel import Field, Relationship
 
 from src.ai_model.models import AIModelDB, EndpointAIModelDB
@@ -20,14 +21,54 @@ class TaskStatus(str, Enum):
     RUNNING = "running"
     DONE = "done"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobStatus(str, Enum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class TaskLane(str, Enum):
+    MANUAL = "manual"
+    CIRCUIT_BREAKER = "circuit_breaker"
+    IMPORT = "import"
+    PERIODIC = "periodic"
+
+
+# Lanes in claiming order, highest priority first
+TASK_LANE_PRIORITY = [
+    TaskLane.MANUAL,
+    TaskLane.CIRCUIT_BREAKER,
+    TaskLane.IMPORT,
+    TaskLane.PERIODIC,
+]
 
 
 class EndpointDB(SQLModel, table=True):
+    __table_args__ = (
+        Index(
+            "ft_endpoint_name_url",
+            "name",
+            "url",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram",
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     url: str = Field(unique=True, index=True)
     name: str = Field(index=True)
+    # Derived from the URL for host and IP range searches, see `url_search_fields`
+    host: Optional[str] = Field(default=None, index=True)
+    ip_number: Optional[int] = Field(
+        default=None, sa_column=Column(BigInteger, index=True, nullable=True)
+    )
     created_at: datetime = Field(default_factory=now)
     status: EndpointStatusEnum = Field(default=EndpointStatusEnum.UNAVAILABLE)
+    next_test_at: Optional[datetime] = Field(default=None, index=True)
+    last_confirmed_at: Optional[datetime] = Field(default=None)
 
     ai_models: list["AIModelDB"] = Relationship(
         back_populates="endpoints",
@@ -60,7 +101,11 @@ class EndpointPerformanceDB(SQLModel, table=True):
 
     status: EndpointStatusEnum = Field(default=EndpointStatusEnum.UNAVAILABLE)
     ollama_version: Optional[str] = Field(default=None)
-    created_at: datetime = Field(default_factory=now)
+    created_at: datetime = Field(default_factory=now, index=True)
+    # Unchanged results only confirm the latest row: it stands for `samples` tests run between
+    # `created_at` and `last_confirmed_at`
+    last_confirmed_at: Optional[datetime] = Field(default=None)
+    samples: int = Field(default=1)
 
     endpoint_id: Optional[int] = Field(foreign_key="endpoint.id", default=None)
 
@@ -68,11 +113,74 @@ class EndpointPerformanceDB(SQLModel, table=True):
 
 
 class EndpointTestTask(SQLModel, table=True):
+    __table_args__ = (
+        # The tasks of an endpoint by status, latest first
+        Index(
+            "ix_endpoint_test_task_endpoint_status_time", "endpoint_id", "status", "scheduled_at"
+        ),
+        # Due tasks claimed by the workers, lane by lane
+        Index("ix_endpoint_test_task_status_lane_time", "status", "lane", "scheduled_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     endpoint_id: int = Field(foreign_key="endpoint.id", index=True)
     status: TaskStatus = Field(default=TaskStatus.PENDING)
+    lane: TaskLane = Field(default=TaskLane.PERIODIC)
     scheduled_at: datetime = Field(default_factory=now)
     last_tried: Optional[datetime] = Field(default=None)
-    created_at: datetime = Field(default_factory=now)
+    created_at: datetime = Field(default_factory=now, index=True)
+
+    attempts: int = Field(default=0)
+    worker_id: Optional[str] = Field(default=None)
+    lease_expires_at: Optional[datetime] = Field(default=None)
 
     endpoint: EndpointDB = Relationship(back_populates="test_tasks")
+
+
+class EndpointAvailabilityDayDB(SQLModel, table=True):
+    """
+    Availability of an endpoint over a UTC day, one bit per slot of `slot_minutes`.
+
+    A slot is tested if any test ran in it, and available if any of those tests succeeded.
+    """
+
+    endpoint_id: int = Field(
+        sa_column=Column(ForeignKey("endpoint.id", ondelete="CASCADE"), primary_key=True)
+    )
+    day: date = Field(primary_key=True)
+    slot_minutes: int
+    tested: bytes = Field(sa_column=Column(VARBINARY(255), nullable=False))
+    available: bytes = Field(sa_column=Column(VARBINARY(255), nullable=False))
+
+
+class EndpointImportJobDB(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: JobStatus = Field(default=JobStatus.RUNNING)
+    filename: Optional[str] = Field(default=None)
+
+    # Non-blank lines, comments and CSV headers excluded
+    lines_read: int = Field(default=0)
+    invalid_lines: int = Field(default=0)
+    # URLs repeated within a chunk of the upload
+    duplicate_urls: int = Field(default=0)
+    inserted: int = Field(default=0)
+    existing: int = Field(default=0)
+    scheduled: int = Field(default=0)
+
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=now, index=True)
+    finished_at: Optional[datetime] = Field(default=None)
+
+
+class EndpointDeleteJobDB(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: JobStatus = Field(default=JobStatus.RUNNING)
+
+    requested: int = Field(default=0)
+    deleted_endpoints: int = Field(default=0)
+    # Rows deleted from the endpoint tables and all their child tables
+    deleted_rows: int = Field(default=0)
+
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=now, index=True)
+    finished_at: Optional[datetime] = Field(default=None)
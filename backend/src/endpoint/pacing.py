@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+import math
+import random
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+from pydantic import BaseModel
+from sqlalchemy import func, or_, select, update
+from sqlmodel import col
+
+from src.config import ScannerConfig
+from src.database import DBSessionDep, sessionmanager
+from src.logging import get_logger
+from src.process_stats import get_latest_stats, publish_stats
+from src.setting.models import SystemSettingKey
+from src.setting.service import get_setting
+from src.utils import now
+
+from .models import EndpointDB, EndpointTestTask, TaskStatus
+
+if TYPE_CHECKING:
+    from .scheduler import SchedulerService
+
+logger = get_logger(__name__)
+
+PACING_STATS = "pacing"
+# Pacing metrics reported within this many ticks are resumed from by a new leader
+_RESTORE_TICKS = 10
+
+
+class PacingStats(BaseModel):
+    interval_hours: int = 0
+    last_tick_at: Optional[datetime.datetime] = None
+    due_endpoints: int = 0
+    scheduled_endpoints: int = 0
+    target_rate_per_minute: float = 0
+    current_rate_per_minute: float = 0
+    rate_factor: float = 1
+    backlog: int = 0
+    worker_utilization: Optional[float] = None
+    db_latency_ms: Optional[float] = None
+
+
+def _utcnow() -> datetime.datetime:
+    # The database stores naive UTC datetimes
+    return now().replace(tzinfo=None)
+
+
+def _due_endpoints_query(due_at: datetime.datetime, limit: int) -> Any:
+    """
+    The IDs of the endpoints due for a test at `due_at`, earliest first.
+    """
+    # NULLs (never tested) sort first
+    return (
+        select(col(EndpointDB.id))
+        .where(
+            or_(
+                col(EndpointDB.next_test_at).is_(None),
+                col(EndpointDB.next_test_at) <= due_at,
+            )
+        )
+        .order_by(col(EndpointDB.next_test_at))
+        .limit(limit)
+    )
+
+
+async def get_pacing_stats(session: DBSessionDep) -> PacingStats:
+    """
+    Get the pacing metrics reported last by the leader.
+    """
+    latest = await get_latest_stats(session, PACING_STATS, PacingStats)
+    return latest.stats if latest is not None else PacingStats()
+
+
+class ScanPacer:
+    """
+    Spread periodic endpoint tests evenly over time.
+
+    Every endpoint carries its own `next_test_at`, computed from its stability after each test.
+    Every tick, the pacer enqueues the endpoints due soonest, as many as the current rate allows,
+    with run dates spread (and jittered) across the tick. The rate is the configured target rate,
+    or the rate that tests every endpoint due within the update interval by its end. It is scaled
+    down while the queue is backing up or the database is slow, and recovers once both are
+    healthy again.
+    """
+
+    def __init__(self, config: ScannerConfig, scheduler: "SchedulerService"):
+        self.config = config
+        self.scheduler = scheduler
+        self._lock = asyncio.Lock()
+        self._carry = 0.0
+        self._stats = PacingStats()
+        self._restored = False
+
+    @property
+    def stats(self) -> PacingStats:
+        return self._stats.model_copy()
+
+    @property
+    def interval_hours(self) -> int:
+        return self._stats.interval_hours
+
+    @interval_hours.setter
+    def interval_hours(self, value: int) -> None:
+        self._stats.interval_hours = value
+
+    async def tick(self) -> None:
+        """
+        Enqueue the next slice of due endpoints, then report the pacing metrics.
+        """
+        try:
+            await self._tick()
+        finally:
+            await self._publish()
+
+    async def _publish(self) -> None:
+        # Only the leader paces, other processes serve the metrics from the database
+        try:
+            await publish_stats(PACING_STATS, self._stats)
+        except Exception as e:
+            logger.error(f"Error reporting pacing metrics: {e}")
+
+    async def _restore(self) -> None:
+        """
+        Resume from the rate of the previous leader, so that a new leader does not start at full
+        rate while the queue is backing up.
+        """
+        async with sessionmanager.session() as session:
+            previous = await get_latest_stats(session, PACING_STATS, PacingStats)
+        max_age = datetime.timedelta(seconds=self.config.pacing_tick_seconds * _RESTORE_TICKS)
+        if previous is None or previous.updated_at < _utcnow() - max_age:
+            return
+        self._stats.rate_factor = previous.stats.rate_factor
+        self._stats.scheduled_endpoints = previous.stats.scheduled_endpoints
+
+    async def _tick(self) -> None:
+        async with self._lock:
+            if not self._restored:
+                await self._restore()
+                self._restored = True
+
+            # The interval may have been changed from another process
+            async with sessionmanager.session() as session:
+                setting = await get_setting(
+                    session, SystemSettingKey.UPDATE_ENDPOINT_TASK_INTERVAL_HOURS
+                )
+                self.interval_hours = int(setting.value)
+            if self.interval_hours <= 0:
+                return
+
+            await self._adjust_rate()
+
+            _now = now()
+            tick = datetime.timedelta(seconds=self.config.pacing_tick_seconds)
+            window = datetime.timedelta(hours=self.interval_hours)
+            async with sessionmanager.session() as session:
+                due = (
+                    await session.execute(
+                        select(func.count(col(EndpointDB.id))).where(
+                            or_(
+                                col(EndpointDB.next_test_at).is_(None),
+                                col(EndpointDB.next_test_at) <= _now + window,
+                            )
+                        )
+                    )
+                ).scalar_one()
+
+            target = self.config.target_rate_per_minute or due / (window.total_seconds() / 60)
+            rate = target * self._stats.rate_factor
+            self._stats.last_tick_at = _now
+            self._stats.due_endpoints = due
+            self._stats.target_rate_per_minute = target
+            self._stats.current_rate_per_minute = rate
+
+            budget = rate * tick.total_seconds() / 60 + self._carry
+            count = math.floor(budget)
+            self._carry = budget - count
+            if count <= 0:
+                return
+
+            async with sessionmanager.session() as session:
+                result = await session.execute(_due_endpoints_query(_now + tick, count))
+                endpoint_ids = list(result.scalars().all())
+                if not endpoint_ids:
+                    self._carry = 0.0
+                    return
+
+                # Provisional next test time, replaced by the stability-based one after the test
+                await session.execute(
+                    update(EndpointDB)
+                    .where(col(EndpointDB.id).in_(endpoint_ids))
+                    .values(next_test_at=_now + window)
+                )
+                await session.commit()
+
+            # Randomize the order inside the slice to improve detection rate
+            random.shuffle(endpoint_ids)
+
+        tasks = await self.scheduler.schedule_endpoint_tests(
+            endpoint_ids,
+            _now,
+            check_endpoints=False,
+            spread=tick,
+            jitter=self.config.pacing_jitter,
+        )
+        self._stats.scheduled_endpoints += len(tasks)
+        logger.info(f"Scheduled {len(tasks)} tasks at {rate:.2f} tests/min ({due} due)")
+
+    async def _adjust_rate(self) -> None:
+        """
+        Scale the rate by the observed worker utilization, queue backlog and DB latency.
+        """
+        overdue = now() - datetime.timedelta(seconds=self.config.pacing_tick_seconds)
+        started = time.perf_counter()
+        async with sessionmanager.session() as session:
+            backlog = (
+                await session.execute(
+                    select(func.count(col(EndpointTestTask.id))).where(
+                        col(EndpointTestTask.status) == TaskStatus.PENDING,
+                        col(EndpointTestTask.scheduled_at) <= overdue,
+                    )
+                )
+            ).scalar_one()
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        # Imported here so that `python -m src.endpoint.worker` does not import itself twice
+        from .worker import get_worker_pool_if_running
+
+        pool = get_worker_pool_if_running()
+        utilization = pool.in_flight / pool.config.concurrency if pool is not None else None
+
+        self._stats.backlog = backlog
+        self._stats.db_latency_ms = latency_ms
+        self._stats.worker_utilization = utilization
+
+        factor = self._stats.rate_factor
+        if backlog > self.config.concurrency or latency_ms > self.config.max_db_latency_ms:
+            factor = max(factor * 0.7, self.config.min_rate_factor)
+        elif utilization is None or utilization < self.config.high_utilization:
+            factor = min(factor + 0.1, 1.0)
+        if factor != self._stats.rate_factor:
+            logger.info(
+                f"Scan rate factor {self._stats.rate_factor:.2f} -> {factor:.2f} "
+                f"(backlog {backlog}, db latency {latency_ms:.0f} ms, utilization {utilization})"
+            )
+            self._stats.rate_factor = factor
@@ -0,0 +1,130 @@
+import asyncio
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlmodel import col, select
+
+from src.config import ScannerConfig
+from src.database import sessionmanager
+from src.logging import get_logger
+from src.ollama.performance_test import EndpointTestResult
+
+from .models import EndpointDB
+from .service import save_endpoint_test_results
+from .task_queue import complete_tasks, fail_tasks
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class TestOutcome:
+    task_id: int
+    endpoint_id: int
+    # None when the test failed, or the endpoint no longer exists and nothing is written
+    results: Optional[EndpointTestResult] = None
+    failed: bool = False
+
+
+class ResultSink:
+    """
+    Write-behind stage between the test workers and the database.
+
+    Workers push the outcome of each test, and a single writer coalesces the outcomes of many
+    endpoints, including their task status updates, into one transaction per batch. A batch is
+    written once it is full or `result_flush_seconds` after its first outcome. If a batch fails,
+    its outcomes are retried one by one, so a single bad result cannot drop the others.
+    """
+
+    def __init__(self, config: ScannerConfig):
+        self.config = config
+        self._queue: asyncio.Queue[Optional[TestOutcome]] = asyncio.Queue(
+            maxsize=config.result_queue_size
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """
+        Write the pending outcomes and stop the writer.
+        """
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def put(self, outcome: TestOutcome) -> None:
+        """
+        Queue an outcome, waiting while the writer is behind.
+        """
+        await self._queue.put(outcome)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            outcome = await self._queue.get()
+            if outcome is None:
+                break
+
+            batch = [outcome]
+            deadline = loop.time() + self.config.result_flush_seconds
+            while len(batch) < self.config.result_batch_size:
+                try:
+                    outcome = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if outcome is None:
+                    stopping = True
+                    break
+                batch.append(outcome)
+
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[TestOutcome]) -> None:
+        try:
+            await self._write(batch)
+            logger.debug(f"Wrote {len(batch)} test outcomes")
+        except Exception as e:
+            logger.warning(f"Error writing {len(batch)} test outcomes, retrying one by one: {e}")
+            for outcome in batch:
+                try:
+                    await self._write([outcome])
+                except Exception as e:
+                    logger.error(f"Error writing outcome of task {outcome.task_id}: {e}")
+                    await self._write_failure(outcome)
+
+    async def _write_failure(self, outcome: TestOutcome) -> None:
+        try:
+            await self._write([TestOutcome(outcome.task_id, outcome.endpoint_id, failed=True)])
+        except Exception as e:
+            # The task's lease expires and it is retried
+            logger.error(f"Error marking task {outcome.task_id} as failed: {e}")
+
+    async def _write(self, batch: List[TestOutcome]) -> None:
+        # A consistent order keeps concurrent writers from deadlocking on the same rows
+        batch = sorted(batch, key=lambda outcome: outcome.endpoint_id)
+        async with sessionmanager.session() as session:
+            # Endpoints deleted during their test, possibly from another process, get no results.
+            # The lock keeps the others from being deleted before the batch is written.
+            endpoint_ids = [outcome.endpoint_id for outcome in batch if outcome.results is not None]
+            existing: set[int] = set()
+            if endpoint_ids:
+                result = await session.execute(
+                    select(col(EndpointDB.id))
+                    .where(col(EndpointDB.id).in_(endpoint_ids))
+                    .order_by(col(EndpointDB.id))
+                    .with_for_update()
+                )
+                existing = set(result.scalars().all())
+            for outcome in batch:
+                if outcome.results is not None and outcome.endpoint_id in existing:
+                    await save_endpoint_test_results(session, outcome.endpoint_id, outcome.results)
+            await complete_tasks(
+                session, [outcome.task_id for outcome in batch if not outcome.failed]
+            )
+            await fail_tasks(session, [outcome.task_id for outcome in batch if outcome.failed])
+            await session.commit()
@@ -1,10 +1,19 @@
-from typing import Optional, cast
+from typing import List, Optional, cast
 
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from src.endpoint.models import EndpointDB, EndpointTestTask
+from src.endpoint.models import (
+    EndpointDB,
+    EndpointDeleteJobDB,
+    EndpointImportJobDB,
+    EndpointTestTask,
+)
+from src.endpoint.pacing import PacingStats, get_pacing_stats
 from src.endpoint.schemas import (
     BatchOperationResult,
+    CancelPeriodicTasksResult,
+    EndpointDeleteJobInfo,
+    EndpointImportJobInfo,
     EndpointInfo,
     TaskInfo,
 )
@@ -12,13 +21,22 @@ from src.endpoint.service import (
     batch_create_or_update_endpoints,
     batch_delete_endpoints,
     batch_test_endpoints,
+    cancel_periodic_tasks,
     create_or_update_endpoint,
     delete_endpoint,
+    get_endpoint_delete_job,
+    get_endpoint_delete_jobs,
+    get_endpoint_import_job,
+    get_endpoint_import_jobs,
     get_latest_task_for_endpoint,
     get_task_by_id,
     manual_trigger_endpoint_test,
+    start_endpoint_import,
     update_endpoint,
 )
+from src.endpoint.utils import TokenCounterStats, get_token_counter_stats
+from src.ollama.connector import ScanConnectorStats, get_scan_connector_stats
+from src.process_stats import ProcessStats
 from src.user.service import get_current_admin_user
 
 endpoint_admin_router = APIRouter(tags=["endpoint"], dependencies=[Depends(get_current_admin_user)])
@@ -77,6 +95,41 @@ async def _batch_create_endpoints(
     return None
 
 
+@endpoint_admin_router.post(
+    "/import",
+    response_model=EndpointImportJobInfo,
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Upload a text, CSV or NDJSON list of endpoints and import it in the background",
+    response_description="The import job, poll it for progress",
+)
+async def _start_endpoint_import(
+    job: EndpointImportJobDB = Depends(start_endpoint_import),
+) -> EndpointImportJobInfo:
+    return EndpointImportJobInfo.model_validate(job)
+
+
+@endpoint_admin_router.get(
+    "/import",
+    response_model=List[EndpointImportJobInfo],
+    description="Get the most recent endpoint import jobs",
+)
+async def _get_endpoint_import_jobs(
+    jobs: List[EndpointImportJobDB] = Depends(get_endpoint_import_jobs),
+) -> List[EndpointImportJobInfo]:
+    return [EndpointImportJobInfo.model_validate(job) for job in jobs]
+
+
+@endpoint_admin_router.get(
+    "/import/{job_id:int}",
+    response_model=EndpointImportJobInfo,
+    description="Get the progress of an endpoint import job",
+)
+async def _get_endpoint_import_job(
+    job: EndpointImportJobDB = Depends(get_endpoint_import_job),
+) -> EndpointImportJobInfo:
+    return EndpointImportJobInfo.model_validate(job)
+
+
 @endpoint_admin_router.post(
     "/{endpoint_id:int}/test",
     response_model=TaskInfo,
@@ -105,6 +158,7 @@ async def _get_latest_task(
         id=cast(int, task.id),
         endpoint_id=task.endpoint_id,
         status=task.status,
+        lane=task.lane,
         scheduled_at=task.scheduled_at,
         last_tried=task.last_tried,
         created_at=task.created_at,
@@ -124,6 +178,7 @@ async def _get_task_by_id(
         id=cast(int, task.id),
         endpoint_id=task.endpoint_id,
         status=task.status,
+        lane=task.lane,
         scheduled_at=task.scheduled_at,
         last_tried=task.last_tried,
         created_at=task.created_at,
@@ -148,11 +203,84 @@ async def _batch_test_endpoints(
     "/batch",
     response_model=BatchOperationResult,
     status_code=status.HTTP_200_OK,
-    description="Batch delete multiple endpoints",
-    response_description="Result of batch delete operation",
+    description="Batch delete multiple endpoints, large batches are deleted in the background",
+    response_description="Result of batch delete operation, with the ID of the delete job",
     dependencies=[Depends(get_current_admin_user)],
 )
 async def _batch_delete_endpoints(
     batch_operation_result: BatchOperationResult = Depends(batch_delete_endpoints),
 ) -> BatchOperationResult:
     return batch_operation_result
+
+
+@endpoint_admin_router.get(
+    "/delete-jobs",
+    response_model=List[EndpointDeleteJobInfo],
+    description="Get the most recent endpoint delete jobs",
+)
+async def _get_endpoint_delete_jobs(
+    jobs: List[EndpointDeleteJobDB] = Depends(get_endpoint_delete_jobs),
+) -> List[EndpointDeleteJobInfo]:
+    return [EndpointDeleteJobInfo.model_validate(job) for job in jobs]
+
+
+@endpoint_admin_router.get(
+    "/delete-jobs/{job_id:int}",
+    response_model=EndpointDeleteJobInfo,
+    description="Get the progress of an endpoint delete job",
+)
+async def _get_endpoint_delete_job(
+    job: EndpointDeleteJobDB = Depends(get_endpoint_delete_job),
+) -> EndpointDeleteJobInfo:
+    return EndpointDeleteJobInfo.model_validate(job)
+
+
+@endpoint_admin_router.post(
+    "/tasks/cancel-periodic",
+    response_model=CancelPeriodicTasksResult,
+    description="Cancel queued (and optionally running) periodic test tasks",
+    response_description="Number of cancelled tasks",
+)
+async def _cancel_periodic_tasks(
+    result: CancelPeriodicTasksResult = Depends(cancel_periodic_tasks),
+) -> CancelPeriodicTasksResult:
+    return result
+
+
+@endpoint_admin_router.get(
+    "/stats/token-counter",
+    response_model=List[ProcessStats[TokenCounterStats]],
+    description="Get token counter metrics of every process, including whether tiktoken or the "
+    "heuristic is in use",
+    response_description="The token counter metrics of every process",
+)
+async def _get_token_counter_stats(
+    stats: List[ProcessStats[TokenCounterStats]] = Depends(get_token_counter_stats),
+) -> List[ProcessStats[TokenCounterStats]]:
+    return stats
+
+
+@endpoint_admin_router.get(
+    "/stats/scan-connector",
+    response_model=List[ProcessStats[ScanConnectorStats]],
+    description="Get connection reuse and DNS cache metrics of the endpoint test connector of "
+    "every process",
+    response_description="The scan connector metrics of every process",
+)
+async def _get_scan_connector_stats(
+    stats: List[ProcessStats[ScanConnectorStats]] = Depends(get_scan_connector_stats),
+) -> List[ProcessStats[ScanConnectorStats]]:
+    return stats
+
+
+@endpoint_admin_router.get(
+    "/stats/pacing",
+    response_model=PacingStats,
+    description="Get the progress and current rate of the periodic endpoint sweep, as last "
+    "reported by the leader process",
+    response_description="The scan pacing metrics",
+)
+async def _get_pacing_stats(
+    stats: PacingStats = Depends(get_pacing_stats),
+) -> PacingStats:
+    return stats
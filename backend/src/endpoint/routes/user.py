@@ -1,14 +1,19 @@
 from fastapi import APIRouter, Depends
-from fastapi_pagination import Page
 
 from src.endpoint.schemas import (
+    EndpointAIModelInfo,
+    EndpointAvailability,
     EndpointWithAIModelCount,
     EndpointWithAIModels,
 )
 from src.endpoint.service import (
+    get_endpoint_ai_models_by_cursor,
     get_endpoint_with_ai_models,
+    get_endpoints_availability,
     get_endpoints_with_ai_model_counts,
+    get_endpoints_with_ai_model_counts_by_cursor,
 )
+from src.pagination import CountedCursorPage, CountedPage
 from src.user.service import get_current_user
 
 endpoint_user_router = APIRouter(tags=["endpoint"], dependencies=[Depends(get_current_user)])
@@ -16,16 +21,44 @@ endpoint_user_router = APIRouter(tags=["endpoint"], dependencies=[Depends(get_cu
 
 @endpoint_user_router.get(
     "/",
-    response_model=Page[EndpointWithAIModelCount],
+    response_model=CountedPage[EndpointWithAIModelCount],
     description="Get all endpoints with recent performance tests and AI model counts, with support for filtering, searching and sorting",
     response_description="List of endpoints with their recent performance tests and AI model counts",
 )
 async def _get_endpoints(
-    endpoint_pages: Page[EndpointWithAIModelCount] = Depends(get_endpoints_with_ai_model_counts),
-) -> Page[EndpointWithAIModelCount]:
+    endpoint_pages: CountedPage[EndpointWithAIModelCount] = Depends(
+        get_endpoints_with_ai_model_counts
+    ),
+) -> CountedPage[EndpointWithAIModelCount]:
     return endpoint_pages
 
 
+@endpoint_user_router.get(
+    "/cursor",
+    response_model=CountedCursorPage[EndpointWithAIModelCount],
+    description="Get endpoints with recent performance tests and AI model counts by cursor, with support for filtering, searching and sorting",
+    response_description="A page of endpoints and the cursors of its neighbours, the total only if asked for",
+)
+async def _get_endpoints_by_cursor(
+    endpoint_page: CountedCursorPage[EndpointWithAIModelCount] = Depends(
+        get_endpoints_with_ai_model_counts_by_cursor
+    ),
+) -> CountedCursorPage[EndpointWithAIModelCount]:
+    return endpoint_page
+
+
+@endpoint_user_router.get(
+    "/availability",
+    response_model=list[EndpointAvailability],
+    description="Get the uptime and daily availability of several endpoints over the last days",
+    response_description="The uptime of each endpoint, overall and per day",
+)
+async def _get_endpoints_availability(
+    availability: list[EndpointAvailability] = Depends(get_endpoints_availability),
+) -> list[EndpointAvailability]:
+    return availability
+
+
 @endpoint_user_router.get(
     "/{endpoint_id:int}",
     response_model=EndpointWithAIModels,
@@ -36,3 +69,17 @@ async def _get_endpoint_by_id(
     endpoint_with_ai_models: EndpointWithAIModels = Depends(get_endpoint_with_ai_models),
 ) -> EndpointWithAIModels:
     return endpoint_with_ai_models
+
+
+@endpoint_user_router.get(
+    "/{endpoint_id:int}/ai_models",
+    response_model=CountedCursorPage[EndpointAIModelInfo],
+    description="Get the AI models of an endpoint by cursor",
+    response_description="A page of AI models and the cursors of its neighbours",
+)
+async def _get_endpoint_ai_models(
+    ai_model_page: CountedCursorPage[EndpointAIModelInfo] = Depends(
+        get_endpoint_ai_models_by_cursor
+    ),
+) -> CountedCursorPage[EndpointAIModelInfo]:
+    return ai_model_page
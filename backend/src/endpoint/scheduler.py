@@ -1,32 +1,60 @@
-import asyncio
 import datetime
 import random
-from typing import List, Optional
+from typing import Any, List, Optional, Sequence
 
 from apscheduler.executors.asyncio import AsyncIOExecutor
 from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from sqlalchemy import delete, select
+from sqlalchemy import and_, case, func, insert, literal, or_, select, update
 from sqlmodel import col
 
+from src.config import get_config
 from src.database import sessionmanager
 from src.logging import get_logger
 from src.setting.models import SystemSettingKey
 from src.setting.service import get_setting
 from src.utils import now
 
-from .models import EndpointDB, EndpointTestTask, TaskStatus
-from .service import test_and_update_endpoint_and_models
+from .models import TASK_LANE_PRIORITY, EndpointDB, EndpointTestTask, TaskLane, TaskStatus
+from .pacing import ScanPacer
+from .search import backfill_url_search_fields
+from .task_queue import release_expired_leases
 
 logger = get_logger(__name__)
 
-# Concurrency control semaphore
-max_concurrent_tasks = 50
-semaphore = asyncio.Semaphore(max_concurrent_tasks)
+# Number of endpoints handled per set-based scheduling query
+SCHEDULE_BATCH_SIZE = 500
 # Singleton instance
 _scheduler_instance = None
 
 
+def _queued_tasks_query(
+    endpoint_ids: Sequence[int],
+    skip_statuses: Sequence[TaskStatus],
+    skip_since: datetime.datetime,
+) -> Any:
+    """
+    The pending tasks of some endpoints, and their tasks in `skip_statuses` scheduled after
+    `skip_since`.
+    """
+    return select(
+        col(EndpointTestTask.id),
+        col(EndpointTestTask.endpoint_id),
+        col(EndpointTestTask.status),
+        col(EndpointTestTask.scheduled_at),
+        col(EndpointTestTask.lane),
+    ).where(
+        col(EndpointTestTask.endpoint_id).in_(endpoint_ids),
+        or_(
+            col(EndpointTestTask.status) == TaskStatus.PENDING,
+            and_(
+                col(EndpointTestTask.status).in_(skip_statuses),
+                col(EndpointTestTask.scheduled_at) >= skip_since,
+            ),
+        ),
+    )
+
+
 # Configure scheduler with limited thread pool executor
 def get_scheduler() -> "SchedulerService":
     global _scheduler_instance
@@ -37,10 +65,13 @@ def get_scheduler() -> "SchedulerService":
 
 class SchedulerService:
     """
-    Service for scheduling and managing endpoint test tasks using APScheduler.
+    Service for enqueuing endpoint test tasks and running periodic jobs using APScheduler.
+
+    The tasks themselves are executed by the `TestWorkerPool` claiming them from the database.
     """
 
     def __init__(self):
+        self.pacer = ScanPacer(get_config().scanner, self)
         executors = {
             "default": AsyncIOExecutor(),
             "threadpool": ThreadPoolExecutor(max_workers=20),
@@ -51,24 +82,23 @@ class SchedulerService:
 
     async def start(self):
         """
-        Initialize the scheduler, recover pending tasks and schedule periodic tasks.
+        Initialize the scheduler, release interrupted tasks and schedule periodic tasks.
         """
         if self.is_running:
             return
 
         logger.info("Starting scheduler service...")
 
-        # Recover and schedule
-        # await self.recover_pending_tasks()
-        # self.scheduler.add_job(
-        #     self.recover_pending_tasks,
-        #     "date",
-        #     id="recover_pending_tasks",
-        #     replace_existing=True,
-        #     run_date=now() + datetime.timedelta(seconds=5),
-        # )
-        await self.remove_interupted_tasks()
+        # Hand tasks interrupted by a previous shutdown back to the queue
+        async with sessionmanager.session() as session:
+            await release_expired_leases(session)
         await self.schedule_periodic_endpoint_updates(immediate=True)
+        self.schedule_retention()
+        self.schedule_count_reconciliation()
+        self.schedule_usage_rollup()
+        self.scheduler.add_job(
+            backfill_url_search_fields, id="url_search_fields_backfill", replace_existing=True
+        )
         self.scheduler.start()
         self.is_running = True
         logger.info("Scheduler service started")
@@ -85,50 +115,12 @@ class SchedulerService:
         self.is_running = False
         logger.info("Scheduler service shut down")
 
-    async def remove_interupted_tasks(self) -> None:
-        """
-        Remove all interupted tasks from the database.
-        """
-        logger.info("Removing interupted tasks...")
-        async with sessionmanager.session() as session:
-            await session.execute(
-                delete(EndpointTestTask).where(
-                    col(EndpointTestTask.status).in_([TaskStatus.PENDING, TaskStatus.RUNNING]),
-                )
-            )
-            await session.commit()
-
-    async def recover_pending_tasks(self) -> None:
-        """
-        Recover all pending or running tasks from the database and reschedule them with throttling.
-        """
-        logger.info("Recovering pending tasks...")
-        async with sessionmanager.session() as session:
-            query = select(col(EndpointTestTask.id), col(EndpointTestTask.endpoint_id)).where(
-                col(EndpointTestTask.status).in_([TaskStatus.PENDING, TaskStatus.RUNNING]),
-                col(EndpointTestTask.scheduled_at) <= now(),
-            )
-            result = await session.execute(query)
-            tasks = result.all()
-
-        logger.info(f"Found {len(tasks)} pending or running tasks to recover")
-        # Throttled rescheduling
-        for task in tasks:
-            if task[0] is not None:
-                run_date = now() + datetime.timedelta(seconds=30)
-                self.scheduler.add_job(
-                    self.run_task,
-                    "date",
-                    id=f"task_{task[0]}",
-                    run_date=run_date,
-                    args=[task[0], task[1]],
-                    replace_existing=True,
-                )
-                await asyncio.sleep(0.1)  # small delay to avoid burst
-
     async def schedule_periodic_endpoint_updates(self, immediate: bool = False):
         """
         Schedule periodic endpoint updates based on system settings.
+
+        The update interval is the base interval between two tests of an endpoint, adapted per
+        endpoint to its stability. The pacer enqueues due endpoints every tick.
         """
         logger.info("Scheduling periodic endpoint updates...")
         # Fetch interval setting
@@ -138,186 +130,230 @@ class SchedulerService:
             )
             interval_hours = int(setting.value)
 
+        self.pacer.interval_hours = interval_hours
         if interval_hours <= 0:
+            # The job keeps running so that a new interval set from another process is noticed
             logger.warning("Update interval is 0, skipping periodic endpoint updates")
-            return
 
-        # Remove existing
-        if self.scheduler.get_job("periodic_endpoint_updates"):
-            self.scheduler.remove_job("periodic_endpoint_updates")
-
-        # Add cron job
+        trigger_kwargs = {}
+        if immediate:
+            trigger_kwargs["next_run_time"] = now() + datetime.timedelta(seconds=10)
         self.scheduler.add_job(
-            self.update_all_endpoints,
+            self.pacer.tick,
             "interval",
-            hours=interval_hours,
+            seconds=self.pacer.config.pacing_tick_seconds,
             id="periodic_endpoint_updates",
             replace_existing=True,
-            next_run_time=now() + datetime.timedelta(seconds=10) if immediate else None,
+            **trigger_kwargs,
         )
         logger.info(f"Scheduled periodic endpoint updates every {interval_hours} hours")
 
-    async def update_all_endpoints(self):
+    def schedule_retention(self):
         """
-        Update all endpoints by creating and scheduling tasks in batches.
+        Schedule the periodic rollup and purge of old results, first shortly after startup.
         """
-        async with sessionmanager.session() as session:
-            interval_hours = await get_setting(
-                session, SystemSettingKey.UPDATE_ENDPOINT_TASK_INTERVAL_HOURS
-            )
-            interval_hours = int(interval_hours.value)
+        retention_config = get_config().retention
+        if not retention_config.enabled:
+            return
 
-        logger.info("Starting periodic update for all endpoints...")
-        async with sessionmanager.session() as session:
-            result = await session.execute(select(col(EndpointDB.id)))
-            endpoint_ids: List[int | None] = list(result.scalars().all())
-
-        # Randomize endpoint IDs to improve detection rate
-        random.shuffle(endpoint_ids)
-
-        logger.info(f"Found {len(endpoint_ids)} endpoints to update")
-        batch_size = 500
-        count = 0
-        for i in range(0, len(endpoint_ids), batch_size):
-            batch = endpoint_ids[i : i + batch_size if i + batch_size < len(endpoint_ids) else None]
-            tasks_to_schedule = []
-            async with sessionmanager.session() as session:
-                for endpoint_id in batch:
-                    scheduled = now() + datetime.timedelta(seconds=30)
-                    if endpoint_id is None:
-                        continue
+        from src.retention.service import run_retention
 
-                    # skip if task exists and done in interval
-                    q = select(EndpointTestTask).where(
-                        col(EndpointTestTask.endpoint_id) == endpoint_id,
-                        col(EndpointTestTask.status).in_([TaskStatus.DONE, TaskStatus.RUNNING]),
-                        col(EndpointTestTask.scheduled_at)
-                        >= scheduled - datetime.timedelta(hours=interval_hours // 2),
-                    )
-                    res = await session.execute(q)
-                    if res.scalars().first() is not None:
-                        continue
+        self.scheduler.add_job(
+            run_retention,
+            "interval",
+            hours=retention_config.run_interval_hours,
+            id="retention",
+            replace_existing=True,
+            next_run_time=now() + datetime.timedelta(minutes=1),
+        )
 
-                    # update if task exists and pending in future
-                    q = select(EndpointTestTask).where(
-                        col(EndpointTestTask.endpoint_id) == endpoint_id,
-                        col(EndpointTestTask.status) == TaskStatus.PENDING,
-                        col(EndpointTestTask.scheduled_at) >= scheduled,
-                    )
-                    res = await session.execute(q)
-                    task = res.scalars().first()
-                    if task is not None:
-                        task.scheduled_at = scheduled
-                    else:
-                        task = EndpointTestTask(endpoint_id=endpoint_id, scheduled_at=scheduled)
-                    # task = EndpointTestTask(endpoint_id=endpoint_id, scheduled_at=scheduled)
-                    session.add(task)
-                    await session.commit()
-                    await session.refresh(task)
-                    tasks_to_schedule.append((task.id, endpoint_id, scheduled))
-                await session.commit()
+    def schedule_count_reconciliation(self):
+        """
+        Schedule the periodic recount of the endpoints of the AI models, first right after startup.
+        """
+        interval_hours = get_config().ai_model.count_reconcile_interval_hours
+        if interval_hours <= 0:
+            return
 
-            for task_id, eid, run_date in tasks_to_schedule:
-                self.scheduler.add_job(
-                    self.run_task,
-                    "date",
-                    id=f"task_{task_id}",
-                    run_date=run_date,
-                    args=[task_id, eid],
-                    replace_existing=True,
-                )
-            count += batch_size
-            if count > len(endpoint_ids):
-                count = len(endpoint_ids)
-            logger.info(
-                f"Scheduled {len(tasks_to_schedule)} tasks ({count}/{len(endpoint_ids)} {count/len(endpoint_ids)*100:.2f}%)"
-            )
-            await asyncio.sleep(2)
+        from src.ai_model.service import reconcile_endpoint_counts
 
-    async def schedule_endpoint_test(
-        self, endpoint_id: int, run_date: Optional[datetime.datetime] = None
-    ) -> Optional[EndpointTestTask]:
-        logger.info(f"Scheduling single test for {endpoint_id}")
-        if run_date is None:
-            run_date = now() + datetime.timedelta(seconds=5)
+        self.scheduler.add_job(
+            reconcile_endpoint_counts,
+            "interval",
+            hours=interval_hours,
+            id="endpoint_count_reconciliation",
+            replace_existing=True,
+            next_run_time=now() + datetime.timedelta(seconds=30),
+        )
 
-        async with sessionmanager.session() as session:
-            ep = (
-                (await session.execute(select(EndpointDB).where(col(EndpointDB.id) == endpoint_id)))
-                .scalars()
-                .first()
-            )
-            if not ep:
-                logger.error("Endpoint not found")
-                return None
-
-            # skip if task exists and is running in 10 min
-            res = await session.execute(
-                select(EndpointTestTask).where(
-                    col(EndpointTestTask.endpoint_id) == endpoint_id,
-                    col(EndpointTestTask.status) == TaskStatus.RUNNING,
-                    col(EndpointTestTask.scheduled_at) >= now() - datetime.timedelta(minutes=10),
-                )
-            )
-            if res.scalars().first() is not None:
-                logger.info("Existing running task, skip")
-                return None
-
-            # check if task exists and pending in future
-            res = await session.execute(
-                select(EndpointTestTask).where(
-                    col(EndpointTestTask.endpoint_id) == endpoint_id,
-                    col(EndpointTestTask.status) == TaskStatus.PENDING,
-                    col(EndpointTestTask.scheduled_at) >= run_date,
-                )
-            )
-            task = res.scalars().first()
-            if task is not None:
-                logger.info("Existing later task, update it")
-                task.scheduled_at = run_date
-            else:
-                task = EndpointTestTask(endpoint_id=endpoint_id, scheduled_at=run_date)
-            session.add(task)
-            await session.commit()
-            await session.refresh(task)
+    def schedule_usage_rollup(self):
+        """
+        Schedule the periodic rollup of the API key usage logs, first right after startup.
+        """
+        interval_minutes = get_config().api_key_usage.rollup_interval_minutes
+        if interval_minutes <= 0:
+            return
+
+        from src.retention.usage import roll_up_usage
 
         self.scheduler.add_job(
-            self.run_task,
-            "date",
-            id=f"task_{task.id}",
-            run_date=run_date,
-            args=[task.id, endpoint_id],
+            roll_up_usage,
+            "interval",
+            minutes=interval_minutes,
+            id="usage_rollup",
             replace_existing=True,
+            next_run_time=now() + datetime.timedelta(seconds=20),
         )
-        return task
 
-    async def run_task(self, task_id: int, endpoint_id: int):
+    async def schedule_endpoint_tests(
+        self,
+        endpoint_ids: Sequence[int],
+        run_date: Optional[datetime.datetime] = None,
+        skip_statuses: Sequence[TaskStatus] = (TaskStatus.RUNNING,),
+        skip_since: Optional[datetime.datetime] = None,
+        check_endpoints: bool = True,
+        spread: Optional[datetime.timedelta] = None,
+        jitter: float = 0,
+        lane: TaskLane = TaskLane.PERIODIC,
+    ) -> List[EndpointTestTask]:
         """
-        Run a single endpoint test task with concurrency control and safe session handling.
+        Schedule tests for many endpoints with set-based queries.
+
+        For each endpoint the test is skipped if a task in `skip_statuses` was scheduled after
+        `skip_since` or a pending task will already run before its run date, a later pending task
+        is moved to the run date, and otherwise a new task is created. New tasks are created with
+        a single multi-row INSERT per batch.
+
+        Tasks are queued in `lane`. A pending task of a lower-priority lane is promoted to `lane`
+        (and moved to the run date if that is earlier) instead of queuing a second test.
+
+        With `spread`, run dates are distributed evenly over [run_date, run_date + spread), each
+        shifted randomly by up to `jitter` slots.
         """
-        async with semaphore:
-            logger.info(f"Running task {task_id} for endpoint {endpoint_id}")
+        if run_date is None:
+            run_date = now() + datetime.timedelta(seconds=5)
+        if skip_since is None:
+            skip_since = now() - datetime.timedelta(minutes=10)
+
+        unique_ids = list(dict.fromkeys(endpoint_ids))
+        slot = spread / len(unique_ids) if spread and unique_ids else datetime.timedelta(0)
+        run_dates: dict[int, datetime.datetime] = {}
+        for index, eid in enumerate(unique_ids):
+            offset = min(max(index + random.uniform(-jitter, jitter), 0), len(unique_ids))
+            # DATETIME columns have no fractional seconds, keep run dates comparable
+            run_dates[eid] = (run_date + slot * offset).replace(microsecond=0)
+
+        lower_lanes = TASK_LANE_PRIORITY[TASK_LANE_PRIORITY.index(lane) + 1 :]
+        scheduled_tasks: List[EndpointTestTask] = []
+        for i in range(0, len(unique_ids), SCHEDULE_BATCH_SIZE):
+            batch = unique_ids[i : i + SCHEDULE_BATCH_SIZE]
             async with sessionmanager.session() as session:
-                task = await session.get(EndpointTestTask, task_id)
-                if not task or task.status == TaskStatus.DONE:
-                    return
-                task.status = TaskStatus.RUNNING
-                task.last_tried = now()
+                if check_endpoints:
+                    result = await session.execute(
+                        select(col(EndpointDB.id)).where(col(EndpointDB.id).in_(batch))
+                    )
+                    existing_ids = set(result.scalars().all())
+                    batch = [eid for eid in batch if eid in existing_ids]
+                    if not batch:
+                        continue
+
+                result = await session.execute(
+                    _queued_tasks_query(batch, skip_statuses, skip_since)
+                )
+                skip_ids: set[int] = set()
+                later_tasks: dict[int, int] = {}
+                for task_id, endpoint_id, task_status, scheduled_at, task_lane in result.all():
+                    if task_status != TaskStatus.PENDING:
+                        skip_ids.add(endpoint_id)
+                    elif task_lane in lower_lanes:
+                        later_tasks.setdefault(endpoint_id, task_id)
+                    # MySQL returns naive UTC datetimes
+                    elif scheduled_at <= run_dates[endpoint_id].replace(tzinfo=None):
+                        skip_ids.add(endpoint_id)
+                    else:
+                        later_tasks.setdefault(endpoint_id, task_id)
+
+                update_tasks = {
+                    task_id: run_dates[eid]
+                    for eid, task_id in later_tasks.items()
+                    if eid not in skip_ids
+                }
+                create_ids = [
+                    eid for eid in batch if eid not in skip_ids and eid not in later_tasks
+                ]
+                if not update_tasks and not create_ids:
+                    continue
+
+                created_at = now().replace(microsecond=0)
+                if update_tasks:
+                    values = {
+                        "scheduled_at": func.least(
+                            col(EndpointTestTask.scheduled_at),
+                            case(update_tasks, value=col(EndpointTestTask.id)),
+                        )
+                    }
+                    if lower_lanes:
+                        # Typed so that the lane is stored by name like the column's other values
+                        values["lane"] = case(
+                            (
+                                col(EndpointTestTask.lane).in_(lower_lanes),
+                                literal(lane, col(EndpointTestTask.lane).type),
+                            ),
+                            else_=col(EndpointTestTask.lane),
+                        )
+                    await session.execute(
+                        update(EndpointTestTask)
+                        .where(col(EndpointTestTask.id).in_(list(update_tasks)))
+                        .values(**values)
+                    )
+                if create_ids:
+                    await session.execute(
+                        insert(EndpointTestTask).values(
+                            [
+                                {
+                                    "endpoint_id": eid,
+                                    "status": TaskStatus.PENDING,
+                                    "lane": lane,
+                                    "scheduled_at": run_dates[eid],
+                                    "created_at": created_at,
+                                }
+                                for eid in create_ids
+                            ]
+                        )
+                    )
                 await session.commit()
 
-            try:
-                await test_and_update_endpoint_and_models(endpoint_id)
-                async with sessionmanager.session() as session:
-                    async with session.begin():
-                        task = await session.get(EndpointTestTask, task_id)
-                        if task:
-                            task.status = TaskStatus.DONE
-                logger.info(f"Task {task_id} completed successfully")
-            except Exception as e:
-                logger.error(f"Error running task {task_id}: {e}")
-                async with sessionmanager.session() as session:
-                    async with session.begin():
-                        task = await session.get(EndpointTestTask, task_id)
-                        if task:
-                            task.status = TaskStatus.FAILED
-                logger.error(f"Task {task_id} marked as FAILED")
+                result = await session.execute(
+                    select(EndpointTestTask).where(
+                        or_(
+                            col(EndpointTestTask.id).in_(list(update_tasks)),
+                            and_(
+                                col(EndpointTestTask.endpoint_id).in_(create_ids),
+                                col(EndpointTestTask.status) == TaskStatus.PENDING,
+                                col(EndpointTestTask.created_at) == created_at,
+                            ),
+                        )
+                    )
+                )
+                scheduled_tasks.extend(result.scalars().all())
+
+        # Imported here so that `python -m src.endpoint.worker` does not import itself twice
+        from .worker import get_worker_pool_if_running
+
+        pool = get_worker_pool_if_running()
+        if pool is not None and scheduled_tasks:
+            pool.notify()
+        return scheduled_tasks
+
+    async def schedule_endpoint_test(
+        self,
+        endpoint_id: int,
+        run_date: Optional[datetime.datetime] = None,
+        lane: TaskLane = TaskLane.PERIODIC,
+    ) -> Optional[EndpointTestTask]:
+        logger.info(f"Scheduling single test for {endpoint_id} in {lane.value} lane")
+        tasks = await self.schedule_endpoint_tests([endpoint_id], run_date, lane=lane)
+        if not tasks:
+            logger.info(f"No test scheduled for {endpoint_id}, skip")
+            return None
+        return tasks[0]
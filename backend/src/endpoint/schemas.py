@@ -1,13 +1,14 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Any, Dict, List, Optional
 
 from fastapi_pagination import Page, Params
 from pydantic import BaseModel, field_validator
 
 # Use the same StrEnum base class as in schema.py
+from src.pagination import KeysetFilterParams
 from src.schema import FilterParams, StrEnum
 
-from .models import EndpointStatusEnum, TaskStatus
+from .models import EndpointStatusEnum, JobStatus, TaskLane, TaskStatus
 
 
 class EndpointSortField(StrEnum):
@@ -22,6 +23,10 @@ class EndpointFilterParams(FilterParams[EndpointSortField]):
     status: Optional[EndpointStatusEnum] = None
 
 
+class EndpointKeysetParams(KeysetFilterParams[EndpointSortField]):
+    status: Optional[EndpointStatusEnum] = None
+
+
 class EndpointCreate(BaseModel):
     url: str
 
@@ -40,6 +45,47 @@ class EndpointBatchCreate(BaseModel):
     endpoints: List[EndpointCreate]
 
 
+class EndpointImportFormat(StrEnum):
+    # One URL per line
+    TEXT = "text"
+    # A `url` column and an optional `name` column, or URLs in the first column without header
+    CSV = "csv"
+    # One JSON object with `url` and optional `name` per line, or one JSON string per line
+    NDJSON = "ndjson"
+
+
+class EndpointImportJobInfo(BaseModel):
+    id: int
+    status: JobStatus
+    filename: Optional[str] = None
+    lines_read: int
+    invalid_lines: int
+    duplicate_urls: int
+    inserted: int
+    existing: int
+    scheduled: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class EndpointDeleteJobInfo(BaseModel):
+    id: int
+    status: JobStatus
+    requested: int
+    deleted_endpoints: int
+    deleted_rows: int
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class EndpointInfo(BaseModel):
     id: Optional[int] = None
     url: str
@@ -61,6 +107,8 @@ class EndpointPerformanceInfo(BaseModel):
     status: EndpointStatusEnum
     ollama_version: Optional[str] = None
     created_at: datetime
+    last_confirmed_at: Optional[datetime] = None
+    samples: int = 1
 
     class Config:
         from_attributes = True
@@ -71,6 +119,20 @@ class EndpointWithPerformance(EndpointInfo):
 
 
 # New schemas for AI models associated with endpoints
+class AvailabilityDay(BaseModel):
+    day: date
+    # None when the endpoint was not tested that day
+    uptime: Optional[float] = None
+
+
+class EndpointAvailability(BaseModel):
+    endpoint_id: int
+    uptime: Optional[float] = None
+    tested_slots: int = 0
+    available_slots: int = 0
+    days: List[AvailabilityDay] = []
+
+
 class EndpointWithAIModelsRequest(Params):
     endpoint_id: int
 
@@ -108,6 +170,7 @@ class TaskInfo(BaseModel):
     id: int
     endpoint_id: int
     status: TaskStatus
+    lane: TaskLane = TaskLane.PERIODIC
     scheduled_at: datetime
     last_tried: Optional[datetime] = None
     created_at: datetime
@@ -128,6 +191,15 @@ class TaskWithEndpoint(TaskInfo):
         from_attributes = True
 
 
+class CancelPeriodicTasksRequest(BaseModel):
+    include_running: bool = False
+
+
+class CancelPeriodicTasksResult(BaseModel):
+    cancelled_pending: int
+    cancelled_running: int
+
+
 class EndpointBatchOperation(BaseModel):
     """Request model for batch operations on endpoints."""
 
@@ -140,6 +212,8 @@ class BatchOperationResult(BaseModel):
     success_count: int
     failed_count: int
     failed_ids: Dict[str, Any] = {}  # Map of failed IDs to error messages
+    # Job running the operation, when it runs as one
+    job_id: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -0,0 +1,124 @@
+import ipaddress
+import re
+from typing import Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import ColumnElement, case, update
+from sqlmodel import col, select
+
+from src.database import sessionmanager
+from src.logging import get_logger
+from src.search import escape_like, fulltext_search
+
+from .models import EndpointDB
+
+logger = get_logger(__name__)
+
+# Endpoints backfilled per transaction
+_BACKFILL_CHUNK_SIZE = 1000
+
+_IP_PREFIX = re.compile(r"^\d{1,3}(\.\d{0,3}){1,3}$")
+_IP_RANGE = re.compile(r"^(\d{1,3}(?:\.\d{1,3}){3})\s*-\s*(\d{1,3}(?:\.\d{1,3}){3})$")
+
+
+def url_search_fields(url: str) -> dict:
+    """
+    The host and IPv4 address (as a number) of an endpoint URL, stored for searching.
+    """
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    ip_number = None
+    if host:
+        try:
+            ip_number = int(ipaddress.IPv4Address(host))
+        except ValueError:
+            pass
+    return {"host": host, "ip_number": ip_number}
+
+
+async def backfill_url_search_fields() -> None:
+    """
+    Fill the search fields of endpoints created before they existed, chunk by chunk.
+    """
+    filled = 0
+    last_id = 0
+    while True:
+        async with sessionmanager.session() as session:
+            result = await session.execute(
+                select(col(EndpointDB.id), col(EndpointDB.url))
+                .where(col(EndpointDB.id) > last_id, col(EndpointDB.host).is_(None))
+                .order_by(col(EndpointDB.id))
+                .limit(_BACKFILL_CHUNK_SIZE)
+            )
+            endpoints = list(result.tuples().all())
+            if not endpoints:
+                break
+            fields = {endpoint_id: url_search_fields(url) for endpoint_id, url in endpoints}
+            endpoint_id = col(EndpointDB.id)
+            await session.execute(
+                update(EndpointDB)
+                .where(endpoint_id.in_(list(fields)))
+                .values(
+                    host=case({id_: f["host"] for id_, f in fields.items()}, value=endpoint_id),
+                    ip_number=case(
+                        {id_: f["ip_number"] for id_, f in fields.items()}, value=endpoint_id
+                    ),
+                )
+            )
+            await session.commit()
+        filled += len(endpoints)
+        last_id = endpoints[-1][0]
+    if filled:
+        logger.info(f"Filled the search fields of {filled} endpoints")
+
+
+def _ip_between(first: int, last: int) -> ColumnElement[bool]:
+    return col(EndpointDB.ip_number).between(first, last)
+
+
+def endpoint_search(search: str) -> tuple[ColumnElement[bool], Optional[ColumnElement]]:
+    """
+    Build the condition of an endpoint search, and its relevance to rank by if any.
+
+    - `10.0.0.0/8` or `10.0.0.1-10.0.0.99`: IPv4 range
+    - `10.0.0.1`: exact IPv4 address, `10.0.` or `10.0.0`: IPv4 prefix
+    - `host:example.com`: exact host, `host:example*`: host prefix
+    - `http://...` or `https://...`: URL prefix
+    - anything else: ranked substring search in the name and URL
+    """
+    search = search.strip()
+    if "/" in search and "://" not in search:
+        try:
+            network = ipaddress.IPv4Network(search, strict=False)
+        except ValueError:
+            pass
+        else:
+            return _ip_between(int(network[0]), int(network[-1])), None
+
+    ip_range = _IP_RANGE.match(search)
+    if ip_range:
+        try:
+            first, last = (int(ipaddress.IPv4Address(ip)) for ip in ip_range.groups())
+        except ValueError:
+            pass
+        else:
+            return _ip_between(min(first, last), max(first, last)), None
+
+    if _IP_PREFIX.match(search):
+        try:
+            return col(EndpointDB.ip_number) == int(ipaddress.IPv4Address(search)), None
+        except ValueError:
+            return col(EndpointDB.host).like(f"{search}%"), None
+
+    if search.lower().startswith("host:"):
+        host = search[5:].strip().lower()
+        if host.endswith("*"):
+            return col(EndpointDB.host).like(f"{escape_like(host[:-1])}%"), None
+        return col(EndpointDB.host) == host, None
+
+    if search.lower().startswith(("http://", "https://")):
+        return col(EndpointDB.url).like(f"{escape_like(search)}%"), None
+
+    return fulltext_search([col(EndpointDB.name), col(EndpointDB.url)], search)
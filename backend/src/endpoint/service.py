@@ -1,37 +1,76 @@
+import asyncio
+import os
+import tempfile
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Callable, Optional, Sequence, cast
 
-from fastapi import BackgroundTasks, Depends, HTTPException, status
+from aiohttp import ClientConnectionError, ClientPayloadError, ClientResponseError
+from fastapi import BackgroundTasks, Depends, File, HTTPException, Query, UploadFile, status
 from fastapi_pagination import Page, Params, set_page
 from fastapi_pagination.ext.sqlmodel import paginate as apaginate
-from sqlalchemy import func, insert
-from sqlalchemy.orm import selectinload
-from sqlmodel import col, or_, select
+from sqlalchemy import func, insert, tuple_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import aliased, selectinload
+from sqlmodel import col, select
 
 from src.ai_model.models import (
     AIModelDB,
     AIModelPerformanceDB,
     AIModelStatusEnum,
     EndpointAIModelDB,
+    EndpointAIModelOutputDB,
+)
+from src.ai_model.service import update_endpoint_counts
+from src.ai_model.utils import compress_output
+from src.config import get_config
+from src.database import (
+    DBSessionDep,
+    load_recent_per_group,
+    recent_per_group_query,
+    sessionmanager,
 )
-from src.database import DBSessionDep, sessionmanager
 from src.logging import get_logger
 from src.ollama.performance_test import EndpointTestResult, test_endpoint
+from src.pagination import (
+    CountedCursorPage,
+    CountedPage,
+    CountStrategy,
+    KeysetParams,
+    keyset_keys,
+    keyset_paginate,
+    paginate,
+)
 from src.schema import SortOrder
 from src.utils import now
 
+from .adaptive import update_next_test_at
+from .availability import get_availability_timelines, get_uptimes, record_availability
+from .deletion import delete_endpoint_rows, run_delete_job
+from .importer import run_import_job, upsert_endpoint_urls
 from .models import (
     EndpointDB,
+    EndpointDeleteJobDB,
+    EndpointImportJobDB,
+    EndpointPerformanceDB,
+    EndpointStatusEnum,
     EndpointTestTask,
+    JobStatus,
+    TaskLane,
 )
 from .schemas import (
     BatchOperationResult,
+    CancelPeriodicTasksRequest,
+    CancelPeriodicTasksResult,
     EndpointAIModelInfo,
+    EndpointAvailability,
     EndpointBatchCreate,
     EndpointBatchOperation,
     EndpointCreateWithName,
     EndpointFilterParams,
+    EndpointImportFormat,
     EndpointInfo,
+    EndpointKeysetParams,
     EndpointPerformanceInfo,
     EndpointUpdate,
     EndpointWithAIModelCount,
@@ -39,17 +78,24 @@ from .schemas import (
     EndpointWithAIModelsRequest,
     TaskWithEndpoint,
 )
+from .search import endpoint_search, url_search_fields
 
 logger = get_logger(__name__)
+config = get_config()
+
+_DEFAULT_MAX_CONNECTION_TIME = EndpointAIModelDB.model_fields["max_connection_time"].default
+
+# Consecutive proxy failures per endpoint, for the circuit breaker lane, most recent last. Other
+# processes do not learn about deleted endpoints, so the oldest entries are dropped beyond a bound.
+_endpoint_failures: OrderedDict[int, int] = OrderedDict()
+_MAX_TRACKED_FAILURES = 10000
 
 
 async def get_endpoint_by_id(session: DBSessionDep, endpoint_id: int) -> EndpointDB:
     """
     Get an endpoint by ID.
     """
-    query = select(EndpointDB).options(selectinload(EndpointDB.performances))  # type: ignore
-
-    query = query.where(EndpointDB.id == endpoint_id)
+    query = select(EndpointDB).where(EndpointDB.id == endpoint_id)
 
     result = await session.execute(query)
     endpoint = result.scalars().first()
@@ -66,45 +112,95 @@ async def batch_create_or_update_endpoints(
     """
     Create or update multiple endpoints.
     """
-    # 提取所有 URL
-    urls = [ep.url for ep in endpoint_batch.endpoints]
+    # 去重，保持顺序
+    urls = list(dict.fromkeys(ep.url for ep in endpoint_batch.endpoints))
+
+    # 分块插入不存在的 URL
+    all_ids: list[int] = []
+    chunk_size = config.endpoint_import.chunk_size
+    for i in range(0, len(urls), chunk_size):
+        new_ids, existing_ids = await upsert_endpoint_urls(
+            session, dict.fromkeys(urls[i : i + chunk_size])
+        )
+        await session.commit()
+        all_ids.extend(existing_ids + new_ids)
 
-    # 1. 查询已存在的 URL
-    result = await session.execute(
-        select(EndpointDB.url, EndpointDB.id).where(col(EndpointDB.url).in_(urls))
-    )
-    existing = {row[0]: row[1] for row in result.all()}
+    # 使用调度器为所有端点批量创建测试任务
+    async def create_test_tasks():
+        from .scheduler import get_scheduler
 
-    # 2. 过滤出未存在的 URL
-    new_urls = [url for url in urls if url not in existing]
+        scheduler = get_scheduler()
+        await scheduler.schedule_endpoint_tests(
+            all_ids, now() + timedelta(seconds=5), check_endpoints=False, lane=TaskLane.IMPORT
+        )
 
-    # 3. 批量插入新 URL
-    new_ids = []
-    if new_urls:
-        # 构建插入数据
-        new_urls = list(set(urls))
-        to_insert = [{"url": url, "name": url} for url in new_urls]
-        await session.execute(insert(EndpointDB).values(to_insert))
-        await session.commit()
+    background_task.add_task(create_test_tasks)
 
-        # 查询新插入的记录的 ID
-        result = await session.execute(
-            select(EndpointDB.url, EndpointDB.id).where(col(EndpointDB.url).in_(new_urls))
-        )
-        new_ids = [row[1] for row in result.all()]
 
-    # 4. 合并所有 ID
-    all_ids = list(existing.values()) + new_ids
+async def start_endpoint_import(
+    session: DBSessionDep,
+    background_task: BackgroundTasks,
+    file: UploadFile = File(..., description="Text, CSV or NDJSON file of endpoint URLs"),
+    format: EndpointImportFormat = EndpointImportFormat.TEXT,
+) -> EndpointImportJobDB:
+    """
+    Spool an uploaded list of endpoints to disk and import it in the background.
+    """
+    max_bytes = config.endpoint_import.max_upload_mb * 1024 * 1024
+    size = 0
+    spool = await asyncio.to_thread(
+        tempfile.NamedTemporaryFile,
+        prefix="endpoint-import-",
+        dir=config.endpoint_import.spool_dir,
+        delete=False,
+    )
+    try:
+        try:
+            while data := await file.read(1024 * 1024):
+                size += len(data)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File larger than {config.endpoint_import.max_upload_mb} MB",
+                    )
+                await asyncio.to_thread(spool.write, data)
+        finally:
+            await asyncio.to_thread(spool.close)
+    except BaseException:
+        await asyncio.to_thread(os.remove, spool.name)
+        raise
+
+    job = EndpointImportJobDB(filename=file.filename)
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    background_task.add_task(run_import_job, job.id, spool.name, format)
+    return job
 
-    # 使用调度器为每个端点创建测试任务
-    async def create_test_tasks():
-        from .scheduler import get_scheduler
 
-        for eid in all_ids:
-            scheduler = get_scheduler()
-            await scheduler.schedule_endpoint_test(eid, now() + timedelta(seconds=5))
+async def get_endpoint_import_job(session: DBSessionDep, job_id: int) -> EndpointImportJobDB:
+    """
+    Get an endpoint import job and its progress.
+    """
+    job = await session.get(EndpointImportJobDB, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job
 
-    background_task.add_task(create_test_tasks)
+
+async def get_endpoint_import_jobs(
+    session: DBSessionDep,
+    limit: int = 20,
+) -> list[EndpointImportJobDB]:
+    """
+    Get the most recent endpoint import jobs.
+    """
+    result = await session.execute(
+        select(EndpointImportJobDB)
+        .order_by(col(EndpointImportJobDB.created_at).desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
 
 
 async def get_endpoint_by_url(session: DBSessionDep, url: str) -> EndpointDB:
@@ -118,27 +214,30 @@ async def get_endpoint_by_url(session: DBSessionDep, url: str) -> EndpointDB:
     return endpoint
 
 
-async def get_endpoints(
-    session: DBSessionDep,
-    params: EndpointFilterParams = Depends(),
-) -> Page[EndpointDB]:
+def _search_endpoints(
+    query: Any, params: EndpointFilterParams | EndpointKeysetParams
+) -> tuple[Any, Optional[Any]]:
     """
-    Get all endpoints with filtering, searching and sorting.
-
-    params:
-        - search: Optional search string for name or URL
-        - order_by: Field to sort by
-        - order: Sort order (asc or desc)
+    Apply the search and status filter of the endpoint list to a query. Also returns the
+    relevance of the search, if ranked.
     """
-    set_page(Page[EndpointDB])
-    query = select(EndpointDB).options(selectinload(EndpointDB.performances))  # type: ignore
-
     # 添加搜索条件
+    relevance = None
     if params.search:
-        search_term = f"%{params.search}%"
-        query = query.where(
-            or_(col(EndpointDB.name).ilike(search_term), col(EndpointDB.url).ilike(search_term))
-        )
+        condition, relevance = endpoint_search(params.search)
+        query = query.where(condition)
+
+    if params.status:
+        query = query.where(EndpointDB.status == params.status)
+
+    return query, relevance
+
+
+def _filter_endpoints(query: Any, params: EndpointFilterParams) -> Any:
+    """
+    Apply the search, status filter and sorting of the endpoint list to a query.
+    """
+    query, relevance = _search_endpoints(query, params)
 
     # 添加排序
     if params.order_by:
@@ -147,11 +246,33 @@ async def get_endpoints(
         if params.order == SortOrder.DESC:
             order_column = order_column.desc()
         query = query.order_by(order_column)
+    elif relevance is not None:
+        # 未指定排序时按相关度排序
+        query = query.order_by(relevance.desc())
 
-    if params.status:
-        query = query.where(EndpointDB.status == params.status)
+    return query
 
-    return await apaginate(session, query, params)
+
+async def get_endpoints(
+    session: DBSessionDep,
+    params: EndpointFilterParams = Depends(),
+) -> CountedPage[EndpointDB]:
+    """
+    Get all endpoints with filtering, searching and sorting.
+
+    params:
+        - search: Optional search string for name or URL, host or IP range, see `endpoint_search`
+        - order_by: Field to sort by
+        - order: Sort order (asc or desc)
+
+    The total is estimated, see `count_items`.
+    """
+    return await paginate(
+        session,
+        _filter_endpoints(select(EndpointDB), params),
+        params,
+        CountStrategy.ESTIMATED,
+    )
 
 
 async def create_or_update_endpoint(
@@ -168,12 +289,14 @@ async def create_or_update_endpoint(
         endpoint = None
     if endpoint:
         # Update the endpoint
-        endpoint_data = endpoint_create.model_dump()
+        endpoint_data = endpoint_create.model_dump() | url_search_fields(endpoint_create.url)
         for key, value in endpoint_data.items():
             setattr(endpoint, key, value)
     else:
         # Create a new endpoint
-        endpoint = EndpointDB(**endpoint_create.model_dump())
+        endpoint = EndpointDB(
+            **endpoint_create.model_dump(), **url_search_fields(endpoint_create.url)
+        )
         session.add(endpoint)
     await session.commit()
     await session.refresh(endpoint)
@@ -184,7 +307,7 @@ async def create_or_update_endpoint(
         )
 
     # 使用调度器创建测试任务
-    await create_test_task(session, endpoint.id)
+    await create_test_task(session, endpoint.id, lane=TaskLane.IMPORT)
 
     return endpoint
 
@@ -201,6 +324,8 @@ async def update_endpoint(
 
     # Update fields
     update_data = endpoint_update.model_dump(exclude_unset=True)
+    if update_data.get("url"):
+        update_data |= url_search_fields(update_data["url"])
     for key, value in update_data.items():
         setattr(endpoint, key, value)
 
@@ -216,18 +341,19 @@ async def delete_endpoint(
     """
     Delete an endpoint. Only admin or the owner can delete it.
     """
-    endpoint = await get_endpoint_by_id(session, endpoint_id)
-
-    # 确保加载关联数据以激活级联删除
-    await session.refresh(endpoint, ["ai_model_links", "performances"])
+    endpoint = await session.get(EndpointDB, endpoint_id)
+    if endpoint is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Endpoint not found")
 
     logger.info(f"Deleting endpoint {endpoint.id} ({endpoint.name}) with all its relations")
-
-    await session.delete(endpoint)
-    await session.commit()
+    await delete_endpoint_rows([endpoint_id])
     logger.info(f"Endpoint {endpoint_id} deleted successfully")
 
 
+def _ai_model_by_name_and_tag_query(name: str, tag: str) -> Any:
+    return select(AIModelDB).where(AIModelDB.name == name, AIModelDB.tag == tag)
+
+
 async def get_ai_model_by_name_and_tag(
     session: DBSessionDep,
     name: str,
@@ -236,32 +362,53 @@ async def get_ai_model_by_name_and_tag(
     """
     Get an AI model by name and tag.
     """
-    result = await session.execute(
-        select(AIModelDB).where(AIModelDB.name == name, AIModelDB.tag == tag)
-    )
+    result = await session.execute(_ai_model_by_name_and_tag_query(name, tag))
     ai_model = result.scalars().first()
     if ai_model is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="AI model not found")
     return ai_model
 
 
-async def create_ai_model_if_not_exists(
+async def upsert_ai_models(
     session: DBSessionDep,
-    ai_model: AIModelDB,
-) -> AIModelDB:
+    ai_models: Sequence[AIModelDB],
+) -> dict[tuple[str, str], int]:
     """
-    Create an AI model if it does not exist.
+    Create the AI models that do not exist yet with a single upsert, relying on the unique key on
+    (name, tag) that `run_migrations` adds to existing tables.
+
+    Returns the ID of every model by (name, tag).
     """
-    try:
-        return await get_ai_model_by_name_and_tag(session, ai_model.name, ai_model.tag)
-    except HTTPException:
-        # If the AI model does not exist, create it
-        pass
+    keys = list(dict.fromkeys((ai_model.name, ai_model.tag) for ai_model in ai_models))
+    if not keys:
+        return {}
 
-    session.add(ai_model)
-    await session.commit()
-    await session.refresh(ai_model)
-    return ai_model
+    created_at = now()
+    statement = mysql_insert(AIModelDB).values(
+        [{"name": name, "tag": tag, "created_at": created_at} for name, tag in keys]
+    )
+    # Existing models are left untouched
+    await session.execute(statement.on_duplicate_key_update(name=statement.inserted.name))
+
+    result = await session.execute(
+        select(col(AIModelDB.id), col(AIModelDB.name), col(AIModelDB.tag)).where(
+            tuple_(col(AIModelDB.name), col(AIModelDB.tag)).in_(keys)
+        )
+    )
+    return {(name, tag): model_id for model_id, name, tag in result.tuples().all()}
+
+
+def _confirm_cutoff() -> datetime:
+    """
+    History rows started before this are not confirmed anymore, a new row is inserted instead.
+    """
+    cutoff = now() - timedelta(hours=config.scanner.result_max_confirm_hours)
+    # The database stores naive UTC datetimes
+    return cutoff.replace(tzinfo=None)
+
+
+def _within_tolerance(new: float, old: float, tolerance: float) -> bool:
+    return abs(new - old) <= tolerance * abs(old)
 
 
 async def process_endpoint_test_result(
@@ -270,16 +417,81 @@ async def process_endpoint_test_result(
     results: EndpointTestResult,
 ) -> None:
     """
-    Process the endpoint test result.
+    Process the endpoint test result. The caller commits.
+
+    A result equal to the latest history row only confirms that row.
     """
-    if results.endpoint_performance:
-        endpoint = await get_endpoint_by_id(session, endpoint_id)
-        endpoint.status = results.endpoint_performance.status
-        session.add(endpoint)
-        results.endpoint_performance.endpoint_id = endpoint_id
-        session.add(results.endpoint_performance)
-        await session.commit()
-        await session.refresh(results.endpoint_performance)
+    if not results.endpoint_performance:
+        return
+
+    performance = results.endpoint_performance
+    _now = now()
+    result = await session.execute(
+        update(EndpointDB)
+        .where(col(EndpointDB.id) == endpoint_id)
+        .values(status=performance.status, last_confirmed_at=_now)
+    )
+    if result.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Endpoint not found")
+    await record_availability(
+        session, endpoint_id, performance.status == EndpointStatusEnum.AVAILABLE, _now
+    )
+
+    if config.scanner.suppress_unchanged_results:
+        latest = (
+            await session.execute(
+                select(
+                    col(EndpointPerformanceDB.id),
+                    col(EndpointPerformanceDB.status),
+                    col(EndpointPerformanceDB.ollama_version),
+                    col(EndpointPerformanceDB.created_at),
+                )
+                .where(col(EndpointPerformanceDB.endpoint_id) == endpoint_id)
+                .order_by(col(EndpointPerformanceDB.created_at).desc())
+                .limit(1)
+            )
+        ).first()
+        if (
+            latest is not None
+            and latest.created_at >= _confirm_cutoff()
+            and latest.status == performance.status
+            and latest.ollama_version == performance.ollama_version
+        ):
+            await session.execute(
+                update(EndpointPerformanceDB)
+                .where(col(EndpointPerformanceDB.id) == latest.id)
+                .values(
+                    samples=col(EndpointPerformanceDB.samples) + 1,
+                    last_confirmed_at=_now,
+                )
+            )
+            return
+
+    performance.endpoint_id = endpoint_id
+    performance.last_confirmed_at = _now
+    session.add(performance)
+
+
+async def get_latest_model_performances(
+    session: DBSessionDep,
+    endpoint_id: int,
+) -> dict[int, AIModelPerformanceDB]:
+    """
+    Get the latest performance of each model of an endpoint, by model ID.
+    """
+    latest_ids = (
+        select(func.max(col(AIModelPerformanceDB.id)))
+        .where(col(AIModelPerformanceDB.endpoint_id) == endpoint_id)
+        .group_by(col(AIModelPerformanceDB.ai_model_id))
+    )
+    result = await session.execute(
+        select(AIModelPerformanceDB).where(col(AIModelPerformanceDB.id).in_(latest_ids))
+    )
+    return {
+        performance.ai_model_id: performance
+        for performance in result.scalars().all()
+        if performance.ai_model_id is not None
+    }
 
 
 async def process_models_test_results(
@@ -289,91 +501,168 @@ async def process_models_test_results(
 ) -> None:
     """
     Test all models of an endpoint and update their performance metrics.
-    """
-    performances = []
-    links = []
 
-    existing_associations = (
-        select(EndpointAIModelDB)
-        .where(EndpointAIModelDB.endpoint_id == endpoint_id)
-        .options(
-            selectinload(EndpointAIModelDB.ai_model),  # type: ignore
-            selectinload(EndpointAIModelDB.performances),  # type: ignore
-        )
+    Written with one upsert for the models, one for the endpoint-model links and one multi-row
+    insert for the performances. Only the latest performance of each model is loaded: results
+    equal to it within the configured tolerances only confirm it instead of inserting a new
+    row. The endpoint counts of the models are adjusted by how their links changed. The latest
+    output of each model is compressed and upserted apart from the performances. The caller
+    commits.
+    """
+    _now = now()
+    model_ids = await upsert_ai_models(
+        session, [model_performance.ai_model for model_performance in results.model_performances]
     )
-    existing_result = await session.execute(existing_associations)
-    existing_link_map = {row.ai_model.id: row for row in existing_result.scalars().all()}
+    latest: dict[int, AIModelPerformanceDB] = {}
+    if config.scanner.suppress_unchanged_results:
+        latest = await get_latest_model_performances(session, endpoint_id)
+    cutoff = _confirm_cutoff()
+
+    def unchanged(model_id: int, performance: AIModelPerformanceDB) -> bool:
+        previous = latest.get(model_id)
+        return (
+            previous is not None
+            and previous.created_at >= cutoff
+            and previous.status == performance.status
+            and _within_tolerance(
+                performance.token_per_second,
+                previous.token_per_second,
+                config.scanner.result_tps_tolerance,
+            )
+            and _within_tolerance(
+                performance.connection_time,
+                previous.connection_time,
+                config.scanner.result_latency_tolerance,
+            )
+        )
 
-    mission_model_ids = list(existing_link_map.keys())
+    links: dict[int, dict] = {}
+    performances: list[dict] = []
+    confirmed_ids: list[int] = []
+    outputs: list[dict] = []
     for model_performance in results.model_performances:
-        # 创建或获取模型
-        model = await create_ai_model_if_not_exists(session, model_performance.ai_model)
-
-        if model.id is None:
+        ai_model = model_performance.ai_model
+        model_id = model_ids.get((ai_model.name, ai_model.tag))
+        if model_id is None:
+            logger.error(f"Error processing model {ai_model.name}:{ai_model.tag}: not created")
             continue
 
-        try:
-            performance = model_performance.performance
-            if performance:
-                performance.ai_model_id = model.id
-                performance.endpoint_id = endpoint_id
-                performances.append(performance)
-
-            # 如果关系不存在且ID有效，则创建关联表条目
-            if model.id not in existing_link_map:
-                link = EndpointAIModelDB(endpoint_id=endpoint_id, ai_model_id=model.id)
-                existing_link_map[model.id] = link
-            # 如果关系存在，则更新关联表条目
-            else:
-                link = existing_link_map[model.id]
-                await session.refresh(link)
-
-            # 添加性能数据
-            if performance:
-                link.performances.append(performance)
-                link.status = performance.status
-                link.token_per_second = performance.token_per_second
-                if performance.connection_time is not None and link.max_connection_time is not None:
-                    link.max_connection_time = max(
-                        link.max_connection_time,
-                        performance.connection_time,
-                    )
-                else:
-                    link.max_connection_time = performance.connection_time
-
-            # 添加关联表条目
-            links.append(link)
-            if model.id in mission_model_ids:
-                mission_model_ids.remove(model.id)
-        except Exception as e:
-            logger.error(
-                f"Error processing model {model_performance.ai_model.name}:{model_performance.ai_model.tag}: {e}"
+        performance = model_performance.performance
+        links[model_id] = {
+            "endpoint_id": endpoint_id,
+            "ai_model_id": model_id,
+            "status": performance.status,
+            "token_per_second": performance.token_per_second,
+            # 新关联的默认值参与比较，与之前逐条更新时一致
+            "max_connection_time": max(performance.connection_time, _DEFAULT_MAX_CONNECTION_TIME),
+            "last_confirmed_at": _now,
+        }
+        if unchanged(model_id, performance):
+            confirmed_ids.append(latest[model_id].id)  # type: ignore
+        else:
+            performances.append(
+                performance.model_dump(exclude={"id"})
+                | {"endpoint_id": endpoint_id, "ai_model_id": model_id, "last_confirmed_at": _now}
+            )
+        if model_performance.output:
+            data, truncated = compress_output(
+                model_performance.output,
+                config.scanner.output_max_chars,
+                config.scanner.output_compression_level,
+            )
+            outputs.append(
+                {
+                    "endpoint_id": endpoint_id,
+                    "ai_model_id": model_id,
+                    "data": data,
+                    "original_length": len(model_performance.output),
+                    "truncated": truncated,
+                    "created_at": _now,
+                }
             )
-            continue
 
-    for model_id in mission_model_ids:
-        link = existing_link_map[model_id]
-        link.status = AIModelStatusEnum.MISSING
-        links.append(link)
-        performance = AIModelPerformanceDB(
-            endpoint_id=endpoint_id,
-            ai_model_id=model_id,
-            status=AIModelStatusEnum.MISSING,
+    # The links are locked so that concurrent writers of the endpoint count their changes once
+    result = await session.execute(
+        select(col(EndpointAIModelDB.ai_model_id), col(EndpointAIModelDB.status))
+        .where(col(EndpointAIModelDB.endpoint_id) == endpoint_id)
+        .with_for_update()
+    )
+    previous_statuses = dict(result.tuples().all())
+    count_deltas: dict[int, tuple[int, int]] = {}
+    for model_id, link in links.items():
+        previous_status = previous_statuses.get(model_id)
+        count_deltas[model_id] = (
+            int(previous_status is None),
+            int(link["status"] == AIModelStatusEnum.AVAILABLE)
+            - int(previous_status == AIModelStatusEnum.AVAILABLE),
         )
-        performances.append(performance)
 
-    # 批量添加所有关联和性能数据
+    # 不再出现的模型标记为缺失
+    missing_ids = [model_id for model_id in previous_statuses if model_id not in links]
+    for model_id in missing_ids:
+        if previous_statuses[model_id] == AIModelStatusEnum.AVAILABLE:
+            count_deltas[model_id] = (0, -1)
+    if missing_ids:
+        await session.execute(
+            update(EndpointAIModelDB)
+            .where(
+                col(EndpointAIModelDB.endpoint_id) == endpoint_id,
+                col(EndpointAIModelDB.ai_model_id).in_(missing_ids),
+            )
+            .values(status=AIModelStatusEnum.MISSING, last_confirmed_at=_now)
+        )
+        for model_id in missing_ids:
+            performance = AIModelPerformanceDB(
+                endpoint_id=endpoint_id,
+                ai_model_id=model_id,
+                status=AIModelStatusEnum.MISSING,
+                last_confirmed_at=_now,
+            )
+            if unchanged(model_id, performance):
+                confirmed_ids.append(latest[model_id].id)  # type: ignore
+            else:
+                performances.append(performance.model_dump(exclude={"id"}))
+
     if links:
-        session.add_all(links)
+        statement = mysql_insert(EndpointAIModelDB).values(list(links.values()))
+        await session.execute(
+            statement.on_duplicate_key_update(
+                status=statement.inserted.status,
+                token_per_second=statement.inserted.token_per_second,
+                max_connection_time=func.greatest(
+                    col(EndpointAIModelDB.max_connection_time),
+                    statement.inserted.max_connection_time,
+                ),
+                last_confirmed_at=statement.inserted.last_confirmed_at,
+            )
+        )
+    await update_endpoint_counts(session, count_deltas)
     if performances:
-        session.add_all(performances)
+        await session.execute(insert(AIModelPerformanceDB).values(performances))
+    if confirmed_ids:
+        await session.execute(
+            update(AIModelPerformanceDB)
+            .where(col(AIModelPerformanceDB.id).in_(confirmed_ids))
+            .values(samples=col(AIModelPerformanceDB.samples) + 1, last_confirmed_at=_now)
+        )
+        logger.debug(f"Endpoint {endpoint_id}: {len(confirmed_ids)} unchanged model results")
+    if outputs:
+        statement = mysql_insert(EndpointAIModelOutputDB).values(outputs)
+        await session.execute(
+            statement.on_duplicate_key_update(
+                data=statement.inserted.data,
+                original_length=statement.inserted.original_length,
+                truncated=statement.inserted.truncated,
+                created_at=statement.inserted.created_at,
+            )
+        )
 
 
-async def test_and_update_endpoint_and_models(
+async def run_endpoint_test(
     endpoint_id: int,
-) -> None:
+) -> Optional[EndpointTestResult]:
     """
-    Test an endpoint and update its performance metrics.
+    Test an endpoint without writing anything. Returns None if the endpoint does not exist.
     """
     async with sessionmanager.session() as session:
         endpoint_query = select(EndpointDB).where(EndpointDB.id == endpoint_id)
@@ -384,38 +673,93 @@ async def test_and_update_endpoint_and_models(
             logger.error(f"Endpoint with ID {endpoint_id} not found")
             return None
 
-    results = await test_endpoint(endpoint)
+    return await test_endpoint(endpoint)
 
-    async with sessionmanager.session() as session:
-        await process_endpoint_test_result(session, endpoint_id, results)
-        await process_models_test_results(session, endpoint_id, results)
 
-        await session.commit()
+async def save_endpoint_test_results(
+    session: DBSessionDep,
+    endpoint_id: int,
+    results: EndpointTestResult,
+) -> None:
+    """
+    Write the results of an endpoint test and its next test time. The caller commits.
+    """
+    await process_endpoint_test_result(session, endpoint_id, results)
+    await process_models_test_results(session, endpoint_id, results)
+    await update_next_test_at(session, endpoint_id)
 
+
+async def test_and_update_endpoint_and_models(
+    endpoint_id: int,
+) -> None:
+    """
+    Test an endpoint and update its performance metrics.
+    """
+    results = await run_endpoint_test(endpoint_id)
+    if results is None:
         return
 
+    async with sessionmanager.session() as session:
+        await save_endpoint_test_results(session, endpoint_id, results)
+        await session.commit()
 
-async def get_best_endpoints_for_model(
-    session: DBSessionDep,
-    model_id: int,
-) -> list[EndpointDB]:
+
+def _fastest_links_query(model_id: int, limit: int) -> Any:
     """
-    Get the best endpoint for a model.
+    The links of the fastest endpoints on which a model is available.
     """
-    query = (
+    return (
         select(EndpointAIModelDB)
-        .options(selectinload(EndpointAIModelDB.endpoint))  # type: ignore
         .where(
             EndpointAIModelDB.ai_model_id == model_id,
             EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE,
         )
+        .order_by(col(EndpointAIModelDB.token_per_second).desc())
+        .limit(limit)
     )
-    query = query.order_by(col(EndpointAIModelDB.token_per_second).desc())
-    result = await session.execute(query)
-    links = result.scalars().all()
-    if len(links) >= 10:
-        links = links[:10]
-    return [link.endpoint for link in links]
+
+
+async def get_best_endpoints_for_model(
+    session: DBSessionDep,
+    model_id: int,
+) -> list[EndpointDB]:
+    """
+    Get the best endpoint for a model.
+
+    The fastest endpoints are reranked by throughput weighted by their recent uptime.
+    """
+    query = _fastest_links_query(model_id, max(config.availability.routing_candidates, 10))
+    result = await session.execute(
+        query.options(selectinload(EndpointAIModelDB.endpoint))  # type: ignore
+    )
+    links = list(result.scalars().all())
+
+    if config.availability.routing_weight > 0:
+        uptimes = await get_uptimes(
+            session, [link.endpoint_id for link in links], config.availability.routing_days
+        )
+        # Endpoints without availability data yet are not penalized
+        links.sort(
+            key=lambda link: link.token_per_second
+            * uptimes.get(link.endpoint_id, 1.0) ** config.availability.routing_weight,
+            reverse=True,
+        )
+    return [link.endpoint for link in links[:10]]
+
+
+async def get_endpoints_availability(
+    session: DBSessionDep,
+    endpoint_ids: list[int] = Query(..., description="Endpoint IDs, up to 200"),
+    days: int = Query(30, ge=1, le=366),
+) -> list[EndpointAvailability]:
+    """
+    Get the uptime and daily availability of endpoints.
+    """
+    if len(endpoint_ids) > 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Too many endpoints, at most 200"
+        )
+    return await get_availability_timelines(session, list(dict.fromkeys(endpoint_ids)), days)
 
 
 async def get_ai_model_links_by_endpoint_id(
@@ -435,7 +779,6 @@ async def get_ai_model_links_by_endpoint_id(
         select(EndpointAIModelDB)
         .options(
             selectinload(EndpointAIModelDB.ai_model),  # type: ignore
-            selectinload(EndpointAIModelDB.performances),  # type: ignore
         )
         .where(EndpointAIModelDB.endpoint_id == endpoint_id)
     )
@@ -443,31 +786,9 @@ async def get_ai_model_links_by_endpoint_id(
     return await apaginate(session, query, params)
 
 
-async def get_endpoint_with_ai_models(
-    session: DBSessionDep,
-    request: EndpointWithAIModelsRequest = Depends(),
-) -> EndpointWithAIModels:
-    """
-    Get an endpoint by ID with its associated AI models.
-    """
-    endpoint = await get_endpoint_by_id(session, request.endpoint_id)
-    links = await get_ai_model_links_by_endpoint_id(session, request.endpoint_id, request)
-
-    # Get recent performances
-    recent_performances = endpoint.performances[:10] if endpoint.performances else []
-    endpoint_performances = [
-        EndpointPerformanceInfo(
-            id=perf.id,
-            status=perf.status,
-            ollama_version=perf.ollama_version,
-            created_at=perf.created_at,
-        )
-        for perf in recent_performances
-    ]
-
-    # Transform the AI models
+def _to_ai_model_infos(links: Sequence[EndpointAIModelDB]) -> list[EndpointAIModelInfo]:
     ai_models = []
-    for link in links.items:
+    for link in links:
         if not link.ai_model:
             continue
 
@@ -487,6 +808,64 @@ async def get_endpoint_with_ai_models(
                 max_connection_time=link.max_connection_time,
             )
         )
+    return ai_models
+
+
+async def get_endpoint_ai_models_by_cursor(
+    session: DBSessionDep,
+    endpoint_id: int,
+    params: KeysetParams = Depends(),
+) -> CountedCursorPage[EndpointAIModelInfo]:
+    """
+    Get the AI models of an endpoint by cursor, in model ID order.
+    """
+    await get_endpoint_by_id(session, endpoint_id)
+
+    query = (
+        select(EndpointAIModelDB)
+        .options(selectinload(EndpointAIModelDB.ai_model))  # type: ignore
+        .where(EndpointAIModelDB.endpoint_id == endpoint_id)
+    )
+    return await keyset_paginate(
+        session,
+        query,
+        params,
+        [col(EndpointAIModelDB.ai_model_id)],
+        transformer=_to_ai_model_infos,
+    )
+
+
+async def get_endpoint_with_ai_models(
+    session: DBSessionDep,
+    request: EndpointWithAIModelsRequest = Depends(),
+) -> EndpointWithAIModels:
+    """
+    Get an endpoint by ID with its associated AI models.
+    """
+    endpoint = await get_endpoint_by_id(session, request.endpoint_id)
+    links = await get_ai_model_links_by_endpoint_id(session, request.endpoint_id, request)
+
+    # Get recent performances
+    recent_performances = await load_recent_per_group(
+        session,
+        recent_per_group_query(
+            [
+                col(getattr(EndpointPerformanceDB, name))
+                for name in EndpointPerformanceInfo.model_fields
+            ],
+            [col(EndpointPerformanceDB.endpoint_id)],
+            [col(EndpointPerformanceDB.created_at).desc(), col(EndpointPerformanceDB.id).desc()],
+            10,
+            col(EndpointPerformanceDB.endpoint_id) == request.endpoint_id,
+        ),
+    )
+    endpoint_performances = [
+        EndpointPerformanceInfo.model_validate(performance)
+        for performance in recent_performances.get((request.endpoint_id,), [])
+    ]
+
+    # Transform the AI models
+    ai_models = _to_ai_model_infos(links.items)
 
     # Create the response object
     return EndpointWithAIModels(
@@ -506,75 +885,107 @@ async def get_endpoint_with_ai_models(
     )
 
 
-async def get_endpoints_with_ai_model_counts(
-    session: DBSessionDep, filter_params: EndpointFilterParams = Depends()
-) -> Page[EndpointWithAIModelCount]:
+def _endpoints_with_ai_model_counts_query() -> (
+    tuple[Any, Callable[[Sequence[Any]], list[EndpointWithAIModelCount]]]
+):
     """
-    Get all endpoints with AI model counts, with support for filtering, searching and sorting.
-    """
-    endpoints_page = await get_endpoints(session, filter_params)
-
-    endpoints_with_counts = []
-
-    for endpoint in endpoints_page.items:
-        # Get the recent performances
-        recent_performances = endpoint.performances[:1] if endpoint.performances else []
-        endpoint_performances = [
-            EndpointPerformanceInfo(
-                id=perf.id,
-                status=perf.status,
-                ollama_version=perf.ollama_version,
-                created_at=perf.created_at,
-            )
-            for perf in recent_performances
-        ]
+    The query of the endpoint list and the transformer of its rows.
 
-        # Count total AI models
-        query = select(func.count()).where(EndpointAIModelDB.endpoint_id == endpoint.id)
-        result = await session.execute(query)
-        total_ai_model_count = result.scalar_one()
+    Model counts and the latest task status are correlated subqueries, the latest performance
+    is joined by its ID, so any page is read with one query.
+    """
 
-        # Count available AI models
-        query = select(func.count()).where(
-            EndpointAIModelDB.endpoint_id == endpoint.id,
-            EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE,
-        )
-        result = await session.execute(query)
-        avaliable_ai_model_count = result.scalar_one()
+    def of_endpoint(query: Any, model: Any) -> Any:
+        return query.where(model.endpoint_id == EndpointDB.id).correlate(EndpointDB)
 
-        query = (
-            select(EndpointTestTask)
-            .where(
-                EndpointTestTask.endpoint_id == endpoint.id,
-            )
-            .order_by(col(EndpointTestTask.scheduled_at).desc())
-        )
-        result = await session.execute(query)
-        task = result.scalars().first()
-        task_status = task.status if task else None
-
-        # Create the endpoint with counts
-        endpoints_with_counts.append(
+    total_count = of_endpoint(select(func.count()), EndpointAIModelDB).scalar_subquery()
+    available_count = (
+        of_endpoint(select(func.count()), EndpointAIModelDB)
+        .where(EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE)
+        .scalar_subquery()
+    )
+    task_status = (
+        of_endpoint(select(col(EndpointTestTask.status)), EndpointTestTask)
+        .order_by(col(EndpointTestTask.scheduled_at).desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    latest_performance = aliased(EndpointPerformanceDB)
+    latest_performance_id = of_endpoint(
+        select(func.max(col(EndpointPerformanceDB.id))), EndpointPerformanceDB
+    ).scalar_subquery()
+
+    query = select(
+        EndpointDB,
+        latest_performance,
+        total_count.label("total_ai_model_count"),
+        available_count.label("avaliable_ai_model_count"),
+        task_status.label("task_status"),
+    ).outerjoin(latest_performance, latest_performance.id == latest_performance_id)
+
+    def to_items(rows: Sequence[Any]) -> list[EndpointWithAIModelCount]:
+        return [
             EndpointWithAIModelCount(
                 id=endpoint.id,
                 url=endpoint.url,
                 name=endpoint.name,
                 created_at=endpoint.created_at,
                 status=endpoint.status,
-                recent_performances=endpoint_performances,
-                total_ai_model_count=total_ai_model_count,
-                avaliable_ai_model_count=avaliable_ai_model_count,
+                recent_performances=(
+                    [EndpointPerformanceInfo.model_validate(performance)] if performance else []
+                ),
+                total_ai_model_count=total,
+                avaliable_ai_model_count=available,
                 task_status=task_status,
             )
-        )
+            for endpoint, performance, total, available, task_status in rows
+        ]
 
-    # Return paginated results
-    return Page(
-        items=endpoints_with_counts,
-        total=endpoints_page.total,
-        page=endpoints_page.page,
-        size=endpoints_page.size,
-        pages=endpoints_page.pages,
+    return query, to_items
+
+
+async def get_endpoints_with_ai_model_counts(
+    session: DBSessionDep, filter_params: EndpointFilterParams = Depends()
+) -> CountedPage[EndpointWithAIModelCount]:
+    """
+    Get all endpoints with AI model counts, with support for filtering, searching and sorting.
+    The total is estimated, see `count_items`.
+    """
+    query, to_items = _endpoints_with_ai_model_counts_query()
+    query = _filter_endpoints(query, filter_params)
+    count_query = _filter_endpoints(select(func.count(col(EndpointDB.id))), filter_params).order_by(
+        None
+    )
+    return await paginate(
+        session,
+        query,
+        filter_params,
+        CountStrategy.ESTIMATED,
+        count_query=count_query,
+        transformer=to_items,
+    )
+
+
+async def get_endpoints_with_ai_model_counts_by_cursor(
+    session: DBSessionDep, params: EndpointKeysetParams = Depends()
+) -> CountedCursorPage[EndpointWithAIModelCount]:
+    """
+    Get the endpoints with AI model counts by cursor, with support for filtering, searching
+    and sorting. Search results are not ranked.
+    """
+    query, to_items = _endpoints_with_ai_model_counts_query()
+    query, _ = _search_endpoints(query, params)
+    count_query, _ = _search_endpoints(select(func.count(col(EndpointDB.id))), params)
+    order_column = getattr(EndpointDB, params.order_by.value) if params.order_by else EndpointDB.id
+    return await keyset_paginate(
+        session,
+        query,
+        params,
+        keyset_keys(col(order_column), col(EndpointDB.id)),
+        params.order,
+        count_query=count_query,
+        transformer=to_items,
+        count_strategy=CountStrategy.ESTIMATED,
     )
 
 
@@ -582,6 +993,7 @@ async def create_test_task(
     session: DBSessionDep,
     endpoint_id: int,
     scheduled_at: Optional[datetime] = None,
+    lane: TaskLane = TaskLane.PERIODIC,
 ) -> Optional[EndpointTestTask]:
     """
     Create a new test task for an endpoint.
@@ -597,7 +1009,7 @@ async def create_test_task(
     from .scheduler import get_scheduler
 
     scheduler = get_scheduler()
-    return await scheduler.schedule_endpoint_test(endpoint_id, scheduled_at)
+    return await scheduler.schedule_endpoint_test(endpoint_id, scheduled_at, lane)
 
 
 async def get_task_by_id(
@@ -617,6 +1029,18 @@ async def get_task_by_id(
     return task
 
 
+def _latest_task_query(endpoint_id: int) -> Any:
+    """
+    The latest task of an endpoint.
+    """
+    return (
+        select(EndpointTestTask)
+        .where(EndpointTestTask.endpoint_id == endpoint_id)
+        .order_by(col(EndpointTestTask.scheduled_at).desc())
+        .limit(1)
+    )
+
+
 async def get_latest_task_for_endpoint(
     session: DBSessionDep,
     endpoint_id: int,
@@ -624,9 +1048,7 @@ async def get_latest_task_for_endpoint(
     """
     Get the latest task for an endpoint.
     """
-    query = select(EndpointTestTask).where(EndpointTestTask.endpoint_id == endpoint_id)
-    query = query.order_by(col(EndpointTestTask.scheduled_at).desc())
-    result = await session.execute(query)
+    result = await session.execute(_latest_task_query(endpoint_id))
     task = result.scalars().first()
 
     if task is None:
@@ -660,6 +1082,7 @@ async def get_task_with_endpoint(
         id=task.id,
         endpoint_id=task.endpoint_id,
         status=task.status,
+        lane=task.lane,
         scheduled_at=task.scheduled_at,
         last_tried=task.last_tried,
         created_at=task.created_at,
@@ -685,7 +1108,7 @@ async def manual_trigger_endpoint_test(
 
     # Create a task that will run immediately
     scheduled_at = now() + timedelta(seconds=2)
-    return await create_test_task(session, endpoint_id, scheduled_at)
+    return await create_test_task(session, endpoint_id, scheduled_at, TaskLane.MANUAL)
 
 
 async def batch_test_endpoints(
@@ -704,81 +1127,187 @@ async def batch_test_endpoints(
     Returns:
         BatchOperationResult with success and failure counts
     """
-    success_count = 0
-    failed_ids = {}
-
-    # 创建一个后台任务来执行所有测试
+    # 一次查询验证所有端点是否存在
+    result = await session.execute(
+        select(col(EndpointDB.id)).where(col(EndpointDB.id).in_(batch_operation.endpoint_ids))
+    )
+    existing_ids = set(result.scalars().all())
+    endpoint_ids = [eid for eid in batch_operation.endpoint_ids if eid in existing_ids]
+    failed_ids = {
+        str(eid): "404: Endpoint not found"
+        for eid in batch_operation.endpoint_ids
+        if eid not in existing_ids
+    }
+
+    # 创建一个后台任务来批量调度所有测试
     async def run_tests():
         from .scheduler import get_scheduler
 
         scheduler = get_scheduler()
-
-        for endpoint_id in batch_operation.endpoint_ids:
-            try:
-                # 创建2秒后执行的测试任务
-                scheduled_at = now() + timedelta(seconds=2)
-                await scheduler.schedule_endpoint_test(endpoint_id, scheduled_at)
-                logger.info(f"Scheduled test for endpoint {endpoint_id}")
-            except Exception as e:
-                logger.error(f"Failed to schedule test for endpoint {endpoint_id}: {e}")
+        try:
+            # 创建2秒后执行的测试任务
+            scheduled_at = now() + timedelta(seconds=2)
+            tasks = await scheduler.schedule_endpoint_tests(
+                endpoint_ids, scheduled_at, check_endpoints=False, lane=TaskLane.MANUAL
+            )
+            logger.info(f"Scheduled {len(tasks)} tests for {len(endpoint_ids)} endpoints")
+        except Exception as e:
+            logger.error(f"Failed to schedule batch test: {e}")
 
     # 添加后台任务
     background_task.add_task(run_tests)
 
-    # 统计成功和失败的数量
-    for endpoint_id in batch_operation.endpoint_ids:
-        try:
-            # 验证端点是否存在
-            await get_endpoint_by_id(session, endpoint_id)
-            success_count += 1
-        except Exception as e:
-            failed_ids[str(endpoint_id)] = str(e)
-
     return BatchOperationResult(
-        success_count=success_count,
-        failed_count=len(batch_operation.endpoint_ids) - success_count,
+        success_count=len(endpoint_ids),
+        failed_count=len(batch_operation.endpoint_ids) - len(endpoint_ids),
         failed_ids=failed_ids,
     )
 
 
 async def batch_delete_endpoints(
     session: DBSessionDep,
+    background_task: BackgroundTasks,
     batch_operation: EndpointBatchOperation,
 ) -> BatchOperationResult:
     """
-    Batch delete multiple endpoints.
-
-    Args:
-        session: Database session
-        batch_operation: The batch operation parameters
+    Batch delete multiple endpoints with a delete job.
 
-    Returns:
-        BatchOperationResult with success and failure counts
+    Small batches are deleted before returning, larger ones in the background: follow their
+    progress with the returned job ID.
     """
-    success_count = 0
-    failed_ids = {}
+    endpoint_ids = list(dict.fromkeys(batch_operation.endpoint_ids))
+    result = await session.execute(
+        select(col(EndpointDB.id)).where(col(EndpointDB.id).in_(endpoint_ids))
+    )
+    existing = set(result.scalars().all())
+    to_delete = [endpoint_id for endpoint_id in endpoint_ids if endpoint_id in existing]
+    failed_ids = {
+        str(endpoint_id): "Endpoint not found"
+        for endpoint_id in endpoint_ids
+        if endpoint_id not in existing
+    }
+
+    job = EndpointDeleteJobDB(requested=len(to_delete))
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    job_id = cast(int, job.id)
 
-    for endpoint_id in batch_operation.endpoint_ids:
-        try:
-            # 获取并删除端点
-            endpoint = await get_endpoint_by_id(session, endpoint_id)
+    if len(to_delete) > config.bulk_delete.inline_max_endpoints:
+        background_task.add_task(run_delete_job, job_id, to_delete)
+    else:
+        await run_delete_job(job_id, to_delete)
+        await session.refresh(job)
+        if job.status == JobStatus.FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to delete endpoints: {job.error}",
+            )
 
-            # 确保加载关联数据以激活级联删除
-            await session.refresh(endpoint, ["ai_model_links", "performances"])
+    return BatchOperationResult(
+        success_count=len(to_delete),
+        failed_count=len(failed_ids),
+        failed_ids=failed_ids,
+        job_id=job_id,
+    )
 
-            logger.info(f"Deleting endpoint {endpoint.id} ({endpoint.name}) with all its relations")
 
-            await session.delete(endpoint)
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Failed to delete endpoint {endpoint_id}: {e}")
-            failed_ids[str(endpoint_id)] = str(e)
+async def get_endpoint_delete_job(session: DBSessionDep, job_id: int) -> EndpointDeleteJobDB:
+    """
+    Get an endpoint delete job and its progress.
+    """
+    job = await session.get(EndpointDeleteJobDB, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Delete job not found")
+    return job
 
-    # 提交所有更改
-    await session.commit()
 
-    return BatchOperationResult(
-        success_count=success_count,
-        failed_count=len(batch_operation.endpoint_ids) - success_count,
-        failed_ids=failed_ids,
+async def get_endpoint_delete_jobs(
+    session: DBSessionDep,
+    limit: int = 20,
+) -> list[EndpointDeleteJobDB]:
+    """
+    Get the most recent endpoint delete jobs.
+    """
+    result = await session.execute(
+        select(EndpointDeleteJobDB)
+        .order_by(col(EndpointDeleteJobDB.created_at).desc())
+        .limit(limit)
     )
+    return list(result.scalars().all())
+
+
+async def cancel_periodic_tasks(
+    session: DBSessionDep,
+    request: CancelPeriodicTasksRequest,
+) -> CancelPeriodicTasksResult:
+    """
+    Cancel the queued periodic tests, e.g. to let a large batch of manual tests through.
+    """
+    from .task_queue import cancel_periodic_tasks as cancel_tasks
+
+    cancelled_pending, cancelled_running = await cancel_tasks(session, request.include_running)
+    return CancelPeriodicTasksResult(
+        cancelled_pending=cancelled_pending,
+        cancelled_running=cancelled_running,
+    )
+
+
+def forget_endpoints(endpoint_ids: Sequence[int]) -> None:
+    """
+    Drop the in-memory routing state (proxy failure counts) of deleted endpoints.
+
+    Only this process forgets them. Other processes never act on deleted endpoints: circuit
+    breaker tests are only scheduled for existing endpoints, workers stop tests whose task was
+    deleted, and results of deleted endpoints are not written.
+    """
+    for endpoint_id in endpoint_ids:
+        _endpoint_failures.pop(endpoint_id, None)
+
+
+async def report_endpoint_success(endpoint_id: int) -> None:
+    """
+    Reset the proxy failure count of an endpoint.
+    """
+    _endpoint_failures.pop(endpoint_id, None)
+
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """
+    Whether the error of a proxied request says the endpoint is unhealthy: a failed or dropped
+    connection, a timeout or a 5xx response.
+
+    Client errors (e.g. a bad request body) and cancellations (e.g. the client disconnected)
+    say nothing about the endpoint.
+    """
+    if isinstance(error, ClientResponseError):
+        return error.status >= 500
+    return isinstance(error, (ClientConnectionError, ClientPayloadError, asyncio.TimeoutError))
+
+
+async def report_endpoint_failure(endpoint_id: int, error: BaseException) -> None:
+    """
+    Count a failed proxied request, and re-test the endpoint in the circuit breaker lane once it
+    has failed too many times in a row. Errors that are not endpoint failures are ignored.
+    """
+    if not is_endpoint_failure(error):
+        return
+
+    failures = _endpoint_failures.get(endpoint_id, 0) + 1
+    if failures < config.scanner.circuit_breaker_threshold:
+        _endpoint_failures[endpoint_id] = failures
+        _endpoint_failures.move_to_end(endpoint_id)
+        while len(_endpoint_failures) > _MAX_TRACKED_FAILURES:
+            _endpoint_failures.popitem(last=False)
+        return
+
+    _endpoint_failures.pop(endpoint_id, None)
+    logger.warning(f"Endpoint {endpoint_id} failed {failures} times in a row, re-testing it")
+    from .scheduler import get_scheduler
+
+    try:
+        await get_scheduler().schedule_endpoint_test(
+            endpoint_id, now() + timedelta(seconds=2), TaskLane.CIRCUIT_BREAKER
+        )
+    except Exception as e:
+        logger.error(f"Failed to schedule circuit breaker test for endpoint {endpoint_id}: {e}")
@@ -0,0 +1,275 @@
+import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col
+
+from src.config import ScannerConfig, get_config
+from src.logging import get_logger
+from src.utils import now
+
+from .models import EndpointTestTask, TaskLane, TaskStatus
+
+logger = get_logger(__name__)
+config = get_config()
+
+
+def _due_tasks_query(due_at: datetime.datetime, limit: int, lane: Optional[TaskLane] = None) -> Any:
+    """
+    The (task_id, endpoint_id) of the pending tasks due at `due_at`, earliest first.
+    """
+    query = select(col(EndpointTestTask.id), col(EndpointTestTask.endpoint_id)).where(
+        col(EndpointTestTask.status) == TaskStatus.PENDING,
+        col(EndpointTestTask.scheduled_at) <= due_at,
+    )
+    if lane is not None:
+        query = query.where(col(EndpointTestTask.lane) == lane)
+    return query.order_by(col(EndpointTestTask.scheduled_at)).limit(limit)
+
+
+async def claim_due_tasks(
+    session: AsyncSession,
+    worker_id: str,
+    limit: int,
+    lane: Optional[TaskLane] = None,
+) -> List[Tuple[int, int]]:
+    """
+    Claim up to `limit` due pending tasks for a worker, optionally only from one lane.
+
+    The rows are locked with `SELECT ... FOR UPDATE SKIP LOCKED`, so concurrent workers never
+    claim the same task. Returns a list of (task_id, endpoint_id).
+    """
+    if limit <= 0:
+        return []
+
+    _now = now()
+    result = await session.execute(
+        _due_tasks_query(_now, limit, lane).with_for_update(skip_locked=True)
+    )
+    tasks = list(result.tuples().all())
+    if not tasks:
+        await session.commit()
+        return []
+
+    await session.execute(
+        update(EndpointTestTask)
+        .where(col(EndpointTestTask.id).in_([task_id for task_id, _ in tasks]))
+        .values(
+            status=TaskStatus.RUNNING,
+            worker_id=worker_id,
+            last_tried=_now,
+            lease_expires_at=_now + datetime.timedelta(seconds=config.scanner.lease_seconds),
+            attempts=col(EndpointTestTask.attempts) + 1,
+        )
+    )
+    await session.commit()
+    return tasks
+
+
+async def renew_leases(
+    session: AsyncSession,
+    worker_id: str,
+    task_ids: Sequence[int],
+) -> None:
+    """
+    Extend the leases of the tasks a worker is still running.
+    """
+    if not task_ids:
+        return
+    await session.execute(
+        update(EndpointTestTask)
+        .where(
+            col(EndpointTestTask.id).in_(task_ids),
+            col(EndpointTestTask.worker_id) == worker_id,
+            col(EndpointTestTask.status) == TaskStatus.RUNNING,
+        )
+        .values(lease_expires_at=now() + datetime.timedelta(seconds=config.scanner.lease_seconds))
+    )
+    await session.commit()
+
+
+async def complete_tasks(session: AsyncSession, task_ids: Sequence[int]) -> None:
+    """
+    Mark running tasks as done. The caller commits.
+    """
+    if not task_ids:
+        return
+    await session.execute(
+        update(EndpointTestTask)
+        .where(
+            col(EndpointTestTask.id).in_(task_ids),
+            col(EndpointTestTask.status) == TaskStatus.RUNNING,
+        )
+        .values(status=TaskStatus.DONE, lease_expires_at=None)
+    )
+
+
+def retry_delay(attempts: int, scanner_config: ScannerConfig) -> datetime.timedelta:
+    """
+    The backoff before retrying a task after its `attempts`-th attempt failed, doubling with
+    every attempt.
+    """
+    return datetime.timedelta(
+        seconds=scanner_config.retry_delay_seconds * 2 ** max(attempts - 1, 0)
+    )
+
+
+async def fail_tasks(session: AsyncSession, task_ids: Sequence[int]) -> None:
+    """
+    Put failed tasks back in the queue with exponential backoff, or mark them as failed once they
+    have used up their attempts. The caller commits.
+    """
+    if not task_ids:
+        return
+    running = and_(
+        col(EndpointTestTask.id).in_(task_ids),
+        col(EndpointTestTask.status) == TaskStatus.RUNNING,
+    )
+    failed = await session.execute(
+        update(EndpointTestTask)
+        .where(running, col(EndpointTestTask.attempts) >= config.scanner.max_attempts)
+        .values(status=TaskStatus.FAILED, lease_expires_at=None)
+    )
+    # The tasks left have fewer attempts than the maximum
+    _now = now()
+    retry_at = case(
+        {
+            attempts: _now + retry_delay(attempts, config.scanner)
+            for attempts in range(config.scanner.max_attempts)
+        },
+        value=col(EndpointTestTask.attempts),
+        else_=_now + retry_delay(config.scanner.max_attempts, config.scanner),
+    )
+    retried = await session.execute(
+        update(EndpointTestTask)
+        .where(running)
+        .values(status=TaskStatus.PENDING, scheduled_at=retry_at, lease_expires_at=None)
+    )
+    if failed.rowcount:
+        logger.error(f"{failed.rowcount} tasks marked as FAILED after using up their attempts")
+    if retried.rowcount:
+        logger.info(f"{retried.rowcount} failed tasks will be retried")
+
+
+async def requeue_task(session: AsyncSession, task_id: int) -> None:
+    """
+    Put a preempted task back in the queue without counting the interrupted attempt.
+    """
+    await session.execute(
+        update(EndpointTestTask)
+        .where(
+            col(EndpointTestTask.id) == task_id,
+            col(EndpointTestTask.status) == TaskStatus.RUNNING,
+        )
+        .values(
+            status=TaskStatus.PENDING,
+            scheduled_at=now(),
+            worker_id=None,
+            lease_expires_at=None,
+            attempts=func.greatest(col(EndpointTestTask.attempts) - 1, 0),
+        )
+    )
+    await session.commit()
+
+
+async def release_worker_tasks(session: AsyncSession, worker_id: str) -> int:
+    """
+    Put the tasks a worker is still running back in the queue, e.g. when it shuts down.
+    """
+    result = await session.execute(
+        update(EndpointTestTask)
+        .where(
+            col(EndpointTestTask.worker_id) == worker_id,
+            col(EndpointTestTask.status) == TaskStatus.RUNNING,
+        )
+        .values(
+            status=TaskStatus.PENDING,
+            scheduled_at=now(),
+            worker_id=None,
+            lease_expires_at=None,
+            attempts=func.greatest(col(EndpointTestTask.attempts) - 1, 0),
+        )
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def cancel_periodic_tasks(session: AsyncSession, include_running: bool) -> Tuple[int, int]:
+    """
+    Cancel the queued periodic tasks, and optionally the running ones too.
+
+    Running tasks are only marked as cancelled here; the worker holding them notices it on its
+    next lease renewal and stops them. Returns (cancelled pending, cancelled running).
+    """
+    pending = await session.execute(
+        update(EndpointTestTask)
+        .where(
+            col(EndpointTestTask.lane) == TaskLane.PERIODIC,
+            col(EndpointTestTask.status) == TaskStatus.PENDING,
+        )
+        .values(status=TaskStatus.CANCELLED)
+    )
+    running_count = 0
+    if include_running:
+        running = await session.execute(
+            update(EndpointTestTask)
+            .where(
+                col(EndpointTestTask.lane) == TaskLane.PERIODIC,
+                col(EndpointTestTask.status) == TaskStatus.RUNNING,
+            )
+            .values(status=TaskStatus.CANCELLED, lease_expires_at=None)
+        )
+        running_count = running.rowcount
+    await session.commit()
+    logger.info(f"Cancelled {pending.rowcount} pending and {running_count} running periodic tasks")
+    return pending.rowcount, running_count
+
+
+async def get_cancelled_task_ids(session: AsyncSession, task_ids: Sequence[int]) -> List[int]:
+    """
+    Get which of the given tasks have been cancelled, or deleted together with their endpoint.
+    """
+    if not task_ids:
+        return []
+    result = await session.execute(
+        select(col(EndpointTestTask.id)).where(
+            col(EndpointTestTask.id).in_(task_ids),
+            col(EndpointTestTask.status) != TaskStatus.CANCELLED,
+        )
+    )
+    live = set(result.scalars().all())
+    return [task_id for task_id in task_ids if task_id not in live]
+
+
+async def release_expired_leases(session: AsyncSession) -> int:
+    """
+    Return running tasks whose lease has expired (e.g. their worker died) to the queue.
+
+    Tasks that have used up their attempts are marked as failed instead.
+    """
+    _now = now()
+    expired = and_(
+        col(EndpointTestTask.status) == TaskStatus.RUNNING,
+        or_(
+            col(EndpointTestTask.lease_expires_at).is_(None),
+            col(EndpointTestTask.lease_expires_at) < _now,
+        ),
+    )
+    failed = await session.execute(
+        update(EndpointTestTask)
+        .where(expired, col(EndpointTestTask.attempts) >= config.scanner.max_attempts)
+        .values(status=TaskStatus.FAILED, lease_expires_at=None)
+    )
+    released = await session.execute(
+        update(EndpointTestTask)
+        .where(expired)
+        .values(status=TaskStatus.PENDING, scheduled_at=_now, worker_id=None, lease_expires_at=None)
+    )
+    await session.commit()
+    if failed.rowcount or released.rowcount:
+        logger.info(
+            f"Released {released.rowcount} tasks with expired leases, "
+            f"{failed.rowcount} marked as failed"
+        )
+    return released.rowcount
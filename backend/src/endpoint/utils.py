@@ -1,17 +1,193 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from enum import StrEnum
+from typing import List, Optional
+
 import tiktoken
+from pydantic import BaseModel
+
+from src.config import TokenizerConfig, get_config
+from src.database import DBSessionDep
+from src.logging import get_logger
+from src.process_stats import ProcessStats, get_process_stats
+
+logger = get_logger(__name__)
+
+# Known BPE files, used to look them up in the tiktoken cache without touching the network
+_ENCODING_BLOBS = {
+    "cl100k_base": "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken",
+    "o200k_base": "https://openaipublic.blob.core.windows.net/encodings/o200k_base.tiktoken",
+    "p50k_base": "https://openaipublic.blob.core.windows.net/encodings/p50k_base.tiktoken",
+    "r50k_base": "https://openaipublic.blob.core.windows.net/encodings/r50k_base.tiktoken",
+}
+
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+
+class TokenCounterBackend(StrEnum):
+    TIKTOKEN = "tiktoken"
+    HEURISTIC = "heuristic"
+
+
+class TokenCounterStats(BaseModel):
+    backend: Optional[TokenCounterBackend] = None
+    encoding: str
+    load_error: Optional[str] = None
+    tiktoken_calls: int = 0
+    heuristic_calls: int = 0
+    offloaded_calls: int = 0
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    Estimate the number of tokens without an encoder.
+
+    CJK characters are counted as one token each, everything else as four characters per token.
+    """
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    return cjk_count + math.ceil((len(text) - cjk_count) / 4)
+
+
+def configure_tiktoken_cache(config: TokenizerConfig) -> None:
+    """
+    Point tiktoken at the configured cache directory. Called once at process startup, as
+    tiktoken only reads its cache directory from the environment.
+    """
+    if config.cache_dir:
+        os.environ["TIKTOKEN_CACHE_DIR"] = config.cache_dir
+
+
+class TokenCounter:
+    """
+    Count tokens with a lazily loaded tiktoken encoder, falling back to a heuristic estimate.
+    """
+
+    def __init__(self, config: TokenizerConfig):
+        self.config = config
+        self._encoding: Optional[tiktoken.Encoding] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = TokenCounterStats(encoding=config.encoding)
+
+    @property
+    def stats(self) -> TokenCounterStats:
+        return self._stats.model_copy()
+
+    def _cache_dir(self) -> str:
+        # Where tiktoken looks, see `configure_tiktoken_cache`
+        return os.environ.get(
+            "TIKTOKEN_CACHE_DIR",
+            os.environ.get(
+                "DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache")
+            ),
+        )
+
+    def _is_cached(self) -> bool:
+        blob = _ENCODING_BLOBS.get(self.config.encoding)
+        if blob is None:
+            return False
+        cache_key = hashlib.sha1(blob.encode()).hexdigest()
+        return os.path.exists(os.path.join(self._cache_dir(), cache_key))
+
+    def _load(self) -> Optional[tiktoken.Encoding]:
+        """
+        Load the encoder once. Never downloads unless allowed by the config.
+        """
+        if self._loaded:
+            return self._encoding
+
+        with self._lock:
+            if self._loaded:
+                return self._encoding
+            try:
+                if not self.config.allow_download and not self._is_cached():
+                    raise FileNotFoundError(
+                        f"BPE file for {self.config.encoding} not found in {self._cache_dir()}"
+                    )
+                self._encoding = tiktoken.get_encoding(self.config.encoding)
+                self._stats.backend = TokenCounterBackend.TIKTOKEN
+                logger.info(f"Token counter using tiktoken encoding {self.config.encoding}")
+            except Exception as e:
+                self._encoding = None
+                self._stats.backend = TokenCounterBackend.HEURISTIC
+                self._stats.load_error = str(e)
+                logger.warning(f"Token counter falling back to heuristic estimation: {e}")
+            self._loaded = True
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        """
+        Count the tokens of a text synchronously.
+        """
+        encoding = self._load()
+        if encoding is None:
+            self._stats.heuristic_calls += 1
+            return estimate_token_count(text)
+        self._stats.tiktoken_calls += 1
+        return len(encoding.encode(text, disallowed_special=()))
+
+    async def acount(self, text: str) -> int:
+        """
+        Count the tokens of a text, running the encoder load and large encodes in the thread pool.
+        """
+        if self._loaded and (self._encoding is None or len(text) <= self.config.offload_threshold):
+            return self.count(text)
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.config.max_workers, thread_name_prefix="token-counter"
+            )
+        self._stats.offloaded_calls += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.count, text)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+TOKEN_COUNTER_STATS = "token_counter"
+
+_token_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = TokenCounter(get_config().tokenizer)
+    return _token_counter
+
+
+async def get_token_counter_stats(session: DBSessionDep) -> List[ProcessStats[TokenCounterStats]]:
+    """
+    Get the token counter metrics reported by every process.
+    """
+    return await get_process_stats(session, TOKEN_COUNTER_STATS, TokenCounterStats)
+
+
+def get_token_count(text: str) -> int:
+    """
+    Get the number of tokens in a text string.
+    """
+    return get_token_counter().count(text)
 
 
-def get_token_count(text: str, model: str = "gpt-4") -> int:
+async def aget_token_count(text: str) -> int:
     """
-    Get the number of tokens in a text string for a given model.
+    Get the number of tokens in a text string without blocking the event loop.
     """
-    encoding = tiktoken.encoding_for_model(model)
-    tokens = encoding.encode(text)
-    return len(tokens)
+    return await get_token_counter().acount(text)
 
 
 if __name__ == "__main__":
     # Example usage
     text = "Hello, how are you? 你好"
     token_count = get_token_count(text)
-    print(f"Token count for '{text}': {token_count}")
+    print(f"Token count for '{text}': {token_count} ({get_token_counter().stats})")
@@ -0,0 +1,329 @@
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import uuid
+from typing import Optional, Sequence
+
+from src.config import ScannerConfig, get_config
+from src.database import create_db_and_tables, sessionmanager
+from src.logging import get_logger
+from src.migrations import run_migrations
+from src.ollama.connector import SCAN_CONNECTOR_STATS, get_scan_connector
+from src.process_stats import get_stats_publisher
+
+from .models import TASK_LANE_PRIORITY, TaskLane
+from .result_sink import ResultSink, TestOutcome
+from .service import run_endpoint_test
+from .task_queue import (
+    claim_due_tasks,
+    get_cancelled_task_ids,
+    release_expired_leases,
+    release_worker_tasks,
+    renew_leases,
+    requeue_task,
+)
+from .utils import TOKEN_COUNTER_STATS, configure_tiktoken_cache, get_token_counter
+
+logger = get_logger(__name__)
+
+# Singleton instance
+_worker_pool_instance = None
+
+
+def get_worker_pool() -> "TestWorkerPool":
+    global _worker_pool_instance
+    if _worker_pool_instance is None:
+        _worker_pool_instance = TestWorkerPool(get_config().scanner)
+    return _worker_pool_instance
+
+
+class TestWorkerPool:
+    """
+    A fixed pool of async workers running endpoint tests claimed from the `EndpointTestTask` queue.
+
+    Memory use only depends on the pool size, not on the number of queued tasks.
+
+    Tasks are claimed lane by lane in priority order. Every lane except the periodic one has a
+    number of reserved workers that lower-priority lanes cannot use, so a periodic sweep never
+    fills the whole pool. When the pool is full anyway, due manual and circuit breaker tasks are
+    still claimed, and as many running periodic tests are preempted and put back in the queue.
+    """
+
+    def __init__(self, config: ScannerConfig):
+        self.config = config
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._queue: asyncio.PriorityQueue[tuple[int, int, int, TaskLane]] = asyncio.PriorityQueue()
+        self._jobs: dict[int, tuple[asyncio.Task, TaskLane]] = {}
+        self._lane_in_flight: dict[TaskLane, int] = {lane: 0 for lane in TASK_LANE_PRIORITY}
+        self._reserved: dict[TaskLane, int] = {
+            TaskLane.MANUAL: config.manual_reserved_workers,
+            TaskLane.CIRCUIT_BREAKER: config.circuit_breaker_reserved_workers,
+            TaskLane.IMPORT: config.import_reserved_workers,
+            TaskLane.PERIODIC: 0,
+        }
+        self._preempted: set[int] = set()
+        self._cancelled: set[int] = set()
+        self._sink = ResultSink(config)
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self.is_running = False
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of tasks claimed by this pool and not finished yet.
+        """
+        return sum(self._lane_in_flight.values())
+
+    @property
+    def lane_in_flight(self) -> dict[TaskLane, int]:
+        return dict(self._lane_in_flight)
+
+    def lane_capacity(self, lane: TaskLane) -> int:
+        """
+        Number of tasks of a lane this pool can claim now.
+
+        Free workers minus the unused reservations of the lanes with a higher priority.
+        """
+        capacity = self.config.concurrency - self.in_flight
+        for higher in TASK_LANE_PRIORITY[: TASK_LANE_PRIORITY.index(lane)]:
+            capacity -= max(self._reserved[higher] - self._lane_in_flight[higher], 0)
+        return capacity
+
+    async def start(self) -> None:
+        if self.is_running:
+            return
+
+        logger.info(
+            f"Starting test worker pool {self.worker_id} ({self.config.concurrency} workers)"
+        )
+        if sum(self._reserved.values()) >= self.config.concurrency:
+            logger.warning("Reserved workers use up the whole pool, periodic tests will not run")
+        self.is_running = True
+        self._sink.start()
+        self._tasks = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(self.config.concurrency)
+        ]
+        self._tasks.append(asyncio.create_task(self._claim_loop()))
+        self._tasks.append(asyncio.create_task(self._lease_loop()))
+
+    async def shutdown(self) -> None:
+        if not self.is_running:
+            return
+
+        logger.info("Shutting down test worker pool...")
+        self.is_running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Drop claimed tasks that did not start, they are released below
+        self._queue = asyncio.PriorityQueue()
+        self._lane_in_flight = {lane: 0 for lane in TASK_LANE_PRIORITY}
+        await self._sink.shutdown()
+
+        # Hand unfinished tasks to the other workers right away instead of after their lease
+        try:
+            async with sessionmanager.session() as session:
+                released = await release_worker_tasks(session, self.worker_id)
+            logger.info(f"Released {released} unfinished tasks")
+        except Exception as e:
+            logger.error(f"Error releasing unfinished tasks: {e}")
+        logger.info("Test worker pool shut down")
+
+    def notify(self) -> None:
+        """
+        Wake up the claim loop, e.g. right after tasks were enqueued.
+        """
+        self._wakeup.set()
+
+    async def _wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _claim_loop(self) -> None:
+        while self.is_running:
+            claimed = 0
+            try:
+                for lane in TASK_LANE_PRIORITY:
+                    capacity = self.lane_capacity(lane)
+                    if capacity <= 0:
+                        continue
+                    async with sessionmanager.session() as session:
+                        tasks = await claim_due_tasks(
+                            session,
+                            self.worker_id,
+                            min(capacity, self.config.claim_batch_size),
+                            lane,
+                        )
+                    self._enqueue(tasks, lane)
+                    claimed += len(tasks)
+
+                if self.in_flight >= self.config.concurrency:
+                    await self._preempt_periodic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error claiming tasks: {e}")
+
+            # Keep claiming while the queue has due tasks and we have free slots
+            if claimed == 0 or self.in_flight >= self.config.concurrency:
+                await self._wait(self.config.poll_interval_seconds)
+
+    def _enqueue(self, tasks: Sequence[tuple[int, int]], lane: TaskLane) -> None:
+        priority = TASK_LANE_PRIORITY.index(lane)
+        for task_id, endpoint_id in tasks:
+            self._lane_in_flight[lane] += 1
+            self._queue.put_nowait((priority, task_id, endpoint_id, lane))
+
+    async def _preempt_periodic(self) -> None:
+        """
+        Stop running periodic tests to make room for due manual and circuit breaker tasks.
+
+        The urgent tasks are claimed first and only as many periodic tests are stopped as tasks
+        were claimed, so the workers share out the backlog instead of all pre-empting for it.
+        """
+        periodic = [
+            task_id
+            for task_id, (job, lane) in self._jobs.items()
+            if lane == TaskLane.PERIODIC and task_id not in self._preempted and not job.done()
+        ]
+        limit = min(len(periodic), self.config.claim_batch_size)
+        claimed = 0
+        for lane in (TaskLane.MANUAL, TaskLane.CIRCUIT_BREAKER):
+            if claimed >= limit:
+                break
+            async with sessionmanager.session() as session:
+                tasks = await claim_due_tasks(session, self.worker_id, limit - claimed, lane)
+            self._enqueue(tasks, lane)
+            claimed += len(tasks)
+
+        for task_id in periodic[:claimed]:
+            logger.info(f"Preempting periodic task {task_id}")
+            self._preempted.add(task_id)
+            self._jobs[task_id][0].cancel()
+
+    async def _lease_loop(self) -> None:
+        interval = max(self.config.lease_seconds / 3, 1)
+        while self.is_running:
+            try:
+                async with sessionmanager.session() as session:
+                    task_ids = list(self._jobs)
+                    await renew_leases(session, self.worker_id, task_ids)
+                    await release_expired_leases(session)
+                    for task_id in await get_cancelled_task_ids(session, task_ids):
+                        if task_id in self._jobs:
+                            logger.info(f"Stopping cancelled task {task_id}")
+                            self._cancelled.add(task_id)
+                            self._jobs[task_id][0].cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error renewing task leases: {e}")
+            await asyncio.sleep(interval)
+
+    async def _worker_loop(self, index: int) -> None:
+        while self.is_running:
+            _, task_id, endpoint_id, lane = await self._queue.get()
+            job = asyncio.create_task(self.run_task(task_id, endpoint_id))
+            self._jobs[task_id] = (job, lane)
+            try:
+                await job
+            except asyncio.CancelledError:
+                if task_id in self._preempted:
+                    await self._requeue(task_id)
+                elif task_id not in self._cancelled:
+                    raise
+            finally:
+                self._jobs.pop(task_id, None)
+                self._preempted.discard(task_id)
+                self._cancelled.discard(task_id)
+                self._lane_in_flight[lane] -= 1
+                self._queue.task_done()
+                self._wakeup.set()
+
+    async def _requeue(self, task_id: int) -> None:
+        try:
+            async with sessionmanager.session() as session:
+                await requeue_task(session, task_id)
+        except Exception as e:
+            logger.error(f"Error requeueing preempted task {task_id}: {e}")
+
+    async def run_task(self, task_id: int, endpoint_id: int) -> None:
+        """
+        Run a single claimed endpoint test task and hand its outcome to the result sink.
+        """
+        logger.info(f"Running task {task_id} for endpoint {endpoint_id}")
+        try:
+            results = await run_endpoint_test(endpoint_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error running task {task_id}: {e}")
+            await self._sink.put(TestOutcome(task_id, endpoint_id, failed=True))
+            return
+
+        await self._sink.put(TestOutcome(task_id, endpoint_id, results))
+        logger.info(f"Task {task_id} completed successfully")
+
+
+def get_worker_pool_if_running() -> Optional[TestWorkerPool]:
+    """
+    Get the worker pool of this process if it has been started.
+    """
+    if _worker_pool_instance is not None and _worker_pool_instance.is_running:
+        return _worker_pool_instance
+    return None
+
+
+async def run_worker_process(config: ScannerConfig) -> None:
+    """
+    Run a test worker pool until the process receives SIGINT or SIGTERM.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    configure_tiktoken_cache(get_config().tokenizer)
+    # Test results are written with upserts relying on the unique keys the migrations add, so
+    # wait for them when the worker starts before the API
+    await create_db_and_tables()
+    await run_migrations()
+
+    stats_publisher = get_stats_publisher()
+    stats_publisher.register(TOKEN_COUNTER_STATS, lambda: get_token_counter().stats)
+    stats_publisher.register(SCAN_CONNECTOR_STATS, lambda: get_scan_connector().stats)
+    await stats_publisher.start()
+
+    pool = TestWorkerPool(config)
+    await pool.start()
+    try:
+        await stop.wait()
+    finally:
+        await pool.shutdown()
+        await stats_publisher.shutdown()
+        await get_scan_connector().close()
+        get_token_counter().shutdown()
+        if sessionmanager._engine is not None:
+            await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run endpoint test workers")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        help="Number of endpoint tests running at the same time (default: SCANNER__CONCURRENCY)",
+    )
+    args = parser.parse_args()
+
+    scanner_config = get_config().scanner
+    if args.concurrency is not None:
+        scanner_config = scanner_config.model_copy(update={"concurrency": args.concurrency})
+    asyncio.run(run_worker_process(scanner_config))
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .config import LeaderConfig, get_config
+from .database import sessionmanager
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# Singleton instance
+_leader_elector_instance = None
+
+
+def get_leader_elector() -> "LeaderElector":
+    global _leader_elector_instance
+    if _leader_elector_instance is None:
+        _leader_elector_instance = LeaderElector(get_config().leader)
+    return _leader_elector_instance
+
+
+class LeaderElector:
+    """
+    Elect one leader among all backend processes with a MySQL named lock.
+
+    The lock is held by a dedicated connection, so MySQL releases it as soon as the leader's
+    connection dies and a follower takes over on its next check. Every process serves API and
+    proxy traffic; only the leader runs the `on_elected` callback (e.g. starting the scheduler).
+    """
+
+    def __init__(self, config: LeaderConfig):
+        self.config = config
+        self._connection: Optional[AsyncConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._on_elected: Optional[Callable[[], Awaitable[None]]] = None
+        self._on_demoted: Optional[Callable[[], Awaitable[None]]] = None
+        self.is_leader = False
+
+    async def start(
+        self,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+    ) -> None:
+        """
+        Start campaigning. Without leader election the process is always the leader.
+        """
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        if not self.config.enabled:
+            await self._set_leader(True)
+            return
+
+        await self._check()
+        self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._set_leader(False)
+        await self._release()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.config.check_interval_seconds)
+            await self._check()
+
+    async def _check(self) -> None:
+        try:
+            if self._connection is None:
+                self._connection = await sessionmanager.detached_connection()
+            query = (
+                "IS_USED_LOCK(:name) = CONNECTION_ID()" if self.is_leader else "GET_LOCK(:name, 0)"
+            )
+            result = await self._connection.execute(
+                text(f"SELECT {query}"), {"name": self.config.lock_name}
+            )
+            await self._connection.commit()
+            held = result.scalar() == 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Leader election failed: {e}")
+            await self._release()
+            held = False
+
+        await self._set_leader(held)
+
+    async def _release(self) -> None:
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        try:
+            # Really close the connection instead of returning it to the pool, which releases
+            # the lock as well
+            await connection.invalidate()
+            await connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing leader lock connection: {e}")
+
+    async def _set_leader(self, is_leader: bool) -> None:
+        if is_leader == self.is_leader:
+            return
+        self.is_leader = is_leader
+        callback = self._on_elected if is_leader else self._on_demoted
+        logger.info("Elected as leader" if is_leader else "No longer the leader")
+        if callback is None:
+            return
+        try:
+            await callback()
+        except Exception as e:
+            logger.error(f"Error handling leadership change: {e}")
@@ -7,7 +7,13 @@ from fastapi.middleware.cors import CORSMiddleware
 from .config import Env, get_config
 from .database import create_db_and_tables, sessionmanager
 from .endpoint.scheduler import get_scheduler
+from .endpoint.utils import TOKEN_COUNTER_STATS, configure_tiktoken_cache, get_token_counter
+from .endpoint.worker import get_worker_pool
+from .leader import get_leader_elector
 from .logging import get_logger
+from .migrations import run_migrations
+from .ollama.connector import SCAN_CONNECTOR_STATS, get_scan_connector
+from .process_stats import get_stats_publisher
 from .routes import router
 from .setting.service import init_settings
 
@@ -23,27 +29,50 @@ logger.debug(f"Config: {config}")
 docs_url = "/docs" if config.app.env == Env.DEV else None
 
 
+async def start_background_services():
+    """
+    Start the scheduler and the workers running queued endpoint tests, on the leader only.
+    """
+    await get_scheduler().start()
+    if config.scanner.run_workers_in_api:
+        await get_worker_pool().start()
+
+
+async def stop_background_services():
+    await get_scheduler().shutdown()
+    await get_worker_pool().shutdown()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting application...")
+    configure_tiktoken_cache(config.tokenizer)
 
     # Initialize database
     await create_db_and_tables()
+    await run_migrations()
 
     # Initialize settings
     async with sessionmanager.session() as session:
         await init_settings(session)
 
-    # Initialize and start scheduler
-    scheduler = get_scheduler()
-    await scheduler.start()
+    # Report the metrics of this process for the stats routes
+    stats_publisher = get_stats_publisher()
+    stats_publisher.register(TOKEN_COUNTER_STATS, lambda: get_token_counter().stats)
+    stats_publisher.register(SCAN_CONNECTOR_STATS, lambda: get_scan_connector().stats)
+    await stats_publisher.start()
+
+    # Elect the process running the scheduler and workers
+    await get_leader_elector().start(start_background_services, stop_background_services)
     logger.info("Application startup complete")
 
     yield
 
-    # Shutdown scheduler
-    scheduler = get_scheduler()
-    await scheduler.shutdown()
+    # Shutdown scheduler and workers
+    await get_leader_elector().shutdown()
+    await get_stats_publisher().shutdown()
+    await get_scan_connector().close()
+    get_token_counter().shutdown()
 
     # Close database connections
     if sessionmanager._engine is not None:
@@ -0,0 +1,391 @@
+import datetime
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, func, insert, literal_column, select, text, tuple_, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex
+from sqlmodel import Field, col
+
+from .ai_model.models import (
+    AIModelDB,
+    AIModelPerformanceDB,
+    EndpointAIModelDB,
+    EndpointAIModelOutputDB,
+)
+from .ai_model.utils import compress_output
+from .apikey.models import ApiKeyUsageLogDB
+from .config import get_config
+from .database import SQLModel, sessionmanager
+from .endpoint.models import EndpointDB, EndpointPerformanceDB, EndpointTestTask
+from .logging import get_logger
+from .retention.models import AIModelPerformanceRollupDB
+from .utils import now
+
+logger = get_logger(__name__)
+config = get_config()
+
+# Processes starting together wait for the one applying the migrations
+_LOCK_NAME = "ollama_hack_migrations"
+_LOCK_TIMEOUT_SECONDS = 3600
+# Rows changed per transaction by the migrations that go through whole tables
+_CHUNK_SIZE = 1000
+
+
+class SchemaMigrationDB(SQLModel, table=True):
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime.datetime = Field(default_factory=now)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+
+
+async def _columns(connection: AsyncConnection, table: str) -> set[str]:
+    result = await connection.execute(
+        text(
+            "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ),
+        {"table": table},
+    )
+    return set(result.scalars().all())
+
+
+async def _indexes(connection: AsyncConnection, table: str) -> dict[str, tuple[bool, list[str]]]:
+    # Index name -> (unique, columns in order)
+    result = await connection.execute(
+        text(
+            "SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table ORDER BY SEQ_IN_INDEX"
+        ),
+        {"table": table},
+    )
+    indexes: dict[str, tuple[bool, list[str]]] = {}
+    for name, non_unique, column in result.tuples().all():
+        indexes.setdefault(name, (not non_unique, []))[1].append(column)
+    return indexes
+
+
+async def add_column(
+    connection: AsyncConnection,
+    model: type[SQLModel],
+    name: str,
+    default: Optional[str] = None,
+) -> None:
+    """
+    Add a column of a model unless it exists. Existing rows get `default`, an SQL literal.
+    """
+    table = model.__table__  # type: ignore
+    if name in await _columns(connection, table.name):
+        return
+    definition = CreateColumn(table.c[name]).compile(dialect=connection.dialect)
+    if default is not None:
+        definition = f"{definition} DEFAULT {default}"
+    logger.info(f"Adding column {table.name}.{name}")
+    await connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+
+
+async def extend_enum_column(connection: AsyncConnection, model: type[SQLModel], name: str) -> None:
+    """
+    Add the values of an enum to its native ENUM column, unless it has them all. New values
+    must come last in the enum, so that the existing ones keep their position.
+    """
+    table = model.__table__  # type: ignore
+    column = table.c[name]
+    result = await connection.execute(
+        text(
+            "SELECT COLUMN_TYPE FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND COLUMN_NAME = :column"
+        ),
+        {"table": table.name, "column": name},
+    )
+    column_type = result.scalar_one()
+    if all(f"'{value}'" in column_type for value in column.type.enums):
+        return
+    definition = CreateColumn(column).compile(dialect=connection.dialect)
+    logger.info(f"Extending enum column {table.name}.{name}")
+    await connection.execute(text(f"ALTER TABLE {table.name} MODIFY COLUMN {definition}"))
+
+
+async def add_indexes(connection: AsyncConnection, model: type[SQLModel], *names: str) -> None:
+    """
+    Create indexes declared on a model unless they exist.
+    """
+    table = model.__table__  # type: ignore
+    existing = await _indexes(connection, table.name)
+    for name in names:
+        if name in existing:
+            continue
+        index = next(index for index in table.indexes if index.name == name)
+        logger.info(f"Creating index {name} on {table.name}")
+        await connection.execute(CreateIndex(index))
+
+
+async def _add_task_lease_columns(connection: AsyncConnection) -> None:
+    await add_column(connection, EndpointTestTask, "attempts", "0")
+    await add_column(connection, EndpointTestTask, "worker_id")
+    await add_column(connection, EndpointTestTask, "lease_expires_at")
+
+
+async def _add_endpoint_next_test_at(connection: AsyncConnection) -> None:
+    await add_column(connection, EndpointDB, "next_test_at")
+    await add_indexes(connection, EndpointDB, "ix_endpoint_next_test_at")
+
+
+async def _add_task_lanes(connection: AsyncConnection) -> None:
+    await add_column(connection, EndpointTestTask, "lane", "'PERIODIC'")
+    # Adds CANCELLED to the statuses
+    await extend_enum_column(connection, EndpointTestTask, "status")
+
+
+async def _index_result_times(connection: AsyncConnection) -> None:
+    await add_indexes(connection, EndpointPerformanceDB, "ix_endpoint_performance_created_at")
+    await add_indexes(connection, AIModelPerformanceDB, "ix_ai_model_performance_created_at")
+    await add_indexes(connection, EndpointTestTask, "ix_endpoint_test_task_created_at")
+    await add_indexes(connection, ApiKeyUsageLogDB, "ix_api_key_usage_log_timestamp")
+
+
+async def _copy_latest_outputs(connection: AsyncConnection) -> None:
+    # The latest non-empty output of each link, compressed like new outputs. Outputs written
+    # since the upgrade are newer and kept.
+    performance = AIModelPerformanceDB.__table__  # type: ignore
+    link_key = tuple_(col(EndpointAIModelDB.endpoint_id), col(EndpointAIModelDB.ai_model_id))
+    last_link: Optional[tuple[int, int]] = None
+    while True:
+        query = select(col(EndpointAIModelDB.endpoint_id), col(EndpointAIModelDB.ai_model_id))
+        if last_link is not None:
+            query = query.where(link_key > tuple_(*last_link))
+        result = await connection.execute(query.order_by(*link_key.clauses).limit(_CHUNK_SIZE))
+        links = list(result.tuples().all())
+        if not links:
+            return
+        last_link = links[-1]
+
+        latest_ids = (
+            select(func.max(performance.c.id))
+            .where(
+                tuple_(performance.c.endpoint_id, performance.c.ai_model_id).in_(links),
+                literal_column("output") != "",
+            )
+            .group_by(performance.c.endpoint_id, performance.c.ai_model_id)
+        )
+        result = await connection.execute(
+            select(
+                performance.c.endpoint_id,
+                performance.c.ai_model_id,
+                performance.c.created_at,
+                literal_column("output"),
+            ).where(performance.c.id.in_(latest_ids))
+        )
+        outputs = []
+        for endpoint_id, ai_model_id, created_at, output in result.tuples().all():
+            data, truncated = compress_output(
+                output, config.scanner.output_max_chars, config.scanner.output_compression_level
+            )
+            outputs.append(
+                {
+                    "endpoint_id": endpoint_id,
+                    "ai_model_id": ai_model_id,
+                    "data": data,
+                    "original_length": len(output),
+                    "truncated": truncated,
+                    "created_at": created_at,
+                }
+            )
+        if outputs:
+            await connection.execute(
+                mysql_insert(EndpointAIModelOutputDB)
+                .values(outputs)
+                .on_duplicate_key_update(endpoint_id=EndpointAIModelOutputDB.endpoint_id)
+            )
+        await connection.commit()
+
+
+async def _move_performance_outputs(connection: AsyncConnection) -> None:
+    table = AIModelPerformanceDB.__tablename__  # type: ignore
+    if "output" not in await _columns(connection, table):
+        return
+    await _copy_latest_outputs(connection)
+
+    # Emptied in chunks of IDs first, so that no single statement rewrites the whole table
+    result = await connection.execute(text(f"SELECT MAX(id) FROM {table}"))
+    max_id = result.scalar_one() or 0
+    for start in range(0, max_id, _CHUNK_SIZE):
+        await connection.execute(
+            text(
+                f"UPDATE {table} SET output = '' "
+                "WHERE id > :start AND id <= :end AND output != ''"
+            ),
+            {"start": start, "end": start + _CHUNK_SIZE},
+        )
+        await connection.commit()
+    logger.info(f"Dropping column {table}.output")
+    await connection.execute(text(f"ALTER TABLE {table} DROP COLUMN output"))
+
+
+async def _add_confirmation_columns(connection: AsyncConnection) -> None:
+    await add_column(connection, EndpointDB, "last_confirmed_at")
+    await add_column(connection, EndpointPerformanceDB, "last_confirmed_at")
+    await add_column(connection, EndpointPerformanceDB, "samples", "1")
+    await add_column(connection, EndpointAIModelDB, "last_confirmed_at")
+    await add_column(connection, AIModelPerformanceDB, "last_confirmed_at")
+    await add_column(connection, AIModelPerformanceDB, "samples", "1")
+
+
+async def _add_endpoint_counts(connection: AsyncConnection) -> None:
+    await add_column(connection, AIModelDB, "total_endpoint_count", "0")
+    await add_column(connection, AIModelDB, "available_endpoint_count", "0")
+    await add_indexes(
+        connection,
+        AIModelDB,
+        "ix_ai_model_total_endpoint_count",
+        "ix_ai_model_available_endpoint_count",
+    )
+
+    # Imported here because the service imports most of the application
+    from .ai_model.service import reconcile_endpoint_counts
+
+    # Count the endpoints of the existing models, so they are listed right away. The counts are
+    # computed in sessions of their own.
+    await connection.commit()
+    await reconcile_endpoint_counts()
+
+
+async def _add_search_columns(connection: AsyncConnection) -> None:
+    # The columns are filled by `backfill_url_search_fields`, scheduled at startup
+    await add_column(connection, EndpointDB, "host")
+    await add_column(connection, EndpointDB, "ip_number")
+    await add_indexes(
+        connection, EndpointDB, "ix_endpoint_host", "ix_endpoint_ip_number", "ft_endpoint_name_url"
+    )
+    await add_indexes(connection, AIModelDB, "ft_ai_model_name_tag")
+
+
+async def _add_hot_query_indexes(connection: AsyncConnection) -> None:
+    await add_indexes(
+        connection,
+        EndpointTestTask,
+        "ix_endpoint_test_task_endpoint_status_time",
+        "ix_endpoint_test_task_status_lane_time",
+    )
+    await add_indexes(connection, EndpointAIModelDB, "ix_endpoint_ai_model_model_status_tps")
+    await add_indexes(connection, AIModelPerformanceDB, "ix_ai_model_performance_link_time")
+    await add_indexes(connection, ApiKeyUsageLogDB, "ix_api_key_usage_log_key_time_status")
+
+
+async def _merge_duplicate_ai_models(connection: AsyncConnection) -> None:
+    """
+    Merge the models with the same name and tag into the oldest one.
+
+    Links and rollups the oldest model already has for an endpoint are dropped, the history is
+    kept. Outputs of the merged models are dropped, the next test writes them again.
+    """
+    name, tag, model_id = col(AIModelDB.name), col(AIModelDB.tag), col(AIModelDB.id)
+    keepers = (
+        select(name, tag, func.min(model_id).label("keeper_id"))
+        .group_by(name, tag)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    result = await connection.execute(
+        select(model_id, keepers.c.keeper_id)
+        .join(keepers, and_(name == keepers.c.name, tag == keepers.c.tag))
+        .where(model_id != keepers.c.keeper_id)
+    )
+    duplicates = list(result.tuples().all())
+    for duplicate_id, keeper_id in duplicates:
+        await connection.execute(
+            delete(EndpointAIModelOutputDB).where(
+                col(EndpointAIModelOutputDB.ai_model_id) == duplicate_id
+            )
+        )
+        for model in (EndpointAIModelDB, AIModelPerformanceRollupDB):
+            # IGNORE skips the rows the keeper already has, deleted afterwards
+            await connection.execute(
+                update(model)
+                .where(col(model.ai_model_id) == duplicate_id)
+                .values(ai_model_id=keeper_id)
+                .prefix_with("IGNORE")
+            )
+            await connection.execute(delete(model).where(col(model.ai_model_id) == duplicate_id))
+        await connection.execute(
+            update(AIModelPerformanceDB)
+            .where(col(AIModelPerformanceDB.ai_model_id) == duplicate_id)
+            .values(ai_model_id=keeper_id)
+        )
+        await connection.execute(delete(AIModelDB).where(model_id == duplicate_id))
+    if duplicates:
+        logger.info(f"Merged {len(duplicates)} duplicate AI models")
+
+
+async def _add_ai_model_unique_name_tag(connection: AsyncConnection) -> None:
+    indexes = await _indexes(connection, AIModelDB.__tablename__)  # type: ignore
+    if any(unique and columns == ["name", "tag"] for unique, columns in indexes.values()):
+        return
+    await _merge_duplicate_ai_models(connection)
+    constraint = next(
+        constraint
+        for constraint in AIModelDB.__table__.constraints  # type: ignore
+        if constraint.name == "uq_ai_model_name_tag"
+    )
+    await connection.execute(AddConstraint(constraint))
+
+
+# Append only: a migration runs once per database, in version order. Each one brings tables
+# created before a schema change up to date with it.
+MIGRATIONS = [
+    Migration(1, "Add the lease columns of the test tasks", _add_task_lease_columns),
+    Migration(2, "Add the next test time of the endpoints", _add_endpoint_next_test_at),
+    Migration(3, "Add the lanes and the cancelled status of the test tasks", _add_task_lanes),
+    Migration(4, "Make AI model names and tags unique", _add_ai_model_unique_name_tag),
+    Migration(5, "Index the creation time of the results and logs", _index_result_times),
+    Migration(6, "Move the benchmark outputs to their own table", _move_performance_outputs),
+    Migration(7, "Add the confirmation columns of the test results", _add_confirmation_columns),
+    Migration(8, "Add and fill the endpoint counts of the AI models", _add_endpoint_counts),
+    Migration(9, "Add the search columns and indexes", _add_search_columns),
+    Migration(10, "Add the indexes of the hot queries", _add_hot_query_indexes),
+]
+
+
+async def run_migrations() -> None:
+    """
+    Apply the migrations the database has not had yet, after the tables have been created.
+
+    Migrations check the schema before changing it, so they also apply to databases created
+    with some of the changes already. Processes starting together take turns with a named lock.
+    """
+    connection = await sessionmanager.detached_connection()
+    try:
+        # The default stopwords drop every n-gram containing one from the FULLTEXT indexes
+        await connection.execute(text("SET SESSION innodb_ft_enable_stopword = OFF"))
+        locked = await connection.scalar(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": _LOCK_NAME, "timeout": _LOCK_TIMEOUT_SECONDS},
+        )
+        if not locked:
+            raise RuntimeError("Timed out waiting for another process to apply the migrations")
+        try:
+            result = await connection.execute(select(col(SchemaMigrationDB.version)))
+            applied = set(result.scalars().all())
+            await connection.commit()
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                logger.info(f"Applying migration {migration.version}: {migration.description}")
+                await migration.upgrade(connection)
+                await connection.execute(
+                    insert(SchemaMigrationDB).values(
+                        version=migration.version,
+                        description=migration.description,
+                        applied_at=now(),
+                    )
+                )
+                await connection.commit()
+        finally:
+            await connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _LOCK_NAME})
+    finally:
+        await connection.close()
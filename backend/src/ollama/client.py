@@ -1,7 +1,7 @@
 import asyncio
 import json as json_lib
 from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator, Literal, Type, TypeVar, overload
+from typing import Any, AsyncIterator, Literal, Optional, Sequence, Type, TypeVar, overload
 
 import aiohttp
 from pydantic import BaseModel
@@ -21,9 +21,25 @@ logger = get_logger(__name__)
 
 
 class OllamaClient:
-    def __init__(self, url: str, timeout: int = 10 * 60):
+    def __init__(
+        self,
+        url: str,
+        timeout: int = 10 * 60,
+        connector: Optional[aiohttp.BaseConnector] = None,
+        connect_timeout: Optional[float] = None,
+        trace_configs: Optional[Sequence[aiohttp.TraceConfig]] = None,
+        verify_ssl: bool = False,
+    ):
+        """
+        A shared `connector` is not closed with the session. TLS certificates are only verified
+        with `verify_ssl`.
+        """
         self.url = url
         self.timeout = timeout
+        self.connector = connector
+        self.connect_timeout = connect_timeout
+        self.trace_configs = list(trace_configs) if trace_configs else None
+        self.verify_ssl = verify_ssl
 
     @property
     def session(self) -> aiohttp.ClientSession:
@@ -41,7 +57,13 @@ class OllamaClient:
         """
         try:
             self._session = aiohttp.ClientSession(
-                self.url.rstrip("/"), timeout=aiohttp.ClientTimeout(total=self.timeout)
+                self.url.rstrip("/"),
+                timeout=aiohttp.ClientTimeout(
+                    total=self.timeout, sock_connect=self.connect_timeout
+                ),
+                connector=self.connector,
+                connector_owner=self.connector is None,
+                trace_configs=self.trace_configs,
             )
             yield self
         finally:
@@ -58,7 +80,7 @@ class OllamaClient:
             bytes: the response content
         """
         async with self.session.request(
-            method, path, *args, json=json, ssl=False, **kwargs
+            method, path, *args, json=json, ssl=self.verify_ssl, **kwargs
         ) as response:
             if response.status >= 300 or response.status < 200:
                 raise aiohttp.ClientResponseError(
@@ -79,7 +101,7 @@ class OllamaClient:
         **kwargs,
     ) -> AsyncIterator[T] | AsyncIterator[bytes]:
         async with self.session.request(
-            method, path, *args, json=json, ssl=False, **kwargs
+            method, path, *args, json=json, ssl=self.verify_ssl, **kwargs
         ) as response:
             if response.status >= 300 or response.status < 200:
                 raise aiohttp.ClientResponseError(
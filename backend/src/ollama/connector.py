@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+from typing import List, Optional
+
+import aiohttp
+from pydantic import BaseModel
+
+from src.config import ScannerConfig, get_config
+from src.database import DBSessionDep
+from src.logging import get_logger
+from src.process_stats import ProcessStats, get_process_stats
+
+from .client import OllamaClient
+
+logger = get_logger(__name__)
+
+
+class ScanConnectorStats(BaseModel):
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+
+class ScanConnector:
+    """
+    One tuned TCP connector shared by all endpoint tests.
+
+    Connections are kept alive and reused across tests of the same host, DNS results are cached,
+    and the number of connections is limited in total and per host.
+    """
+
+    def __init__(self, config: ScannerConfig):
+        self.config = config
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._stats = ScanConnectorStats()
+        self.trace_config = aiohttp.TraceConfig()
+        self.trace_config.on_request_start.append(self._on_request_start)
+        self.trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        self.trace_config.on_connection_reuseconn.append(self._on_connection_reuseconn)
+        self.trace_config.on_dns_cache_hit.append(self._on_dns_cache_hit)
+        self.trace_config.on_dns_cache_miss.append(self._on_dns_cache_miss)
+
+    @property
+    def stats(self) -> ScanConnectorStats:
+        return self._stats.model_copy()
+
+    @property
+    def connector(self) -> aiohttp.TCPConnector:
+        """
+        The shared connector, created on first use in the running event loop.
+        """
+        if self._connector is None or self._connector.closed:
+            self._connector = aiohttp.TCPConnector(
+                limit=self.config.connector_limit,
+                limit_per_host=self.config.connector_limit_per_host,
+                use_dns_cache=True,
+                ttl_dns_cache=self.config.dns_cache_ttl_seconds,
+                happy_eyeballs_delay=self.config.happy_eyeballs_delay,
+            )
+        return self._connector
+
+    def client(self, url: str, timeout: int = 10 * 60) -> OllamaClient:
+        """
+        Create an Ollama client using the shared connector.
+        """
+        return OllamaClient(
+            url,
+            timeout=timeout,
+            connector=self.connector,
+            connect_timeout=self.config.connect_timeout_seconds,
+            trace_configs=[self.trace_config],
+            verify_ssl=self.config.verify_ssl,
+        )
+
+    async def close(self) -> None:
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+
+    async def _on_request_start(self, session, context: SimpleNamespace, params) -> None:
+        self._stats.requests += 1
+
+    async def _on_connection_create_end(self, session, context: SimpleNamespace, params) -> None:
+        self._stats.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context: SimpleNamespace, params) -> None:
+        self._stats.connections_reused += 1
+
+    async def _on_dns_cache_hit(self, session, context: SimpleNamespace, params) -> None:
+        self._stats.dns_cache_hits += 1
+
+    async def _on_dns_cache_miss(self, session, context: SimpleNamespace, params) -> None:
+        self._stats.dns_cache_misses += 1
+
+
+SCAN_CONNECTOR_STATS = "scan_connector"
+
+_scan_connector: Optional[ScanConnector] = None
+
+
+def get_scan_connector() -> ScanConnector:
+    global _scan_connector
+    if _scan_connector is None:
+        _scan_connector = ScanConnector(get_config().scanner)
+    return _scan_connector
+
+
+async def get_scan_connector_stats(
+    session: DBSessionDep,
+) -> List[ProcessStats[ScanConnectorStats]]:
+    """
+    Get the scan connector metrics reported by every process.
+    """
+    return await get_process_stats(session, SCAN_CONNECTOR_STATS, ScanConnectorStats)
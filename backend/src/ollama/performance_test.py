@@ -5,9 +5,10 @@ from pydantic import BaseModel
 
 from src.ai_model.models import AIModelDB, AIModelPerformanceDB, AIModelStatusEnum
 from src.endpoint.models import EndpointDB, EndpointPerformanceDB, EndpointStatusEnum
-from src.endpoint.utils import get_token_count
+from src.endpoint.utils import aget_token_count
 from src.logging import get_logger
 from src.ollama.client import OllamaClient
+from src.ollama.connector import get_scan_connector
 
 logger = get_logger(__name__)
 
@@ -15,6 +16,7 @@ logger = get_logger(__name__)
 class ModelPerformance(BaseModel):
     ai_model: AIModelDB
     performance: AIModelPerformanceDB
+    output: str = ""
 
 
 class EndpointTestResult(BaseModel):
@@ -50,7 +52,7 @@ async def test_ai_model(
     ai_model: AIModelDB,
     prompt: str = "将以下内容，翻译成现代汉语：先帝创业未半而中道崩殂，今天下三分，益州疲弊，此诚危急存亡之秋也。",
     timeout: int = 60,
-) -> AIModelPerformanceDB:
+) -> ModelPerformance:
     """
     Test the performance of the AI model by making a request to the /generate endpoint.
 
@@ -80,8 +82,10 @@ async def test_ai_model(
                     output += response.response
                     if "fake-ollama" in output or "服务器繁忙" in output:
                         logger.error(f"Fake endpoint detected: {ai_model.name}:{ai_model.tag}")
-                        return AIModelPerformanceDB(
-                            status=AIModelStatusEnum.FAKE,
+                        return ModelPerformance(
+                            ai_model=ai_model,
+                            performance=AIModelPerformanceDB(status=AIModelStatusEnum.FAKE),
+                            output=output,
                         )
                     if response.done:
                         break
@@ -99,7 +103,7 @@ async def test_ai_model(
         if response.done and response.eval_count:
             output_tokens = response.eval_count
         else:
-            output_tokens = get_token_count(output)
+            output_tokens = await aget_token_count(output)
 
         total_time = end_time - start_time
         token_per_second = output_tokens / total_time
@@ -109,14 +113,14 @@ async def test_ai_model(
             token_per_second=token_per_second,
             connection_time=connection_time,
             total_time=total_time,
-            output=output,
             output_tokens=output_tokens,
         )
-        return performance
+        return ModelPerformance(ai_model=ai_model, performance=performance, output=output)
     except Exception as e:
         logger.debug(f"Error testing model {ai_model.name}:{ai_model.tag}: {e}")
-        return AIModelPerformanceDB(
-            status=AIModelStatusEnum.UNAVAILABLE,
+        return ModelPerformance(
+            ai_model=ai_model,
+            performance=AIModelPerformanceDB(status=AIModelStatusEnum.UNAVAILABLE),
         )
 
 
@@ -127,7 +131,7 @@ async def test_endpoint(
     Test the endpoint by checking its availability and testing each AI model.
     """
     test_reuslt = EndpointTestResult()
-    async with OllamaClient(endpoint.url).connect() as ollama_client:
+    async with get_scan_connector().client(endpoint.url).connect() as ollama_client:
         try:
             version = await ollama_client.version()
             test_reuslt.endpoint_performance = EndpointPerformanceDB(
@@ -158,7 +162,8 @@ async def test_endpoint(
                 )
                 continue
 
-            performance = await test_ai_model(ollama_client, ai_model)
+            model_performance = await test_ai_model(ollama_client, ai_model)
+            performance = model_performance.performance
             match performance.status:
                 case AIModelStatusEnum.AVAILABLE:
                     logger.info(
@@ -178,7 +183,6 @@ async def test_endpoint(
                 case _:
                     logger.debug(f"Model {ai_model.name}:{ai_model.tag} is not available, skipping")
 
-            model_performance = ModelPerformance(ai_model=ai_model, performance=performance)
             test_reuslt.model_performances.append(model_performance)
 
         return test_reuslt
@@ -5,10 +5,9 @@ from aiohttp import ClientResponseError
 from fastapi import HTTPException, Request
 from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy import exists
-from sqlmodel import select
+from sqlmodel import col, select
 
-from src.ai_model.models import AIModelDB, AIModelStatusEnum, EndpointAIModelDB
+from src.ai_model.models import AIModelDB
 from src.apikey.models import ApiKeyDB
 from src.apikey.service import (
     check_rate_limits,
@@ -82,12 +81,7 @@ class RequestInfo(BaseModel):
 async def get_tags(
     session: DBSessionDep,
 ):
-    query = select(AIModelDB.name, AIModelDB.tag)
-    subquery = select(EndpointAIModelDB).where(
-        (EndpointAIModelDB.ai_model_id == AIModelDB.id)
-        & (EndpointAIModelDB.status == AIModelStatusEnum.AVAILABLE)
-    )
-    query = query.where(exists(subquery))
+    query = select(AIModelDB.name, AIModelDB.tag).where(col(AIModelDB.available_endpoint_count) > 0)
     result = await session.execute(query)
 
     response = {"models": []}
@@ -104,6 +98,8 @@ async def send_request_to_endpoints(
     api_key: ApiKeyDB,
     endpoints: list[EndpointDB],
 ):
+    from src.endpoint.service import report_endpoint_failure, report_endpoint_success
+
     # Create a function to log the API key usage after the request completes
     async def log_usage(session: DBSessionDep, status_code):
         if api_key.id is None:
@@ -141,10 +137,15 @@ async def send_request_to_endpoints(
                             yield response
                     # Log successful request
                     logger.info(f"Request to endpoint {endpoint.url} completed")
+                    await report_endpoint_success(endpoint.id)
                     await log_usage(session, 200)
                     return
+                except asyncio.CancelledError:
+                    # The client went away, which says nothing about the endpoint
+                    raise
                 except Exception as e:
                     logger.error(f"Error: {e}")
+                    await report_endpoint_failure(endpoint.id, e)
                     error = e
 
             try:
@@ -173,9 +174,11 @@ async def send_request_to_endpoints(
                         params=request_info.params,
                     )
                     logger.info(f"Request to endpoint {endpoint.url} completed")
+                    await report_endpoint_success(endpoint.id)
                     await log_usage(session, 200)
                     return PlainTextResponse(response)
             except Exception as e:
+                await report_endpoint_failure(endpoint.id, e)
                 error = e
         try:
             raise error
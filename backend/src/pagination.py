@@ -0,0 +1,280 @@
+import datetime
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from enum import StrEnum
+from typing import Any, Callable, Generic, Optional, Sequence, Tuple, TypeVar
+
+from fastapi import HTTPException, Query, status
+from fastapi_pagination import Page, Params
+from fastapi_pagination.cursor import CursorPage, CursorParams
+from pydantic import Field
+from sqlalchemy import ColumnElement, Enum, String, and_, cast, false, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .config import get_config
+from .database import Explain
+from .schema import SortOrder
+
+config = get_config()
+
+T = TypeVar("T")
+S = TypeVar("S")
+
+
+class CountStrategy(StrEnum):
+    # COUNT(*) of the filtered query on every request
+    EXACT = "exact"
+    # COUNT(*) reused for the same query and filters for a while
+    CACHED = "cached"
+    # Estimate of the query planner from the table statistics
+    ESTIMATED = "estimated"
+
+
+_COUNT_STRATEGY_DESCRIPTION = "How `total` was counted, `estimated` totals are approximate"
+
+
+class CountedPage(Page[T], Generic[T]):
+    count_strategy: Optional[CountStrategy] = Field(None, description=_COUNT_STRATEGY_DESCRIPTION)
+
+
+class CountedCursorPage(CursorPage[T], Generic[T]):
+    count_strategy: Optional[CountStrategy] = Field(None, description=_COUNT_STRATEGY_DESCRIPTION)
+
+
+class KeysetParams(CursorParams):
+    include_total: bool = Query(False, description="Also count the items of all pages")
+
+
+class KeysetFilterParams(KeysetParams, Generic[S]):
+    search: Optional[str] = None
+    order_by: Optional[S] = None
+    order: Optional[SortOrder] = SortOrder.DESC
+
+
+def keyset_keys(column: Any, id_column: Any) -> list[ColumnElement]:
+    """
+    The sort keys of a column, made unique by the ID. NULLs of a nullable column get a key of
+    their own, so they sort last in ascending order.
+    """
+    if column is id_column:
+        return [id_column]
+    keys: list[ColumnElement] = []
+    if getattr(column, "nullable", False):
+        keys.append(column.is_(None))
+    if isinstance(column.type, Enum):
+        # MySQL sorts ENUMs by position but compares them to strings as strings
+        column = cast(column, String)
+    return [*keys, column, id_column]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, bool):
+        # `IS NULL` keys, compared as numbers
+        return int(value)
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return datetime.datetime.fromisoformat(value["dt"])
+    return value
+
+
+# Counts of the cached strategy by query signature: (expiry, count), oldest first
+_count_cache: OrderedDict[str, Tuple[float, int]] = OrderedDict()
+
+
+def _count_signature(session: AsyncSession, count_query: Any) -> str:
+    compiled = count_query.compile(dialect=session.get_bind().dialect)
+    params = json.dumps(compiled.params, default=str, sort_keys=True)
+    return hashlib.sha256(f"{compiled}\n{params}".encode()).hexdigest()
+
+
+async def _cached_count(session: AsyncSession, count_query: Any) -> int:
+    key = _count_signature(session, count_query)
+    cached = _count_cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    count = (await session.execute(count_query)).scalar_one()
+    _count_cache[key] = (time.monotonic() + config.pagination.count_cache_ttl_seconds, count)
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > config.pagination.count_cache_max_entries:
+        _count_cache.popitem(last=False)
+    return count
+
+
+async def _estimated_count(session: AsyncSession, query: Any) -> Optional[int]:
+    # Rows the planner expects to read from the tables of the outer query, times the share it
+    # expects to pass the conditions. Subqueries of the select list do not change the count.
+    plan = (await session.execute(Explain(query.order_by(None)))).mappings().all()
+    if not plan or plan[0]["type"] == "fulltext":
+        # A full-text match is always estimated as one row
+        return None
+    estimate = 1.0
+    for row in plan:
+        if row["id"] != plan[0]["id"]:
+            continue
+        if row["rows"] is None:
+            return None
+        estimate *= row["rows"] * float(row["filtered"] or 100) / 100
+    return round(estimate)
+
+
+async def count_items(
+    session: AsyncSession,
+    query: Any,
+    strategy: CountStrategy,
+    count_query: Optional[Any] = None,
+) -> Tuple[int, CountStrategy]:
+    """
+    Count the items of a query with a strategy.
+
+    Queries the planner cannot estimate, e.g. full-text searches, are counted with the cached
+    strategy instead. Returns the count and the strategy used.
+    """
+    if strategy == CountStrategy.ESTIMATED:
+        estimate = await _estimated_count(session, query)
+        if estimate is not None:
+            return estimate, CountStrategy.ESTIMATED
+        strategy = CountStrategy.CACHED
+
+    if count_query is None:
+        count_query = select(func.count()).select_from(query.order_by(None).subquery())
+    if strategy == CountStrategy.CACHED:
+        return await _cached_count(session, count_query), CountStrategy.CACHED
+    return (await session.execute(count_query)).scalar_one(), CountStrategy.EXACT
+
+
+def _unwrap(rows: Sequence[Any], extra_columns: int = 0) -> list[Any]:
+    # Single entities unwrapped, several as tuples, without the extra trailing columns
+    return [
+        row[0] if len(row) - extra_columns == 1 else tuple(row[: len(row) - extra_columns])
+        for row in rows
+    ]
+
+
+async def paginate(
+    session: AsyncSession,
+    query: Any,
+    params: Params,
+    count_strategy: CountStrategy = CountStrategy.EXACT,
+    count_query: Optional[Any] = None,
+    transformer: Optional[Callable[[Sequence[Any]], Sequence[T]]] = None,
+) -> CountedPage[T]:
+    """
+    Paginate a query by page number, counting the total with a strategy.
+
+    Its rows are passed to `transformer`, single entities unwrapped. A page that is not full ends
+    the list, so its total needs no count.
+    """
+    raw_params = params.to_raw_params()
+    rows = list(
+        (await session.execute(query.limit(raw_params.limit).offset(raw_params.offset))).all()
+    )
+    entities = _unwrap(rows)
+    items = transformer(entities) if transformer else entities
+
+    seen = (raw_params.offset or 0) + len(rows)
+    if len(rows) < (raw_params.limit or 0) and (rows or not raw_params.offset):
+        total, used = seen, CountStrategy.EXACT
+    else:
+        total, used = await count_items(session, query, count_strategy, count_query)
+        if rows:
+            # An estimate may be short of the items already seen
+            total = max(total, seen)
+    return CountedPage.create(items, params, total=total, count_strategy=used)
+
+
+def _after(keys: Sequence[ColumnElement], values: Sequence[Any], descending: bool) -> Any:
+    # (k1, k2, ...) > (v1, v2, ...) expanded, as row comparisons do not handle NULLs
+    terms = []
+    for i, (key, value) in enumerate(zip(keys, values, strict=True)):
+        if value is None:
+            continue
+        equal = [
+            previous.is_(None) if previous_value is None else previous == previous_value
+            for previous, previous_value in zip(keys[:i], values[:i], strict=True)
+        ]
+        terms.append(and_(*equal, key < value if descending else key > value))
+    return or_(false(), *terms)
+
+
+async def keyset_paginate(
+    session: AsyncSession,
+    query: Any,
+    params: KeysetParams,
+    keys: Sequence[ColumnElement],
+    order: Optional[SortOrder] = SortOrder.ASC,
+    count_query: Optional[Any] = None,
+    transformer: Optional[Callable[[Sequence[Any]], Sequence[T]]] = None,
+    count_strategy: CountStrategy = CountStrategy.EXACT,
+) -> CountedCursorPage[T]:
+    """
+    Paginate a query by cursor: every page is an index range read after the last item of the
+    previous one, whatever its depth.
+
+    `keys` must order the items uniquely, see `keyset_keys`. The query must not be ordered. Its
+    rows are passed to `transformer`, single entities unwrapped. Items of all pages are only
+    counted when asked for, with `count_strategy`.
+    """
+    cursor = params.to_raw_params().cursor
+    values: Optional[list] = None
+    backwards = False
+    if cursor:
+        try:
+            payload = json.loads(cursor)
+            values = [_decode_value(value) for value in payload["k"]]
+            backwards = bool(payload.get("b"))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor value"
+            ) from None
+        if len(values) != len(keys):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor value"
+            )
+
+    descending = (order == SortOrder.DESC) != backwards
+    page_query = query.add_columns(*(key.label(f"cursor_key_{i}") for i, key in enumerate(keys)))
+    if values is not None:
+        page_query = page_query.where(_after(keys, values, descending))
+    page_query = page_query.order_by(*(key.desc() if descending else key for key in keys))
+    rows = list((await session.execute(page_query.limit(params.size + 1))).all())
+
+    has_more = len(rows) > params.size
+    rows = rows[: params.size]
+    if backwards:
+        rows.reverse()
+
+    def cursor_of(row: Any, backwards: bool) -> str:
+        return json.dumps(
+            {"k": [_encode_value(value) for value in row[-len(keys) :]], "b": backwards}
+        )
+
+    next_page = previous_page = None
+    if rows:
+        if has_more or backwards:
+            next_page = cursor_of(rows[-1], False)
+        if values is not None and (has_more or not backwards):
+            previous_page = cursor_of(rows[0], True)
+
+    entities = _unwrap(rows, len(keys))
+    items = transformer(entities) if transformer else entities
+
+    total = used = None
+    if params.include_total:
+        total, used = await count_items(session, query, count_strategy, count_query)
+
+    return CountedCursorPage(
+        items=items,
+        total=total,
+        current_page=params.encode_cursor(cursor),
+        next_page=params.encode_cursor(next_page),
+        previous_page=params.encode_cursor(previous_page),
+        count_strategy=used,
+    )
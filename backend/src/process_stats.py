@@ -0,0 +1,167 @@
+import asyncio
+import datetime
+import os
+import socket
+import uuid
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy import TEXT, Column, delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import Field, col, select
+
+from .config import StatsConfig, get_config
+from .database import SQLModel, sessionmanager
+from .logging import get_logger
+from .utils import now
+
+logger = get_logger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+# Identifies this process in the metrics it reports
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class ProcessStatsDB(SQLModel, table=True):
+    """The latest metrics of a kind reported by a process, as JSON"""
+
+    name: str = Field(primary_key=True)
+    process_id: str = Field(primary_key=True)
+    data: str = Field(sa_column=Column(TEXT, nullable=False))
+    updated_at: datetime.datetime = Field(default_factory=now, index=True)
+
+
+class ProcessStats(BaseModel, Generic[T]):
+    process_id: str
+    updated_at: datetime.datetime
+    stats: T
+
+
+async def publish_stats(name: str, stats: BaseModel) -> None:
+    """
+    Store the metrics of this process, replacing the ones it reported before.
+    """
+    statement = mysql_insert(ProcessStatsDB).values(
+        name=name,
+        process_id=PROCESS_ID,
+        data=stats.model_dump_json(),
+        updated_at=now(),
+    )
+    async with sessionmanager.session() as session:
+        await session.execute(
+            statement.on_duplicate_key_update(
+                data=statement.inserted.data, updated_at=statement.inserted.updated_at
+            )
+        )
+        await session.commit()
+
+
+def _to_process_stats(row: ProcessStatsDB, model: type[T]) -> ProcessStats[T]:
+    return ProcessStats[model](  # type: ignore[valid-type]
+        process_id=row.process_id,
+        updated_at=row.updated_at,
+        stats=model.model_validate_json(row.data),
+    )
+
+
+async def get_latest_stats(
+    session: AsyncSession, name: str, model: type[T]
+) -> Optional[ProcessStats[T]]:
+    """
+    Get the metrics of a kind reported last, by whichever process.
+    """
+    result = await session.execute(
+        select(ProcessStatsDB)
+        .where(col(ProcessStatsDB.name) == name)
+        .order_by(col(ProcessStatsDB.updated_at).desc())
+        .limit(1)
+    )
+    row = result.scalars().first()
+    return _to_process_stats(row, model) if row is not None else None
+
+
+async def get_process_stats(
+    session: AsyncSession, name: str, model: type[T]
+) -> List[ProcessStats[T]]:
+    """
+    Get the metrics of a kind reported by every running process.
+    """
+    result = await session.execute(
+        select(ProcessStatsDB)
+        .where(col(ProcessStatsDB.name) == name)
+        .order_by(col(ProcessStatsDB.process_id))
+    )
+    return [_to_process_stats(row, model) for row in result.scalars().all()]
+
+
+class StatsPublisher:
+    """
+    Periodically report the in-memory metrics of this process to the database.
+
+    API requests are served by any process and tests run in separate worker processes, so the
+    stats routes read the metrics of all processes from the database instead of the memory of
+    the process that happens to serve the request.
+    """
+
+    def __init__(self, config: StatsConfig):
+        self.config = config
+        self._sources: Dict[str, Callable[[], BaseModel]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, source: Callable[[], BaseModel]) -> None:
+        self._sources[name] = source
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            async with sessionmanager.session() as session:
+                await session.execute(
+                    delete(ProcessStatsDB).where(col(ProcessStatsDB.process_id) == PROCESS_ID)
+                )
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"Error removing process metrics: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._publish()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error reporting process metrics: {e}")
+            await asyncio.sleep(self.config.publish_interval_seconds)
+
+    async def _publish(self) -> None:
+        for name, source in self._sources.items():
+            await publish_stats(name, source())
+
+        # Naive UTC, as stored
+        expired = now().replace(tzinfo=None) - datetime.timedelta(
+            minutes=self.config.expire_minutes
+        )
+        async with sessionmanager.session() as session:
+            await session.execute(
+                delete(ProcessStatsDB).where(col(ProcessStatsDB.updated_at) < expired)
+            )
+            await session.commit()
+
+
+# Singleton instance
+_stats_publisher_instance: Optional[StatsPublisher] = None
+
+
+def get_stats_publisher() -> StatsPublisher:
+    global _stats_publisher_instance
+    if _stats_publisher_instance is None:
+        _stats_publisher_instance = StatsPublisher(get_config().stats)
+    return _stats_publisher_instance
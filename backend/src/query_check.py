@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import datetime
+import sys
+from typing import Any, Callable, NamedTuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from .ai_model.models import AIModelDB, AIModelPerformanceDB, AIModelStatusEnum, EndpointAIModelDB
+from .ai_model.service import _recent_performances_query
+from .apikey.models import ApiKeyUsageLogDB
+from .apikey.service import _successful_requests_query, _usage_query
+from .database import Explain, SQLModel, create_db_and_tables, sessionmanager
+from .endpoint.models import (
+    EndpointDB,
+    EndpointPerformanceDB,
+    EndpointTestTask,
+    TaskLane,
+    TaskStatus,
+)
+from .endpoint.pacing import _due_endpoints_query
+from .endpoint.scheduler import _queued_tasks_query
+from .endpoint.schemas import EndpointFilterParams
+from .endpoint.search import url_search_fields
+from .endpoint.service import (
+    _ai_model_by_name_and_tag_query,
+    _endpoints_with_ai_model_counts_query,
+    _fastest_links_query,
+    _filter_endpoints,
+    _latest_task_query,
+)
+from .endpoint.task_queue import _due_tasks_query
+from .migrations import run_migrations
+from .retention.models import ApiKeyUsageRollupDB, RollupPeriod
+from .utils import now
+
+# Plans that read every row of a table, or of one of its indexes
+_FULL_SCANS = {"ALL", "index"}
+# Derived tables and union results, e.g. "<derived2>", hold the rows already selected through
+# the indexes of the tables they are built from
+_TEMPORARY_TABLE_PREFIX = "<"
+
+
+class HotQuery(NamedTuple):
+    name: str
+    build: Callable[[], Any]
+
+
+def _utcnow() -> datetime.datetime:
+    return now().replace(tzinfo=None)
+
+
+# The queries run on every request, test or page, built by the services that run them
+HOT_QUERIES = [
+    HotQuery(
+        "rate limit of an API key",
+        lambda: _successful_requests_query(7, _utcnow() - datetime.timedelta(minutes=1)),
+    ),
+    HotQuery(
+        "usage statistics of an API key",
+        lambda: _usage_query(
+            [7], _utcnow() - datetime.timedelta(hours=1), _utcnow().date() - datetime.timedelta(29)
+        ),
+    ),
+    HotQuery(
+        "due tasks claimed by the workers",
+        lambda: _due_tasks_query(_utcnow(), 100, TaskLane.PERIODIC),
+    ),
+    HotQuery(
+        "queued tasks of the scheduled endpoints",
+        lambda: _queued_tasks_query(
+            list(range(1, 501)), (TaskStatus.RUNNING,), _utcnow() - datetime.timedelta(minutes=10)
+        ),
+    ),
+    HotQuery("latest task of an endpoint", lambda: _latest_task_query(7)),
+    HotQuery("fastest available endpoints of a model", lambda: _fastest_links_query(3, 50)),
+    HotQuery(
+        "recent performances of a model on its endpoints",
+        lambda: _recent_performances_query(3, list(range(1, 51))).query,
+    ),
+    HotQuery("endpoints due for a test", lambda: _due_endpoints_query(_utcnow(), 100)),
+    HotQuery(
+        "endpoint list searched by host",
+        lambda: _endpoint_list_query("host:host-7.example.com"),
+    ),
+    HotQuery("endpoint list searched by IP range", lambda: _endpoint_list_query("10.0.1.0/24")),
+    HotQuery("endpoint list searched by name", lambda: _endpoint_list_query("host-7")),
+    HotQuery("model by name and tag", lambda: _ai_model_by_name_and_tag_query("model-3", "latest")),
+]
+
+
+def _endpoint_list_query(search: str) -> Any:
+    query, _ = _endpoints_with_ai_model_counts_query()
+    return _filter_endpoints(query, EndpointFilterParams(search=search))
+
+
+def _seed_rows(rows: int) -> dict[type[SQLModel], list[dict]]:
+    # Enough rows, spread over enough keys, for the optimizer to prefer the indexes
+    _now = _utcnow()
+    models = max(rows // 100, 1)
+    endpoints = max(rows // models, 1)
+
+    def at(i: int) -> datetime.datetime:
+        return _now - datetime.timedelta(minutes=i)
+
+    def endpoint(i: int) -> EndpointDB:
+        url = f"http://host-{i}.example.com" if i % 2 else f"http://10.0.{i // 256}.{i % 256}"
+        return EndpointDB(url=url, name=f"host-{i}", next_test_at=at(-i), **url_search_fields(url))
+
+    return {
+        AIModelDB: [
+            AIModelDB(name=f"model-{i}", tag="latest").model_dump(exclude={"id"})
+            for i in range(models)
+        ],
+        EndpointDB: [endpoint(i).model_dump(exclude={"id"}) for i in range(endpoints)],
+        EndpointAIModelDB: [
+            EndpointAIModelDB(
+                endpoint_id=i % endpoints + 1,
+                ai_model_id=i // endpoints + 1,
+                status=list(AIModelStatusEnum)[i % len(AIModelStatusEnum)],
+                token_per_second=i % 97,
+            ).model_dump()
+            for i in range(rows)
+        ],
+        AIModelPerformanceDB: [
+            AIModelPerformanceDB(
+                endpoint_id=i % endpoints + 1, ai_model_id=i % models + 1, created_at=at(i)
+            ).model_dump(exclude={"id"})
+            for i in range(rows)
+        ],
+        EndpointPerformanceDB: [
+            EndpointPerformanceDB(endpoint_id=i % endpoints + 1, created_at=at(i)).model_dump(
+                exclude={"id"}
+            )
+            for i in range(rows)
+        ],
+        EndpointTestTask: [
+            EndpointTestTask(
+                endpoint_id=i % endpoints + 1,
+                status=list(TaskStatus)[i % len(TaskStatus)],
+                lane=list(TaskLane)[i % len(TaskLane)],
+                scheduled_at=at(i - rows // 2),
+            ).model_dump(exclude={"id"})
+            for i in range(rows)
+        ],
+        ApiKeyUsageLogDB: [
+            ApiKeyUsageLogDB(
+                api_key_id=i % 50 + 1,
+                endpoint="/api/chat",
+                method="POST",
+                status_code=200 if i % 10 else 500,
+                timestamp=at(i),
+            ).model_dump(exclude={"id"})
+            for i in range(rows)
+        ],
+        ApiKeyUsageRollupDB: [
+            ApiKeyUsageRollupDB(
+                period=RollupPeriod.DAY,
+                bucket_start=at(i // 50 * 24 * 60).replace(
+                    hour=0, minute=0, second=0, microsecond=0
+                ),
+                api_key_id=i % 50 + 1,
+                requests=100,
+            ).model_dump(exclude={"id"})
+            for i in range(rows)
+        ],
+    }
+
+
+async def _seed(connection: AsyncConnection, rows: int) -> None:
+    """
+    Fill the empty tables of the hot queries, and refresh their statistics.
+    """
+    # The rows reference each other by position only
+    await connection.execute(text("SET SESSION foreign_key_checks = 0"))
+    try:
+        for model, values in _seed_rows(rows).items():
+            table = model.__table__  # type: ignore
+            if (await connection.execute(select(func.count()).select_from(table))).scalar_one():
+                continue
+            for i in range(0, len(values), 1000):
+                await connection.execute(insert(table), values[i : i + 1000])
+            await connection.execute(text(f"ANALYZE TABLE {table.name}"))
+    finally:
+        # The connection goes back to the pool
+        await connection.execute(text("SET SESSION foreign_key_checks = 1"))
+
+
+async def check_hot_queries(rows: int, seed: bool) -> bool:
+    """
+    EXPLAIN every hot query and report those that scan a whole table or index.
+
+    With `seed`, the empty tables are filled with `rows` generated rows first, which must only
+    be done on a scratch database.
+    """
+    await create_db_and_tables()
+    await run_migrations()
+    if seed:
+        async with sessionmanager.connect() as connection:
+            await _seed(connection, rows)
+
+    passed = True
+    async with sessionmanager.connect() as connection:
+        for query in HOT_QUERIES:
+            plan = (await connection.execute(Explain(query.build()))).mappings().all()
+            full_scans = [
+                row["table"]
+                for row in plan
+                if row["type"] in _FULL_SCANS
+                and not (row["table"] or "").startswith(_TEMPORARY_TABLE_PREFIX)
+            ]
+            if full_scans:
+                passed = False
+                print(f"FAIL {query.name}: full scan of {', '.join(full_scans)}")
+            else:
+                keys = ", ".join(f"{row['table']}.{row['key']} ({row['type']})" for row in plan)
+                print(f"ok   {query.name}: {keys}")
+    await sessionmanager.close()
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the hot queries use an index. The plans depend on the data, so "
+        "run it on a copy of a real database, or on a scratch database filled with --seed"
+    )
+    parser.add_argument(
+        "--seed",
+        action="store_true",
+        help="Fill the empty tables of the hot queries with generated rows first. Only for a "
+        "scratch database: the rows are written to the configured database",
+    )
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=5000,
+        help="Rows generated per empty table with --seed (default: 5000)",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check_hot_queries(args.rows, args.seed)) else 1)
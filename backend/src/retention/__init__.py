@@ -0,0 +1,3 @@
+from .routes import retention_router
+
+__all__ = ["retention_router"]
@@ -0,0 +1,88 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlmodel import Field, UniqueConstraint
+
+from src.database import SQLModel
+from src.utils import now
+
+
+class RollupPeriod(str, Enum):
+    HOUR = "hour"
+    DAY = "day"
+
+
+class RetentionRunStatus(str, Enum):
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class AIModelPerformanceRollupDB(SQLModel, table=True):
+    """Aggregated model performances of an endpoint over an hour or a day"""
+
+    __table_args__ = (UniqueConstraint("period", "bucket_start", "endpoint_id", "ai_model_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    period: RollupPeriod
+    bucket_start: datetime = Field(index=True)
+    endpoint_id: int = Field(index=True)
+    ai_model_id: int = Field(index=True)
+
+    samples: int = Field(default=0)
+    available_samples: int = Field(default=0)
+    # Computed over the available samples only
+    min_tps: Optional[float] = Field(default=None)
+    avg_tps: Optional[float] = Field(default=None)
+    max_tps: Optional[float] = Field(default=None)
+    avg_connection_time: Optional[float] = Field(default=None)
+
+
+class EndpointAvailabilityRollupDB(SQLModel, table=True):
+    """Aggregated endpoint test results over an hour or a day"""
+
+    __table_args__ = (UniqueConstraint("period", "bucket_start", "endpoint_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    period: RollupPeriod
+    bucket_start: datetime = Field(index=True)
+    endpoint_id: int = Field(index=True)
+
+    samples: int = Field(default=0)
+    available_samples: int = Field(default=0)
+
+
+class ApiKeyUsageRollupDB(SQLModel, table=True):
+    """Requests of an API key to a model over an hour or a day"""
+
+    __table_args__ = (UniqueConstraint("period", "bucket_start", "api_key_id", "model"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    period: RollupPeriod
+    bucket_start: datetime = Field(index=True)
+    api_key_id: int = Field(index=True)
+    # Empty for requests without a model, NULLs would not be unique
+    model: str = Field(default="")
+
+    requests: int = Field(default=0)
+    # Requests answered with a status code of 400 or above
+    failed_requests: int = Field(default=0)
+
+
+class RetentionWatermarkDB(SQLModel, table=True):
+    """Everything before `rolled_up_until` has been rolled up and may be purged"""
+
+    name: str = Field(primary_key=True)
+    rolled_up_until: datetime
+
+
+class RetentionRunDB(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    status: RetentionRunStatus = Field(default=RetentionRunStatus.RUNNING)
+    current_step: Optional[str] = Field(default=None)
+    rows_rolled_up: int = Field(default=0)
+    rows_deleted: int = Field(default=0)
+    error: Optional[str] = Field(default=None)
+    started_at: datetime = Field(default_factory=now, index=True)
+    finished_at: Optional[datetime] = Field(default=None)
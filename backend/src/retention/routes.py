@@ -0,0 +1,47 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, status
+
+from src.user.service import get_current_admin_user
+
+from .models import RetentionRunDB
+from .schemas import RetentionPolicyInfo, RetentionRunInfo
+from .service import get_retention_policy, get_retention_runs, start_retention_run
+
+retention_router = APIRouter(
+    prefix="/retention", tags=["retention"], dependencies=[Depends(get_current_admin_user)]
+)
+
+
+@retention_router.get(
+    "/policy",
+    response_model=RetentionPolicyInfo,
+    description="Get the retention policy",
+)
+async def _get_retention_policy(
+    policy: RetentionPolicyInfo = Depends(get_retention_policy),
+) -> RetentionPolicyInfo:
+    return policy
+
+
+@retention_router.get(
+    "/runs",
+    response_model=List[RetentionRunInfo],
+    description="Get the most recent retention runs and the progress of the current one",
+)
+async def _get_retention_runs(
+    runs: List[RetentionRunDB] = Depends(get_retention_runs),
+) -> List[RetentionRunInfo]:
+    return [RetentionRunInfo.model_validate(run) for run in runs]
+
+
+@retention_router.post(
+    "/runs",
+    response_model=RetentionRunInfo,
+    status_code=status.HTTP_202_ACCEPTED,
+    description="Start a retention run now",
+)
+async def _start_retention_run(
+    run: RetentionRunDB = Depends(start_retention_run),
+) -> RetentionRunInfo:
+    return RetentionRunInfo.model_validate(run)
@@ -0,0 +1,32 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+from .models import RetentionRunStatus
+
+
+class RetentionPolicyInfo(BaseModel):
+    enabled: bool
+    run_interval_hours: float
+    raw_days: int
+    hourly_rollup_days: int
+    daily_rollup_days: int
+    task_days: int
+    usage_log_days: int
+    availability_days: int
+    chunk_size: int
+
+
+class RetentionRunInfo(BaseModel):
+    id: int
+    status: RetentionRunStatus
+    current_step: Optional[str] = None
+    rows_rolled_up: int
+    rows_deleted: int
+    error: Optional[str] = None
+    started_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+    class Config:
+        from_attributes = True
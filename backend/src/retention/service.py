@@ -0,0 +1,511 @@
+import asyncio
+import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+from fastapi import BackgroundTasks, HTTPException, status
+from sqlalchemy import case, delete, func, literal, select, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.sql import ColumnElement, Select
+from sqlmodel import col
+
+from src.ai_model.models import AIModelPerformanceDB, AIModelStatusEnum
+from src.apikey.models import ApiKeyUsageLogDB
+from src.config import get_config
+from src.database import DBSessionDep, SQLModel, sessionmanager
+from src.endpoint.models import (
+    EndpointAvailabilityDayDB,
+    EndpointPerformanceDB,
+    EndpointStatusEnum,
+    EndpointTestTask,
+    TaskStatus,
+)
+from src.logging import get_logger
+from src.utils import now
+
+from .models import (
+    AIModelPerformanceRollupDB,
+    ApiKeyUsageRollupDB,
+    EndpointAvailabilityRollupDB,
+    RetentionRunDB,
+    RetentionRunStatus,
+    RetentionWatermarkDB,
+    RollupPeriod,
+)
+from .schemas import RetentionPolicyInfo
+from .usage import USAGE_WATERMARK
+
+logger = get_logger(__name__)
+config = get_config()
+
+_BUCKET_FORMATS = {
+    RollupPeriod.HOUR: "%Y-%m-%d %H:00:00",
+    RollupPeriod.DAY: "%Y-%m-%d 00:00:00",
+}
+_MODEL_ROLLUP_COLUMNS = [
+    "period",
+    "bucket_start",
+    "endpoint_id",
+    "ai_model_id",
+    "samples",
+    "available_samples",
+    "min_tps",
+    "avg_tps",
+    "max_tps",
+    "avg_connection_time",
+]
+_ENDPOINT_ROLLUP_COLUMNS = ["period", "bucket_start", "endpoint_id", "samples", "available_samples"]
+_FINISHED_TASK_STATUSES = [TaskStatus.DONE, TaskStatus.FAILED, TaskStatus.CANCELLED]
+
+# Named lock held by the running retention run, so that a manual run in any process never
+# overlaps the scheduled run of the leader
+_LOCK_NAME = "ollama_hack_retention"
+
+Progress = Callable[..., Awaitable[None]]
+
+
+def _utcnow() -> datetime.datetime:
+    # The database stores naive UTC datetimes
+    return now().replace(tzinfo=None)
+
+
+def _floor(value: datetime.datetime, period: RollupPeriod) -> datetime.datetime:
+    value = value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0) if period == RollupPeriod.DAY else value
+
+
+def _bucket(column: Any, period: RollupPeriod) -> Any:
+    return func.date_format(column, _BUCKET_FORMATS[period]).label("bucket")
+
+
+def _period(model: type[SQLModel], period: RollupPeriod) -> Any:
+    # Bound with the column type so the enum is stored the same way as by the ORM
+    return literal(period, type_=model.__table__.c.period.type)  # type: ignore
+
+
+def _upsert_from_select(
+    model: type[SQLModel], columns: List[str], key_size: int, query: Select
+) -> Any:
+    """
+    Insert the rollups computed by `query`, overwriting existing ones. The first `key_size`
+    columns form the unique key.
+    """
+    statement = mysql_insert(model).from_select(columns, query)
+    return statement.on_duplicate_key_update(
+        {column: statement.inserted[column] for column in columns[key_size:]}
+    )
+
+
+def _model_rollup_from_raw(start: datetime.datetime, end: datetime.datetime) -> Any:
+    # A raw row stands for `samples` consecutive tests with the same result, all counted in the
+    # bucket where the row started
+    samples = col(AIModelPerformanceDB.samples)
+    available = col(AIModelPerformanceDB.status) == AIModelStatusEnum.AVAILABLE
+    available_samples = func.sum(case((available, samples), else_=0))
+    tps = case((available, col(AIModelPerformanceDB.token_per_second)))
+    bucket = _bucket(col(AIModelPerformanceDB.created_at), RollupPeriod.HOUR)
+    query = (
+        select(
+            _period(AIModelPerformanceRollupDB, RollupPeriod.HOUR),
+            bucket,
+            col(AIModelPerformanceDB.endpoint_id),
+            col(AIModelPerformanceDB.ai_model_id),
+            func.sum(samples),
+            available_samples,
+            func.min(tps),
+            func.sum(tps * samples) / func.nullif(available_samples, 0),
+            func.max(tps),
+            func.sum(case((available, col(AIModelPerformanceDB.connection_time) * samples)))
+            / func.nullif(available_samples, 0),
+        )
+        .where(
+            col(AIModelPerformanceDB.created_at) >= start,
+            col(AIModelPerformanceDB.created_at) < end,
+            col(AIModelPerformanceDB.endpoint_id).is_not(None),
+            col(AIModelPerformanceDB.ai_model_id).is_not(None),
+        )
+        .group_by(
+            bucket, col(AIModelPerformanceDB.endpoint_id), col(AIModelPerformanceDB.ai_model_id)
+        )
+    )
+    return _upsert_from_select(AIModelPerformanceRollupDB, _MODEL_ROLLUP_COLUMNS, 4, query)
+
+
+def _model_rollup_from_hourly(start: datetime.datetime, end: datetime.datetime) -> Any:
+    rollup = AIModelPerformanceRollupDB
+    available = func.nullif(func.sum(col(rollup.available_samples)), 0)
+    bucket = _bucket(col(rollup.bucket_start), RollupPeriod.DAY)
+    query = (
+        select(
+            _period(rollup, RollupPeriod.DAY),
+            bucket,
+            col(rollup.endpoint_id),
+            col(rollup.ai_model_id),
+            func.sum(col(rollup.samples)),
+            func.sum(col(rollup.available_samples)),
+            func.min(col(rollup.min_tps)),
+            # Averages weighted by the number of available samples of each hour
+            func.sum(col(rollup.avg_tps) * col(rollup.available_samples)) / available,
+            func.max(col(rollup.max_tps)),
+            func.sum(col(rollup.avg_connection_time) * col(rollup.available_samples)) / available,
+        )
+        .where(
+            col(rollup.period) == RollupPeriod.HOUR,
+            col(rollup.bucket_start) >= start,
+            col(rollup.bucket_start) < end,
+        )
+        .group_by(bucket, col(rollup.endpoint_id), col(rollup.ai_model_id))
+    )
+    return _upsert_from_select(rollup, _MODEL_ROLLUP_COLUMNS, 4, query)
+
+
+def _endpoint_rollup_from_raw(start: datetime.datetime, end: datetime.datetime) -> Any:
+    available = col(EndpointPerformanceDB.status) == EndpointStatusEnum.AVAILABLE
+    bucket = _bucket(col(EndpointPerformanceDB.created_at), RollupPeriod.HOUR)
+    query = (
+        select(
+            _period(EndpointAvailabilityRollupDB, RollupPeriod.HOUR),
+            bucket,
+            col(EndpointPerformanceDB.endpoint_id),
+            func.sum(col(EndpointPerformanceDB.samples)),
+            func.sum(case((available, col(EndpointPerformanceDB.samples)), else_=0)),
+        )
+        .where(
+            col(EndpointPerformanceDB.created_at) >= start,
+            col(EndpointPerformanceDB.created_at) < end,
+            col(EndpointPerformanceDB.endpoint_id).is_not(None),
+        )
+        .group_by(bucket, col(EndpointPerformanceDB.endpoint_id))
+    )
+    return _upsert_from_select(EndpointAvailabilityRollupDB, _ENDPOINT_ROLLUP_COLUMNS, 3, query)
+
+
+def _endpoint_rollup_from_hourly(start: datetime.datetime, end: datetime.datetime) -> Any:
+    rollup = EndpointAvailabilityRollupDB
+    bucket = _bucket(col(rollup.bucket_start), RollupPeriod.DAY)
+    query = (
+        select(
+            _period(rollup, RollupPeriod.DAY),
+            bucket,
+            col(rollup.endpoint_id),
+            func.sum(col(rollup.samples)),
+            func.sum(col(rollup.available_samples)),
+        )
+        .where(
+            col(rollup.period) == RollupPeriod.HOUR,
+            col(rollup.bucket_start) >= start,
+            col(rollup.bucket_start) < end,
+        )
+        .group_by(bucket, col(rollup.endpoint_id))
+    )
+    return _upsert_from_select(rollup, _ENDPOINT_ROLLUP_COLUMNS, 3, query)
+
+
+async def _get_watermark(name: str) -> Optional[datetime.datetime]:
+    async with sessionmanager.session() as session:
+        watermark = await session.get(RetentionWatermarkDB, name)
+        return watermark.rolled_up_until if watermark else None
+
+
+async def _roll_up(
+    name: str,
+    first_timestamp: Select,
+    cutoff: datetime.datetime,
+    build_statement: Callable[[datetime.datetime, datetime.datetime], Any],
+    progress: Progress,
+) -> datetime.datetime:
+    """
+    Roll up everything between the watermark and `cutoff`, one day per transaction.
+
+    The watermark moves forward in the same transaction as the rollup, so an interrupted run
+    resumes where it stopped. Returns the new watermark, rows before it may be purged.
+    """
+    watermark = await _get_watermark(name)
+    if watermark is None:
+        async with sessionmanager.session() as session:
+            first = (await session.execute(first_timestamp)).scalar()
+        watermark = _floor(first, RollupPeriod.HOUR) if first is not None else cutoff
+
+    while watermark < cutoff:
+        end = min(_floor(watermark, RollupPeriod.DAY) + datetime.timedelta(days=1), cutoff)
+        async with sessionmanager.session() as session:
+            result = await session.execute(build_statement(watermark, end))
+            statement = mysql_insert(RetentionWatermarkDB).values(name=name, rolled_up_until=end)
+            await session.execute(
+                statement.on_duplicate_key_update(
+                    rolled_up_until=statement.inserted.rolled_up_until
+                )
+            )
+            await session.commit()
+        await progress(rolled_up=result.rowcount)
+        watermark = end
+
+    # Remember the starting point even when there was nothing to roll up
+    if await _get_watermark(name) is None:
+        async with sessionmanager.session() as session:
+            session.add(RetentionWatermarkDB(name=name, rolled_up_until=watermark))
+            await session.commit()
+    return watermark
+
+
+async def _purge(
+    model: type[SQLModel],
+    conditions: Sequence[ColumnElement[bool]],
+    progress: Progress,
+) -> int:
+    """
+    Delete the matching rows in small chunks, pausing in between to keep locks short.
+    """
+    deleted = 0
+    while True:
+        async with sessionmanager.session() as session:
+            result = await session.execute(
+                delete(model)
+                .where(*conditions)
+                .with_dialect_options(mysql_limit=config.retention.chunk_size)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        await progress(deleted=result.rowcount)
+        if result.rowcount < config.retention.chunk_size:
+            return deleted
+        await asyncio.sleep(config.retention.chunk_pause_seconds)
+
+
+async def _update_run(run_id: int, **values: Any) -> None:
+    async with sessionmanager.session() as session:
+        await session.execute(
+            update(RetentionRunDB).where(col(RetentionRunDB.id) == run_id).values(**values)
+        )
+        await session.commit()
+
+
+async def _execute(run_id: int) -> None:
+    policy = config.retention
+    _now = _utcnow()
+
+    async def step(name: str) -> Progress:
+        await _update_run(run_id, current_step=name)
+
+        async def progress(rolled_up: int = 0, deleted: int = 0) -> None:
+            if rolled_up or deleted:
+                await _update_run(
+                    run_id,
+                    rows_rolled_up=col(RetentionRunDB.rows_rolled_up) + rolled_up,
+                    rows_deleted=col(RetentionRunDB.rows_deleted) + deleted,
+                )
+
+        return progress
+
+    raw_cutoff = _floor(_now - datetime.timedelta(days=policy.raw_days), RollupPeriod.HOUR)
+    hourly_cutoff = _floor(
+        _now - datetime.timedelta(days=policy.hourly_rollup_days), RollupPeriod.DAY
+    )
+
+    for label, raw_model, rollup_model, from_raw, from_hourly in (
+        (
+            "model_performance",
+            AIModelPerformanceDB,
+            AIModelPerformanceRollupDB,
+            _model_rollup_from_raw,
+            _model_rollup_from_hourly,
+        ),
+        (
+            "endpoint_availability",
+            EndpointPerformanceDB,
+            EndpointAvailabilityRollupDB,
+            _endpoint_rollup_from_raw,
+            _endpoint_rollup_from_hourly,
+        ),
+    ):
+        # Raw rows -> hourly rollups
+        progress = await step(f"{label}: hourly rollup")
+        hourly_watermark = await _roll_up(
+            f"{label}_hourly",
+            select(func.min(col(raw_model.created_at))),  # type: ignore
+            raw_cutoff,
+            from_raw,
+            progress,
+        )
+        progress = await step(f"{label}: purge raw rows")
+        await _purge(
+            raw_model,
+            [col(raw_model.created_at) < hourly_watermark],  # type: ignore
+            progress,
+        )
+
+        # Hourly rollups -> daily rollups
+        progress = await step(f"{label}: daily rollup")
+        daily_watermark = await _roll_up(
+            f"{label}_daily",
+            select(func.min(col(rollup_model.bucket_start))).where(  # type: ignore
+                col(rollup_model.period) == RollupPeriod.HOUR  # type: ignore
+            ),
+            min(hourly_cutoff, _floor(hourly_watermark, RollupPeriod.DAY)),
+            from_hourly,
+            progress,
+        )
+        progress = await step(f"{label}: purge hourly rollups")
+        await _purge(
+            rollup_model,
+            [
+                col(rollup_model.period) == RollupPeriod.HOUR,  # type: ignore
+                col(rollup_model.bucket_start) < daily_watermark,  # type: ignore
+            ],
+            progress,
+        )
+
+        if policy.daily_rollup_days > 0:
+            progress = await step(f"{label}: purge daily rollups")
+            await _purge(
+                rollup_model,
+                [
+                    col(rollup_model.period) == RollupPeriod.DAY,  # type: ignore
+                    col(rollup_model.bucket_start)  # type: ignore
+                    < _now - datetime.timedelta(days=policy.daily_rollup_days),
+                ],
+                progress,
+            )
+
+    progress = await step("purge finished tasks")
+    await _purge(
+        EndpointTestTask,
+        [
+            col(EndpointTestTask.status).in_(_FINISHED_TASK_STATUSES),
+            col(EndpointTestTask.created_at) < _now - datetime.timedelta(days=policy.task_days),
+        ],
+        progress,
+    )
+
+    if policy.availability_days > 0:
+        progress = await step("purge availability bitmaps")
+        await _purge(
+            EndpointAvailabilityDayDB,
+            [
+                col(EndpointAvailabilityDayDB.day)
+                < _now.date() - datetime.timedelta(days=policy.availability_days)
+            ],
+            progress,
+        )
+
+    # Usage logs are rolled up by `roll_up_usage`, only the logs it has counted are purged
+    usage_watermark = await _get_watermark(USAGE_WATERMARK)
+    if policy.usage_log_days > 0 and usage_watermark is not None:
+        progress = await step("purge usage logs")
+        await _purge(
+            ApiKeyUsageLogDB,
+            [
+                col(ApiKeyUsageLogDB.timestamp)
+                < min(
+                    _now - datetime.timedelta(days=policy.usage_log_days),
+                    _floor(usage_watermark, RollupPeriod.HOUR),
+                )
+            ],
+            progress,
+        )
+
+    progress = await step("purge hourly usage rollups")
+    await _purge(
+        ApiKeyUsageRollupDB,
+        [
+            col(ApiKeyUsageRollupDB.period) == RollupPeriod.HOUR,
+            col(ApiKeyUsageRollupDB.bucket_start) < hourly_cutoff,
+        ],
+        progress,
+    )
+
+
+async def _create_run() -> int:
+    async with sessionmanager.session() as session:
+        run = RetentionRunDB()
+        session.add(run)
+        await session.commit()
+        await session.refresh(run)
+        return run.id  # type: ignore
+
+
+async def run_retention(run_id: Optional[int] = None) -> None:
+    """
+    Apply the retention policy: roll up old results, then purge what has been rolled up.
+
+    Skipped while another run, in this process or any other, holds the retention lock.
+    """
+    # The lock belongs to this connection and is released when it closes
+    connection = await sessionmanager.detached_connection()
+    try:
+        locked = await connection.scalar(text("SELECT GET_LOCK(:name, 0)"), {"name": _LOCK_NAME})
+        await connection.commit()
+        if not locked:
+            logger.info("Retention run already in progress, skipping")
+            if run_id is not None:
+                await _update_run(
+                    run_id,
+                    status=RetentionRunStatus.FAILED,
+                    error="Retention run already in progress",
+                    finished_at=_utcnow(),
+                )
+            return
+        try:
+            await _run_locked(run_id)
+        finally:
+            await connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _LOCK_NAME})
+    finally:
+        await connection.close()
+
+
+async def _run_locked(run_id: Optional[int]) -> None:
+    if run_id is None:
+        run_id = await _create_run()
+    logger.info(f"Starting retention run {run_id}")
+    try:
+        await _execute(run_id)
+    except Exception as e:
+        logger.error(f"Retention run {run_id} failed: {e}")
+        await _update_run(
+            run_id, status=RetentionRunStatus.FAILED, error=str(e), finished_at=_utcnow()
+        )
+        return
+    await _update_run(
+        run_id, status=RetentionRunStatus.DONE, current_step=None, finished_at=_utcnow()
+    )
+    logger.info(f"Retention run {run_id} finished")
+
+
+async def start_retention_run(
+    session: DBSessionDep,
+    background_task: BackgroundTasks,
+) -> RetentionRunDB:
+    """
+    Start a retention run in the background.
+    """
+    free = await session.scalar(text("SELECT IS_FREE_LOCK(:name)"), {"name": _LOCK_NAME})
+    if not free:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Retention run already in progress"
+        )
+
+    run = RetentionRunDB()
+    session.add(run)
+    await session.commit()
+    await session.refresh(run)
+    background_task.add_task(run_retention, run.id)
+    return run
+
+
+async def get_retention_runs(
+    session: DBSessionDep,
+    limit: int = 20,
+) -> List[RetentionRunDB]:
+    """
+    Get the most recent retention runs.
+    """
+    result = await session.execute(
+        select(RetentionRunDB).order_by(col(RetentionRunDB.started_at).desc()).limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def get_retention_policy() -> RetentionPolicyInfo:
+    """
+    Get the configured retention policy.
+    """
+    return RetentionPolicyInfo(**config.retention.model_dump())
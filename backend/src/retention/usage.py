@@ -0,0 +1,156 @@
+import asyncio
+import datetime
+from typing import Any
+
+from sqlalchemy import case, func, literal, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlmodel import col
+
+from src.apikey.models import ApiKeyUsageLogDB
+from src.database import sessionmanager
+from src.logging import get_logger
+from src.utils import now
+
+from .models import ApiKeyUsageRollupDB, RetentionWatermarkDB, RollupPeriod
+
+logger = get_logger(__name__)
+
+# Usage logs before this watermark are counted in the rollups
+USAGE_WATERMARK = "api_key_usage"
+
+_ROLLUP_COLUMNS = [
+    "period",
+    "bucket_start",
+    "api_key_id",
+    "model",
+    "requests",
+    "failed_requests",
+]
+# Usage logs are committed a moment after their timestamp, and only rolled up once this old
+_SETTLE_SECONDS = 60
+
+_run_lock = asyncio.Lock()
+
+
+def _utcnow() -> datetime.datetime:
+    # The database stores naive UTC datetimes
+    return now().replace(tzinfo=None)
+
+
+def _floor_hour(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def _floor_day(value: datetime.datetime) -> datetime.datetime:
+    return _floor_hour(value).replace(hour=0)
+
+
+def _period(period: RollupPeriod) -> Any:
+    # Bound with the column type so the enum is stored the same way as by the ORM
+    return literal(period, type_=ApiKeyUsageRollupDB.__table__.c.period.type)  # type: ignore
+
+
+def usage_model(column: Any) -> Any:
+    """
+    The model of a usage log as stored in the rollups.
+    """
+    return func.coalesce(column, "")
+
+
+def usage_failed(status_code: Any) -> Any:
+    """
+    1 for a failed request, 0 otherwise.
+    """
+    return case((status_code >= 400, 1), else_=0)
+
+
+def _upsert(query: Any) -> Any:
+    # Overwrites the counts of existing buckets, so that buckets can be recomputed
+    statement = mysql_insert(ApiKeyUsageRollupDB).from_select(_ROLLUP_COLUMNS, query)
+    return statement.on_duplicate_key_update(
+        {column: statement.inserted[column] for column in _ROLLUP_COLUMNS[4:]}
+    )
+
+
+def _hourly_from_logs(start: datetime.datetime, end: datetime.datetime) -> Any:
+    log = ApiKeyUsageLogDB
+    bucket = func.date_format(col(log.timestamp), "%Y-%m-%d %H:00:00").label("bucket")
+    model = usage_model(col(log.model)).label("rollup_model")
+    query = (
+        select(
+            _period(RollupPeriod.HOUR),
+            bucket,
+            col(log.api_key_id),
+            model,
+            func.count(),
+            func.sum(usage_failed(col(log.status_code))),
+        )
+        .where(col(log.timestamp) >= start, col(log.timestamp) < end)
+        .group_by(bucket, col(log.api_key_id), model)
+    )
+    return _upsert(query)
+
+
+def _daily_from_hourly(start: datetime.datetime, end: datetime.datetime) -> Any:
+    rollup = ApiKeyUsageRollupDB
+    bucket = func.date_format(col(rollup.bucket_start), "%Y-%m-%d 00:00:00").label("bucket")
+    query = (
+        select(
+            _period(RollupPeriod.DAY),
+            bucket,
+            col(rollup.api_key_id),
+            col(rollup.model),
+            func.sum(col(rollup.requests)),
+            func.sum(col(rollup.failed_requests)),
+        )
+        .where(
+            col(rollup.period) == RollupPeriod.HOUR,
+            col(rollup.bucket_start) >= start,
+            col(rollup.bucket_start) < end,
+        )
+        .group_by(bucket, col(rollup.api_key_id), col(rollup.model))
+    )
+    return _upsert(query)
+
+
+async def roll_up_usage() -> None:
+    """
+    Count the usage logs written since the last run into hourly and daily rollups, one day per
+    transaction.
+
+    The hours and days the watermark is in are recomputed as a whole, so runs are idempotent.
+    The rollups and the watermark move forward in the same transaction: at any time, the usage
+    is the rollups plus the logs from the watermark on.
+    """
+    if _run_lock.locked():
+        return
+
+    async with _run_lock:
+        cutoff = _utcnow() - datetime.timedelta(seconds=_SETTLE_SECONDS)
+        async with sessionmanager.session() as session:
+            watermark = await session.get(RetentionWatermarkDB, USAGE_WATERMARK)
+            if watermark is not None:
+                start = watermark.rolled_up_until
+            else:
+                first = await session.execute(select(func.min(col(ApiKeyUsageLogDB.timestamp))))
+                start = first.scalar() or cutoff
+
+        days = 0
+        while start < cutoff:
+            end = min(_floor_day(start) + datetime.timedelta(days=1), cutoff)
+            async with sessionmanager.session() as session:
+                await session.execute(_hourly_from_logs(_floor_hour(start), end))
+                await session.execute(_daily_from_hourly(_floor_day(start), end))
+                statement = mysql_insert(RetentionWatermarkDB).values(
+                    name=USAGE_WATERMARK, rolled_up_until=end
+                )
+                await session.execute(
+                    statement.on_duplicate_key_update(
+                        rolled_up_until=statement.inserted.rolled_up_until
+                    )
+                )
+                await session.commit()
+            days += 1
+            start = end
+        if days > 1:
+            logger.info(f"Rolled up {days} days of API key usage")
@@ -5,6 +5,7 @@ from .apikey import apikey_router
 from .endpoint import endpoint_router
 from .ollama import ollama_router
 from .plan import plan_router
+from .retention import retention_router
 from .setting import setting_router
 from .user import user_router
 
@@ -16,6 +17,7 @@ api_router.include_router(ai_model_router)
 api_router.include_router(apikey_router)
 api_router.include_router(plan_router)
 api_router.include_router(setting_router)
+api_router.include_router(retention_router)
 
 router = APIRouter()
 
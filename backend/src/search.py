@@ -0,0 +1,51 @@
+from typing import Any, Optional, Sequence
+
+from sqlalchemy import ColumnElement, and_, or_, true
+from sqlalchemy.dialects.mysql import match
+
+from .config import get_config
+
+config = get_config()
+
+
+def escape_like(term: str) -> str:
+    """
+    Escape the wildcards of a LIKE pattern.
+    """
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _split_terms(search: str) -> tuple[list[str], list[str]]:
+    # (terms an n-gram long, shorter terms), which cannot be found in the ngram index
+    terms = search.replace('"', "").split()
+    size = config.database.ngram_token_size
+    return [term for term in terms if len(term) >= size], [
+        term for term in terms if len(term) < size
+    ]
+
+
+def _boolean_query(terms: Sequence[str]) -> str:
+    # Every term is required and searched as a phrase, which the ngram parser matches as a
+    # substring
+    return " ".join(f'+"{term}"' for term in terms)
+
+
+def fulltext_search(
+    columns: Sequence[Any],
+    search: str,
+) -> tuple[ColumnElement[bool], Optional[ColumnElement]]:
+    """
+    Build a substring search over columns covered by one ngram FULLTEXT index.
+
+    Every term must be found in one of the columns. Returns the condition and its relevance to
+    rank by. Terms shorter than an n-gram are matched with `LIKE` on top of the index lookup,
+    and searches with no longer term have no relevance.
+    """
+    long_terms, short_terms = _split_terms(search)
+    conditions = [
+        or_(*(column.ilike(f"%{escape_like(term)}%") for column in columns)) for term in short_terms
+    ]
+    if not long_terms:
+        return and_(true(), *conditions), None
+    relevance = match(*columns, against=_boolean_query(long_terms)).in_boolean_mode()
+    return and_(relevance, *conditions), relevance
@@ -63,8 +63,10 @@ async def update_setting(
     if key == SystemSettingKey.UPDATE_ENDPOINT_TASK_INTERVAL_HOURS:
         from src.endpoint.scheduler import get_scheduler
 
+        # On other processes than the leader, the pacer picks the new interval up on its next tick
         scheduler = get_scheduler()
-        await scheduler.schedule_periodic_endpoint_updates()
+        if scheduler.is_running:
+            await scheduler.schedule_periodic_endpoint_updates()
     return setting
 
 
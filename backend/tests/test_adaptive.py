@@ -0,0 +1,83 @@
+import datetime
+
+import pytest
+
+from src.config import ScannerConfig
+from src.endpoint.adaptive import StabilityClass, classify_history, next_test_delay
+from src.endpoint.models import EndpointStatusEnum
+
+UP = EndpointStatusEnum.AVAILABLE
+DOWN = EndpointStatusEnum.UNAVAILABLE
+FAKE = EndpointStatusEnum.FAKE
+
+CONFIG = ScannerConfig(
+    history_window=10,
+    dead_after_failures=3,
+    dead_backoff_max_hours=24,
+    stable_interval_factor=3,
+    frequent_interval_factor=0.25,
+    flapping_min_changes=3,
+)
+BASE = datetime.timedelta(hours=1)
+
+
+@pytest.mark.parametrize(
+    ("statuses", "top_ranked", "expected"),
+    [
+        ([], False, StabilityClass.NEW),
+        ([], True, StabilityClass.NEW),
+        ([UP, DOWN, UP, DOWN], False, StabilityClass.FLAPPING),
+        ([UP, DOWN, UP, DOWN], True, StabilityClass.FLAPPING),
+        ([UP, UP, DOWN], True, StabilityClass.TOP_RANKED),
+        ([DOWN, UP], True, StabilityClass.NORMAL),
+        ([DOWN, DOWN, DOWN], False, StabilityClass.DEAD),
+        ([FAKE, DOWN, DOWN, UP], False, StabilityClass.DEAD),
+        ([DOWN, DOWN], False, StabilityClass.NORMAL),
+        ([UP] * 10, False, StabilityClass.STABLE),
+        ([UP] * 9, False, StabilityClass.NORMAL),
+        ([UP] * 9 + [DOWN], False, StabilityClass.NORMAL),
+    ],
+)
+def test_classify_history(statuses, top_ranked, expected):
+    assert classify_history(statuses, top_ranked, CONFIG) == expected
+
+
+def test_all_down_history_is_dead_not_stable():
+    assert classify_history([DOWN] * 10, False, CONFIG) == StabilityClass.DEAD
+
+
+@pytest.mark.parametrize(
+    ("failures", "delay"),
+    [
+        (3, BASE * 2),
+        (4, BASE * 4),
+        (5, BASE * 8),
+        (6, BASE * 16),
+        (7, datetime.timedelta(hours=24)),
+        (20, datetime.timedelta(hours=24)),
+    ],
+)
+def test_dead_endpoints_back_off_up_to_the_ceiling(failures, delay):
+    statuses = [DOWN] * failures + [UP]
+
+    assert next_test_delay(statuses, False, BASE, CONFIG) == delay
+
+
+def test_dead_backoff_never_goes_below_the_base_interval():
+    base = datetime.timedelta(hours=48)
+
+    assert next_test_delay([DOWN] * 3, False, base, CONFIG) == base
+
+
+@pytest.mark.parametrize(
+    ("statuses", "top_ranked", "delay"),
+    [
+        ([], False, BASE),
+        ([UP] * 10, False, BASE * 3),
+        ([UP, DOWN, UP, DOWN], False, BASE / 4),
+        ([UP], True, BASE / 4),
+        ([DOWN, UP], False, BASE),
+    ],
+)
+def test_next_test_delay(statuses, top_ranked, delay):
+    assert next_test_delay(statuses, top_ranked, BASE, CONFIG) == delay
@@ -0,0 +1,57 @@
+import datetime
+
+import pytest
+
+from src.config import AvailabilityConfig
+from src.endpoint.availability import _uptime, bitmap_size, slot_mask
+
+QUARTER_HOURS = AvailabilityConfig(slot_minutes=15)
+
+
+def at(hour: int, minute: int) -> datetime.datetime:
+    return datetime.datetime(2025, 1, 1, hour, minute, tzinfo=datetime.timezone.utc)
+
+
+@pytest.mark.parametrize(("slot_minutes", "size"), [(15, 12), (60, 3), (7, 26), (1440, 1)])
+def test_bitmap_size(slot_minutes: int, size: int):
+    assert bitmap_size(AvailabilityConfig(slot_minutes=slot_minutes)) == size
+
+
+@pytest.mark.parametrize(
+    ("time", "byte", "bit"),
+    [
+        (at(0, 0), 0, 0x80),
+        (at(0, 14), 0, 0x80),
+        (at(0, 15), 0, 0x40),
+        (at(1, 45), 0, 0x01),
+        (at(2, 0), 1, 0x80),
+        (at(23, 59), 11, 0x01),
+    ],
+)
+def test_slot_mask_sets_the_bit_of_the_slot(time: datetime.datetime, byte: int, bit: int):
+    mask = slot_mask(time, QUARTER_HOURS)
+
+    assert len(mask) == 12
+    assert mask[byte] == bit
+    assert sum(bin(b).count("1") for b in mask) == 1
+
+
+def test_slot_mask_with_a_partial_last_byte():
+    mask = slot_mask(at(23, 59), AvailabilityConfig(slot_minutes=7))
+
+    # Slot 205 of 206, the sixth bit of the last byte
+    assert len(mask) == 26
+    assert mask[25] == 0x04
+
+
+def test_masks_of_every_slot_fill_the_bitmap():
+    bitmap = 0
+    for minutes in range(0, 24 * 60, 15):
+        bitmap |= int.from_bytes(slot_mask(at(minutes // 60, minutes % 60), QUARTER_HOURS))
+
+    assert bitmap == (1 << 96) - 1
+
+
+@pytest.mark.parametrize(("tested", "available", "uptime"), [(0, 0, None), (4, 1, 0.25), (3, 3, 1)])
+def test_uptime(tested: int, available: int, uptime):
+    assert _uptime(tested, available) == uptime
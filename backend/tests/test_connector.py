@@ -0,0 +1,72 @@
+import asyncio
+
+from aiohttp import web
+
+from src.config import ScannerConfig
+from src.ollama.connector import ScanConnector
+
+
+async def fetch_twice(scan: ScanConnector, keep_alive: bool = True) -> None:
+    async def version(request: web.Request) -> web.Response:
+        headers = {} if keep_alive else {"Connection": "close"}
+        return web.json_response({"version": "0.1.0"}, headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/api/version", version)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "localhost", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        for _ in range(2):
+            async with scan.client(f"http://localhost:{port}").connect() as client:
+                assert await client._request_raw("GET", "/api/version") == b'{"version": "0.1.0"}'
+    finally:
+        await scan.close()
+        await runner.cleanup()
+
+
+def test_clients_share_connections():
+    scan = ScanConnector(ScannerConfig())
+
+    asyncio.run(fetch_twice(scan))
+
+    stats = scan.stats
+    assert stats.requests == 2
+    assert stats.connections_created == 1
+    assert stats.connections_reused == 1
+
+
+def test_new_connections_use_cached_dns_results():
+    scan = ScanConnector(ScannerConfig())
+
+    asyncio.run(fetch_twice(scan, keep_alive=False))
+
+    stats = scan.stats
+    assert stats.connections_created == 2
+    assert stats.dns_cache_misses == 1
+    assert stats.dns_cache_hits == 1
+
+
+def test_connector_follows_the_config():
+    async def connector_settings() -> tuple[int, int, bool]:
+        scan = ScanConnector(ScannerConfig(connector_limit=20, connector_limit_per_host=2))
+        connector = scan.connector
+        assert scan.connector is connector
+        settings = (connector.limit, connector.limit_per_host, connector.use_dns_cache)
+        await scan.close()
+        return settings
+
+    assert asyncio.run(connector_settings()) == (20, 2, True)
+
+
+def test_clients_verify_certificates_by_default():
+    async def verify_ssl(config: ScannerConfig) -> bool:
+        scan = ScanConnector(config)
+        verify = scan.client("https://example.com").verify_ssl
+        await scan.close()
+        return verify
+
+    assert asyncio.run(verify_ssl(ScannerConfig()))
+    assert not asyncio.run(verify_ssl(ScannerConfig(verify_ssl=False)))
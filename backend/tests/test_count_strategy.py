@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+from sqlmodel import col
+
+from src.database import Explain
+from src.endpoint.models import EndpointDB
+from src.pagination import CountStrategy, _count_cache, count_items
+
+
+class FakeResult:
+    def __init__(self, plan: Optional[list[dict]] = None, count: int = 0):
+        self.plan = plan
+        self.count = count
+
+    def mappings(self) -> "FakeResult":
+        return self
+
+    def all(self) -> Optional[list[dict]]:
+        return self.plan
+
+    def scalar_one(self) -> int:
+        return self.count
+
+
+class FakeSession:
+    """Answers EXPLAINs with a plan and counts with a number"""
+
+    def __init__(self, plan: Optional[list[dict]] = None, count: int = 0):
+        self.plan = plan or []
+        self.count = count
+        self.statements: list[Any] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        self.statements.append(statement)
+        if isinstance(statement, Explain):
+            return FakeResult(plan=self.plan)
+        return FakeResult(count=self.count)
+
+    def get_bind(self) -> Any:
+        return SimpleNamespace(dialect=mysql.dialect())
+
+    @property
+    def counts(self) -> int:
+        return sum(not isinstance(statement, Explain) for statement in self.statements)
+
+
+@pytest.fixture(autouse=True)
+def empty_count_cache():
+    _count_cache.clear()
+    yield
+    _count_cache.clear()
+
+
+def plan_row(rows: Optional[int], filtered: float = 100, type: str = "ref", id: int = 1) -> dict:
+    return {"id": id, "type": type, "rows": rows, "filtered": filtered}
+
+
+def count(session: FakeSession, strategy: CountStrategy, name: str = "a"):
+    query = select(EndpointDB).where(col(EndpointDB.name) == name)
+    return asyncio.run(count_items(session, query, strategy))  # type: ignore[arg-type]
+
+
+def test_exact_counts_every_time():
+    session = FakeSession(count=42)
+
+    assert count(session, CountStrategy.EXACT) == (42, CountStrategy.EXACT)
+    assert count(session, CountStrategy.EXACT) == (42, CountStrategy.EXACT)
+    assert session.counts == 2
+
+
+def test_cached_counts_once_per_query():
+    session = FakeSession(count=42)
+
+    assert count(session, CountStrategy.CACHED) == (42, CountStrategy.CACHED)
+    session.count = 43
+    assert count(session, CountStrategy.CACHED) == (42, CountStrategy.CACHED)
+    assert count(session, CountStrategy.CACHED, name="b") == (43, CountStrategy.CACHED)
+    assert session.counts == 2
+
+
+def test_estimated_uses_the_plan_of_the_outer_query():
+    session = FakeSession(
+        plan=[plan_row(1000, filtered=10), plan_row(3), plan_row(50, id=2)], count=42
+    )
+
+    assert count(session, CountStrategy.ESTIMATED) == (300, CountStrategy.ESTIMATED)
+    assert session.counts == 0
+
+
+@pytest.mark.parametrize(
+    "plan",
+    [[], [plan_row(1, type="fulltext")], [plan_row(None)]],
+    ids=["no plan", "full-text search", "no row estimate"],
+)
+def test_estimated_falls_back_to_cached(plan: list[dict]):
+    session = FakeSession(plan=plan, count=42)
+
+    assert count(session, CountStrategy.ESTIMATED) == (42, CountStrategy.CACHED)
+    assert count(session, CountStrategy.ESTIMATED) == (42, CountStrategy.CACHED)
+    assert session.counts == 1
@@ -0,0 +1,80 @@
+import asyncio
+import contextlib
+from typing import Any, Sequence
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from src.endpoint import deletion, service
+
+
+class FakeResult:
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[int]:
+        return [5]
+
+
+class FakeSession:
+    async def execute(self, statement: Any) -> FakeResult:
+        return FakeResult()
+
+
+def lock_error(code: int) -> OperationalError:
+    return OperationalError("DELETE FROM endpoint", {}, Exception(code, "Lock error"))
+
+
+@pytest.fixture
+def final_attempts(monkeypatch) -> list[Exception]:
+    """Errors raised by the next final transactions, which then succeed"""
+    errors: list[Exception] = []
+
+    @contextlib.asynccontextmanager
+    async def session():
+        yield FakeSession()
+
+    async def delete_child_rows(model: Any, endpoint_ids: Sequence[int]) -> int:
+        return 1
+
+    async def delete_endpoints(endpoint_ids: Sequence[int]) -> tuple[int, int]:
+        if errors:
+            raise errors.pop(0)
+        return 2, len(endpoint_ids)
+
+    async def reconcile_endpoint_counts(model_ids: Sequence[int]) -> None:
+        pass
+
+    monkeypatch.setattr(deletion.sessionmanager, "session", session)
+    monkeypatch.setattr(deletion, "_delete_child_rows", delete_child_rows)
+    monkeypatch.setattr(deletion, "_delete_endpoints", delete_endpoints)
+    monkeypatch.setattr(deletion, "reconcile_endpoint_counts", reconcile_endpoint_counts)
+    monkeypatch.setattr(service, "forget_endpoints", lambda endpoint_ids: None)
+    monkeypatch.setattr(deletion.config.bulk_delete, "chunk_pause_seconds", 0)
+    return errors
+
+
+def test_delete_endpoint_rows_retries_a_deadlock(final_attempts):
+    final_attempts.extend([lock_error(1213), lock_error(1205)])
+
+    deleted = asyncio.run(deletion.delete_endpoint_rows([1, 2]))
+
+    child_rows = len(deletion._CHILD_MODELS)
+    assert deleted == (2, child_rows + 2 + 2)
+    assert final_attempts == []
+
+
+def test_delete_endpoint_rows_gives_up_after_the_last_attempt(final_attempts):
+    final_attempts.extend([lock_error(1213)] * deletion._FINAL_ATTEMPTS)
+
+    with pytest.raises(OperationalError):
+        asyncio.run(deletion.delete_endpoint_rows([1, 2]))
+
+
+def test_delete_endpoint_rows_does_not_retry_other_errors(final_attempts):
+    final_attempts.extend([lock_error(1146), lock_error(1213)])
+
+    with pytest.raises(OperationalError):
+        asyncio.run(deletion.delete_endpoint_rows([1, 2]))
+
+    assert len(final_attempts) == 1
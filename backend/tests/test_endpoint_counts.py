@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.ai_model import service as ai_model_service
+from src.ai_model.models import AIModelDB, AIModelPerformanceDB, AIModelStatusEnum
+from src.endpoint import service
+from src.ollama.performance_test import EndpointTestResult, ModelPerformance
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def tuples(self) -> "FakeResult":
+        return self
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list:
+        return self.rows
+
+
+class FakeSession:
+    """Answers the statements whose SQL starts with a key of `answers` with its rows"""
+
+    def __init__(self, answers: dict[str, list]):
+        self.answers = answers
+        self.statements: list[str] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        compiled = sql(statement)
+        self.statements.append(compiled)
+        for prefix, rows in self.answers.items():
+            if compiled.startswith(prefix):
+                return FakeResult(rows)
+        return FakeResult([])
+
+    async def commit(self) -> None:
+        pass
+
+    def starting_with(self, prefix: str) -> list[str]:
+        return [statement for statement in self.statements if statement.startswith(prefix)]
+
+
+def test_counts_are_changed_in_one_statement():
+    session = FakeSession({})
+
+    asyncio.run(
+        ai_model_service.update_endpoint_counts(session, {1: (1, 1), 2: (0, -1), 3: (0, 0)})
+    )
+
+    (statement,) = session.statements
+    assert statement == (
+        "UPDATE ai_model SET "
+        "total_endpoint_count=(ai_model.total_endpoint_count + "
+        "CASE ai_model.id WHEN 1 THEN 1 WHEN 2 THEN 0 ELSE 0 END), "
+        "available_endpoint_count=(ai_model.available_endpoint_count + "
+        "CASE ai_model.id WHEN 1 THEN 1 WHEN 2 THEN -1 ELSE 0 END) "
+        "WHERE ai_model.id IN (1, 2)"
+    )
+
+
+def test_no_statement_without_changes():
+    session = FakeSession({})
+
+    asyncio.run(ai_model_service.update_endpoint_counts(session, {1: (0, 0)}))
+
+    assert session.statements == []
+
+
+def model_performance(name: str, status: AIModelStatusEnum) -> ModelPerformance:
+    return ModelPerformance(
+        ai_model=AIModelDB(name=name, tag="latest"),
+        performance=AIModelPerformanceDB(status=status, token_per_second=10, connection_time=1),
+    )
+
+
+def test_scan_results_count_the_status_changes_of_links(monkeypatch):
+    monkeypatch.setattr(service.config.scanner, "suppress_unchanged_results", False)
+    deltas: list[dict[int, tuple[int, int]]] = []
+
+    async def update_endpoint_counts(session: Any, changes: dict) -> None:
+        deltas.append(changes)
+
+    monkeypatch.setattr(service, "update_endpoint_counts", update_endpoint_counts)
+    names = ["new", "still", "down"]
+    session = FakeSession(
+        {
+            "SELECT ai_model.id, ai_model.name, ai_model.tag": [
+                (i, name, "latest") for i, name in enumerate(names, 1)
+            ],
+            "SELECT endpoint_ai_model.ai_model_id, endpoint_ai_model.status": [
+                (2, AIModelStatusEnum.AVAILABLE),
+                (3, AIModelStatusEnum.AVAILABLE),
+                (4, AIModelStatusEnum.AVAILABLE),
+                (5, AIModelStatusEnum.UNAVAILABLE),
+            ],
+        }
+    )
+    results = EndpointTestResult(
+        model_performances=[
+            model_performance("new", AIModelStatusEnum.AVAILABLE),
+            model_performance("still", AIModelStatusEnum.AVAILABLE),
+            model_performance("down", AIModelStatusEnum.UNAVAILABLE),
+        ]
+    )
+
+    asyncio.run(service.process_models_test_results(session, 7, results))
+
+    # Model 4 went missing while available, model 5 was not counted as available
+    assert deltas == [{1: (1, 1), 2: (0, 0), 3: (0, -1), 4: (0, -1)}]
+    (lock,) = session.starting_with("SELECT endpoint_ai_model.ai_model_id")
+    assert lock.endswith("FOR UPDATE")
+
+
+@pytest.fixture
+def reconcile_session(monkeypatch) -> FakeSession:
+    session = FakeSession({"SELECT ai_model.id": [1, 2], "UPDATE ai_model": [SimpleNamespace()]})
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+        # The next chunk of IDs is empty
+        session.answers["SELECT ai_model.id"] = []
+
+    monkeypatch.setattr(ai_model_service.sessionmanager, "session", session_context)
+    monkeypatch.setattr(ai_model_service.config.ai_model, "count_reconcile_chunk_size", 2)
+    return session
+
+
+def test_reconcile_only_writes_drifted_counts(reconcile_session):
+    fixed = asyncio.run(ai_model_service.reconcile_endpoint_counts([1, 2, 3]))
+
+    assert fixed == 2
+    first, second = reconcile_session.starting_with("UPDATE ai_model")
+    assert "ai_model.id IN (1, 2)" in first
+    assert "ai_model.id IN (3)" in second
+    assert "ai_model.total_endpoint_count != (SELECT count(*)" in first
+
+
+def test_reconcile_walks_all_models_by_id(reconcile_session):
+    asyncio.run(ai_model_service.reconcile_endpoint_counts())
+
+    first, second = reconcile_session.starting_with("SELECT ai_model.id")
+    assert "WHERE ai_model.id > 0" in first
+    assert "WHERE ai_model.id > 2" in second
+    (update,) = reconcile_session.starting_with("UPDATE ai_model")
+    assert "ai_model.id IN (1, 2)" in update
@@ -0,0 +1,79 @@
+import asyncio
+import datetime
+from typing import Any
+
+from sqlalchemy.dialects import mysql
+
+from src.endpoint import service
+from src.endpoint.models import EndpointDB, EndpointPerformanceDB, EndpointStatusEnum, TaskStatus
+from src.endpoint.schemas import EndpointFilterParams, EndpointSortField
+from src.schema import SortOrder
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_the_list_is_read_with_one_statement():
+    query, _ = service._endpoints_with_ai_model_counts_query()
+
+    statement = sql(query)
+    # Counts and the task status are correlated subqueries of the page
+    assert statement.count("WHERE endpoint_ai_model.endpoint_id = endpoint.id") == 2
+    assert (
+        "WHERE endpoint_test_task.endpoint_id = endpoint.id "
+        "ORDER BY endpoint_test_task.scheduled_at DESC \n LIMIT 1"
+    ) in statement
+    # Only the latest performance is joined
+    assert "LEFT OUTER JOIN endpoint_performance AS endpoint_performance_1 ON " in statement
+    assert "SELECT max(endpoint_performance.id)" in statement
+
+
+def test_rows_become_endpoints_with_their_counts():
+    _, to_items = service._endpoints_with_ai_model_counts_query()
+    created_at = datetime.datetime(2026, 1, 1)
+    endpoint = EndpointDB(
+        id=1, url="http://a:11434", name="a", created_at=created_at, status="available"
+    )
+    performance = EndpointPerformanceDB(
+        id=5, endpoint_id=1, status=EndpointStatusEnum.AVAILABLE, created_at=created_at
+    )
+
+    with_performance, without_performance = to_items(
+        [(endpoint, performance, 3, 2, TaskStatus.DONE), (endpoint, None, 0, 0, None)]
+    )
+
+    assert with_performance.total_ai_model_count == 3
+    assert with_performance.avaliable_ai_model_count == 2
+    assert with_performance.task_status == TaskStatus.DONE
+    assert [item.id for item in with_performance.recent_performances] == [5]
+    assert without_performance.recent_performances == []
+    assert without_performance.task_status is None
+
+
+def test_the_page_total_is_counted_without_ordering(monkeypatch):
+    statements: dict[str, str] = {}
+
+    async def paginate(session: Any, query: Any, params: Any, strategy: Any, **kwargs: Any):
+        statements["page"] = sql(query)
+        statements["count"] = sql(kwargs["count_query"])
+
+    monkeypatch.setattr(service, "paginate", paginate)
+    params = EndpointFilterParams(
+        status=EndpointStatusEnum.AVAILABLE, order_by=EndpointSortField.NAME, order=SortOrder.DESC
+    )
+
+    asyncio.run(service.get_endpoints_with_ai_model_counts(None, params))  # type: ignore[arg-type]
+
+    assert statements["page"].endswith("ORDER BY endpoint.name DESC")
+    assert statements["count"] == (
+        "SELECT count(endpoint.id) AS count_1 \nFROM endpoint \n"
+        "WHERE endpoint.status = 'AVAILABLE'"
+    )
+
+
+def test_latest_task_query():
+    assert sql(service._latest_task_query(7)).endswith(
+        "FROM endpoint_test_task \nWHERE endpoint_test_task.endpoint_id = 7 "
+        "ORDER BY endpoint_test_task.scheduled_at DESC \n LIMIT 1"
+    )
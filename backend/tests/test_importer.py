@@ -0,0 +1,158 @@
+import asyncio
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.endpoint.importer import _PARSERS, MAX_COLUMN_LENGTH, normalize_url, upsert_endpoint_urls
+from src.endpoint.schemas import EndpointImportFormat
+
+
+@pytest.mark.parametrize(
+    ("raw", "url"),
+    [
+        ("http://example.com:11434", "http://example.com:11434"),
+        ("  1.2.3.4:11434  ", "http://1.2.3.4:11434"),
+        ("HTTPS://Example.COM/", "https://example.com"),
+        ("http://example.com/ollama/?key=1#top", "http://example.com/ollama"),
+        ("http://[::1]:11434", "http://[::1]:11434"),
+        ("", None),
+        ("   ", None),
+        ("ftp://example.com", None),
+        ("http://", None),
+        ("http://example.com:99999", None),
+        ("http://example.com:port", None),
+        ("http://example.com:0", None),
+        ("http://not a host", None),
+        ("http://example.com/" + "a" * (MAX_COLUMN_LENGTH - 18), None),
+    ],
+)
+def test_normalize_url(raw: str, url: Optional[str]):
+    assert normalize_url(raw) == url
+
+
+def test_normalize_url_keeps_urls_that_fit_the_column():
+    url = "http://example.com/" + "a" * (MAX_COLUMN_LENGTH - 19)
+
+    assert normalize_url(url) == url
+
+
+def parse(import_format: EndpointImportFormat, text: str):
+    return list(_PARSERS[import_format](text.splitlines()))
+
+
+def test_parse_text():
+    text = "# exported endpoints\n\n1.2.3.4:11434\nnot a url\nhttp://example.com/\n"
+
+    assert parse(EndpointImportFormat.TEXT, text) == [
+        ("http://1.2.3.4:11434", None),
+        (None, None),
+        ("http://example.com", None),
+    ]
+
+
+def test_parse_csv_with_header():
+    text = "name,url\nfirst,1.2.3.4:11434\n,http://example.com\n\nshort\n"
+
+    assert parse(EndpointImportFormat.CSV, text) == [
+        ("http://1.2.3.4:11434", "first"),
+        ("http://example.com", None),
+        (None, None),
+    ]
+
+
+def test_parse_csv_without_header():
+    text = "1.2.3.4:11434,first\nhttp://example.com\n"
+
+    assert parse(EndpointImportFormat.CSV, text) == [
+        ("http://1.2.3.4:11434", None),
+        ("http://example.com", None),
+    ]
+
+
+def test_parse_ndjson():
+    text = "\n".join(
+        [
+            '"1.2.3.4:11434"',
+            '{"url": "http://example.com", "name": "example"}',
+            '{"url": "http://example.org", "name": ""}',
+            '{"name": "no url"}',
+            "[1, 2]",
+            "{not json",
+            "",
+        ]
+    )
+
+    assert parse(EndpointImportFormat.NDJSON, text) == [
+        ("http://1.2.3.4:11434", None),
+        ("http://example.com", "example"),
+        ("http://example.org", None),
+        (None, None),
+        (None, None),
+        (None, None),
+    ]
+
+
+def test_every_format_has_a_parser():
+    assert set(_PARSERS) == set(EndpointImportFormat)
+
+
+class FakeResult:
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+
+    def tuples(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[tuple]:
+        return self.rows
+
+
+class FakeSession:
+    """Answers the statements of upsert_endpoint_urls with the given rows, in order"""
+
+    def __init__(self, *results: list[tuple]):
+        self.results = list(results)
+        self.statements: list[Any] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult(self.results.pop(0))
+
+
+def compile(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect()))
+
+
+def test_upsert_counts_only_rows_it_inserted():
+    a, b, c = "http://a.com", "http://b.com", "http://c.com"
+    session = FakeSession(
+        # Lookup: a exists
+        [(a, 1)],
+        # Insert
+        [],
+        # Snapshot read after the insert: only b was inserted here
+        [(b, 2)],
+        # Locking read: c was inserted concurrently
+        [(c, 3)],
+    )
+
+    new_ids, existing_ids = asyncio.run(upsert_endpoint_urls(session, dict.fromkeys([a, b, c])))
+
+    assert new_ids == [2]
+    assert sorted(existing_ids) == [1, 3]
+    insert, locking_read = compile(session.statements[1]), compile(session.statements[3])
+    assert "IGNORE" not in insert
+    assert "ON DUPLICATE KEY UPDATE id = endpoint.id" in insert
+    assert locking_read.endswith("LOCK IN SHARE MODE")
+
+
+def test_upsert_cuts_names_to_the_column_length():
+    url = "http://a.com"
+    session = FakeSession([], [], [(url, 1)])
+
+    asyncio.run(upsert_endpoint_urls(session, {url: "n" * (MAX_COLUMN_LENGTH + 10)}))
+
+    params = session.statements[1].compile(dialect=mysql.dialect()).params
+    names = [value for key, value in params.items() if key.startswith("name")]
+    assert names == ["n" * MAX_COLUMN_LENGTH]
@@ -0,0 +1,78 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+from sqlmodel import col
+
+from src.endpoint.models import EndpointDB
+from src.pagination import KeysetParams, _after, _decode_value, _encode_value, keyset_paginate
+
+
+def sql(clause) -> str:
+    return str(clause.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        datetime.datetime(2025, 1, 2, 3, 4, 5, 678),
+        datetime.datetime(2025, 1, 2, tzinfo=datetime.timezone.utc),
+        42,
+        "name",
+        None,
+    ],
+)
+def test_cursor_values_round_trip_through_json(value):
+    assert _decode_value(json.loads(json.dumps(_encode_value(value)))) == value
+
+
+def test_is_null_keys_are_encoded_as_numbers():
+    assert _encode_value(True) == 1
+    assert _encode_value(False) == 0
+
+
+def test_after_single_key():
+    assert sql(_after([col(EndpointDB.id)], [7], descending=False)) == "endpoint.id > 7"
+    assert sql(_after([col(EndpointDB.id)], [7], descending=True)) == "endpoint.id < 7"
+
+
+def test_after_expands_the_row_comparison():
+    keys = [col(EndpointDB.name), col(EndpointDB.id)]
+
+    assert sql(_after(keys, ["b", 7], descending=False)) == (
+        "endpoint.name > 'b' OR endpoint.name = 'b' AND endpoint.id > 7"
+    )
+
+
+def test_after_skips_null_values():
+    keys = [
+        col(EndpointDB.next_test_at).is_(None),
+        col(EndpointDB.next_test_at),
+        col(EndpointDB.id),
+    ]
+
+    # Past the NULLs, only the IDs of the other NULLs follow
+    assert sql(_after(keys, [1, None, 7], descending=False)) == (
+        "(endpoint.next_test_at IS NULL) > 1 OR (endpoint.next_test_at IS NULL) = 1 "
+        "AND endpoint.next_test_at IS NULL AND endpoint.id > 7"
+    )
+
+
+def test_after_without_values_matches_nothing():
+    assert sql(_after([col(EndpointDB.id)], [None], descending=False)).startswith("false")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    ["not json", json.dumps({"b": False}), json.dumps({"k": 7}), json.dumps({"k": [1, 2]})],
+)
+def test_invalid_cursors_are_rejected(cursor: str):
+    params = KeysetParams(cursor=cursor, size=10)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(keyset_paginate(None, select(EndpointDB), params, [col(EndpointDB.id)]))
+    assert error.value.status_code == 400
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from src import leader
+from src.config import LeaderConfig
+from src.leader import LeaderElector
+
+
+class FakeResult:
+    def __init__(self, value: Any):
+        self.value = value
+
+    def scalar(self) -> Any:
+        return self.value
+
+
+class FakeConnection:
+    """Answers the lock queries with the given results, in order"""
+
+    def __init__(self, *results: Any):
+        self.results = list(results)
+        self.queries: list[str] = []
+        self.invalidated = False
+
+    async def execute(self, statement: Any, parameters: dict) -> FakeResult:
+        self.queries.append(str(statement))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return FakeResult(result)
+
+    async def commit(self) -> None:
+        pass
+
+    async def invalidate(self) -> None:
+        self.invalidated = True
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def changes() -> list[str]:
+    # The leadership changes of the elector
+    return []
+
+
+def check(monkeypatch, elector: LeaderElector, *connections: FakeConnection, times: int) -> None:
+    pool = list(connections)
+
+    async def detached_connection() -> FakeConnection:
+        return pool.pop(0)
+
+    monkeypatch.setattr(leader.sessionmanager, "detached_connection", detached_connection)
+
+    async def run() -> None:
+        for _ in range(times):
+            await elector._check()
+
+    asyncio.run(run())
+
+
+def callbacks(changes: list[str]) -> tuple[Any, Any]:
+    async def on_elected() -> None:
+        changes.append("elected")
+
+    async def on_demoted() -> None:
+        changes.append("demoted")
+
+    return on_elected, on_demoted
+
+
+def make_elector(changes: list[str]) -> LeaderElector:
+    elector = LeaderElector(LeaderConfig(enabled=True))
+    elector._on_elected, elector._on_demoted = callbacks(changes)
+    return elector
+
+
+def test_takes_the_lock_then_checks_it_is_still_held(monkeypatch, changes):
+    elector = make_elector(changes)
+    connection = FakeConnection(1, 1)
+
+    check(monkeypatch, elector, connection, times=2)
+
+    assert elector.is_leader
+    assert changes == ["elected"]
+    assert connection.queries == [
+        "SELECT GET_LOCK(:name, 0)",
+        "SELECT IS_USED_LOCK(:name) = CONNECTION_ID()",
+    ]
+
+
+def test_stays_a_follower_while_another_process_leads(monkeypatch, changes):
+    elector = make_elector(changes)
+
+    check(monkeypatch, elector, FakeConnection(0, 0), times=2)
+
+    assert not elector.is_leader
+    assert changes == []
+
+
+def test_steps_down_and_drops_the_connection_when_it_fails(monkeypatch, changes):
+    elector = make_elector(changes)
+    broken = FakeConnection(1, ConnectionError("gone"))
+    fresh = FakeConnection(1)
+
+    check(monkeypatch, elector, broken, fresh, times=3)
+
+    assert broken.invalidated
+    # Campaigns again on a new connection
+    assert fresh.queries == ["SELECT GET_LOCK(:name, 0)"]
+    assert changes == ["elected", "demoted", "elected"]
+
+
+def test_always_leads_without_election(changes):
+    elector = LeaderElector(LeaderConfig(enabled=False))
+
+    asyncio.run(elector.start(*callbacks(changes)))
+
+    assert elector.is_leader
+    assert changes == ["elected"]
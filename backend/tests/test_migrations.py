@@ -0,0 +1,255 @@
+import asyncio
+import datetime
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src import migrations
+from src.ai_model.utils import decompress_output
+from src.endpoint.models import EndpointTestTask
+
+
+class FakeResult:
+    def __init__(self, rows: Any):
+        self.rows = rows
+
+    def tuples(self) -> "FakeResult":
+        return self
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> Any:
+        return self.rows
+
+    def scalar_one(self) -> Any:
+        return self.rows
+
+
+class FakeConnection:
+    """Answers the statements with the given results, in order, and records them as SQL"""
+
+    dialect = mysql.dialect()
+
+    def __init__(self, *results: Any):
+        self.results = list(results)
+        self.statements: list[str] = []
+        self.parameters: list[Any] = []
+        self.commits = 0
+
+    async def execute(self, statement: Any, parameters: Any = None) -> FakeResult:
+        compiled = statement.compile(dialect=self.dialect)
+        self.statements.append(str(compiled))
+        self.parameters.append(parameters if parameters is not None else compiled.params)
+        return FakeResult(self.results.pop(0) if self.results else [])
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def test_move_performance_outputs_skips_a_dropped_column():
+    connection = FakeConnection(["id", "status"])
+
+    asyncio.run(migrations._move_performance_outputs(connection))
+
+    assert len(connection.statements) == 1
+
+
+def test_move_performance_outputs_copies_the_latest_output_and_drops_the_column(monkeypatch):
+    monkeypatch.setattr(migrations, "_CHUNK_SIZE", 2)
+    monkeypatch.setattr(migrations.config.scanner, "output_max_chars", 3)
+    created_at = datetime.datetime(2026, 1, 1)
+    connection = FakeConnection(
+        # Columns
+        ["id", "output"],
+        # First chunk of links, the latest output of each
+        [(1, 2), (1, 3)],
+        [(1, 2, created_at, "hello")],
+        # Insert, then no more links
+        [],
+        [],
+        # Highest performance ID
+        3,
+    )
+
+    asyncio.run(migrations._move_performance_outputs(connection))
+
+    insert = connection.statements[3]
+    assert insert.startswith("INSERT INTO endpoint_ai_model_output")
+    assert "ON DUPLICATE KEY UPDATE endpoint_id = endpoint_ai_model_output.endpoint_id" in insert
+    params = connection.parameters[3]
+    assert decompress_output(params["data_m0"]) == "hel"
+    assert params["original_length_m0"] == 5
+    assert params["truncated_m0"] is True
+    assert params["created_at_m0"] == created_at
+
+    # The next chunk of links starts after the last one
+    assert "> (%s, %s)" in connection.statements[4]
+    # The column is emptied in chunks of IDs, then dropped
+    assert connection.parameters[6:8] == [
+        {"start": 0, "end": 2},
+        {"start": 2, "end": 4},
+    ]
+    assert connection.statements[-1] == "ALTER TABLE ai_model_performance DROP COLUMN output"
+
+
+class RunnerConnection(FakeConnection):
+    """Holds the migration lock and has the given versions applied already"""
+
+    def __init__(self, applied: list[int], locked: int = 1):
+        # SET SESSION, then the applied versions
+        super().__init__([], applied)
+        self.locked = locked
+        self.closed = False
+
+    async def scalar(self, statement: Any, parameters: Any = None) -> int:
+        self.statements.append(str(statement))
+        return self.locked
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def run_migrations(monkeypatch, connection: RunnerConnection) -> list[int]:
+    upgraded: list[int] = []
+
+    def upgrade(version: int):
+        async def upgrade(connection: Any) -> None:
+            upgraded.append(version)
+
+        return upgrade
+
+    async def detached_connection() -> RunnerConnection:
+        return connection
+
+    monkeypatch.setattr(
+        migrations,
+        "MIGRATIONS",
+        [migrations.Migration(version, "", upgrade(version)) for version in (1, 2, 3)],
+    )
+    monkeypatch.setattr(migrations.sessionmanager, "detached_connection", detached_connection)
+    asyncio.run(migrations.run_migrations())
+    return upgraded
+
+
+def test_run_migrations_applies_only_the_missing_versions(monkeypatch):
+    connection = RunnerConnection(applied=[1, 3])
+
+    assert run_migrations(monkeypatch, connection) == [2]
+
+    recorded = [
+        parameters for parameters in connection.parameters if "version" in (parameters or {})
+    ]
+    assert [parameters["version"] for parameters in recorded] == [2]
+    assert connection.statements[-1] == "SELECT RELEASE_LOCK(%s)"
+    assert connection.closed
+
+
+def test_run_migrations_does_nothing_once_applied(monkeypatch):
+    connection = RunnerConnection(applied=[1, 2, 3])
+
+    assert run_migrations(monkeypatch, connection) == []
+
+
+def test_run_migrations_fails_without_the_lock(monkeypatch):
+    connection = RunnerConnection(applied=[], locked=0)
+
+    with pytest.raises(RuntimeError):
+        run_migrations(monkeypatch, connection)
+
+    assert connection.closed
+
+
+def test_add_column_skips_existing_columns():
+    connection = FakeConnection(["id", "attempts"])
+
+    asyncio.run(migrations.add_column(connection, EndpointTestTask, "attempts", "0"))
+
+    assert len(connection.statements) == 1
+
+
+def test_add_column_gives_existing_rows_the_default():
+    connection = FakeConnection(["id"])
+
+    asyncio.run(migrations.add_column(connection, EndpointTestTask, "attempts", "0"))
+
+    assert connection.statements[-1] == (
+        "ALTER TABLE endpoint_test_task ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+    )
+
+
+def test_migration_versions_are_in_order():
+    versions = [migration.version for migration in migrations.MIGRATIONS]
+
+    assert versions == list(range(1, len(versions) + 1))
+
+
+def test_add_endpoint_next_test_at_adds_the_column_and_its_index():
+    connection = FakeConnection(["id", "name"])
+
+    asyncio.run(migrations._add_endpoint_next_test_at(connection))
+
+    assert connection.statements[1] == "ALTER TABLE endpoint ADD COLUMN next_test_at DATETIME"
+    assert connection.statements[-1] == (
+        "CREATE INDEX ix_endpoint_next_test_at ON endpoint (next_test_at)"
+    )
+
+
+def test_extend_enum_column_appends_the_missing_values():
+    connection = FakeConnection("enum('PENDING','RUNNING','DONE','FAILED')")
+
+    asyncio.run(migrations.extend_enum_column(connection, EndpointTestTask, "status"))
+
+    assert connection.statements[-1] == (
+        "ALTER TABLE endpoint_test_task MODIFY COLUMN "
+        "status ENUM('PENDING','RUNNING','DONE','FAILED','CANCELLED') NOT NULL"
+    )
+
+
+def test_extend_enum_column_skips_complete_enums():
+    connection = FakeConnection("enum('PENDING','RUNNING','DONE','FAILED','CANCELLED')")
+
+    asyncio.run(migrations.extend_enum_column(connection, EndpointTestTask, "status"))
+
+    assert len(connection.statements) == 1
+
+
+def test_add_ai_model_unique_name_tag_skips_an_existing_key():
+    connection = FakeConnection(
+        [("uq_ai_model_name_tag", 0, "name"), ("uq_ai_model_name_tag", 0, "tag")]
+    )
+
+    asyncio.run(migrations._add_ai_model_unique_name_tag(connection))
+
+    assert len(connection.statements) == 1
+
+
+def test_add_ai_model_unique_name_tag_merges_duplicates_first():
+    # Model 2 duplicates model 1
+    connection = FakeConnection([("PRIMARY", 0, "id")], [(2, 1)])
+
+    asyncio.run(migrations._add_ai_model_unique_name_tag(connection))
+
+    assert any(
+        statement.startswith("UPDATE IGNORE endpoint_ai_model SET ai_model_id=")
+        for statement in connection.statements
+    )
+    assert connection.statements[-2] == "DELETE FROM ai_model WHERE ai_model.id = %s"
+    assert connection.statements[-1] == (
+        "ALTER TABLE ai_model ADD CONSTRAINT uq_ai_model_name_tag UNIQUE (name, tag)"
+    )
+
+
+def test_add_indexes_creates_only_the_missing_ones():
+    connection = FakeConnection([("ix_endpoint_test_task_endpoint_status_time", 1, "endpoint_id")])
+
+    asyncio.run(migrations._add_hot_query_indexes(connection))
+
+    created = [statement for statement in connection.statements if statement.startswith("CREATE")]
+    assert created[0] == (
+        "CREATE INDEX ix_endpoint_test_task_status_lane_time "
+        "ON endpoint_test_task (status, lane, scheduled_at)"
+    )
+    assert not any("endpoint_status_time" in statement for statement in created)
+    assert len(created) == 4
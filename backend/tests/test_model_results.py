@@ -0,0 +1,160 @@
+import asyncio
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.ai_model.models import AIModelDB, AIModelPerformanceDB, AIModelStatusEnum
+from src.endpoint import service
+from src.ollama.performance_test import EndpointTestResult, ModelPerformance
+from src.utils import now
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def tuples(self) -> "FakeResult":
+        return self
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list:
+        return self.rows
+
+
+class FakeSession:
+    """Answers the statements whose SQL starts with a key of `answers` with its rows"""
+
+    def __init__(self, answers: dict[str, list]):
+        self.answers = answers
+        self.statements: list[str] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        compiled = sql(statement)
+        self.statements.append(compiled)
+        for prefix, rows in self.answers.items():
+            if compiled.startswith(prefix):
+                return FakeResult(rows)
+        return FakeResult([])
+
+    def starting_with(self, prefix: str) -> list[str]:
+        return [statement for statement in self.statements if statement.startswith(prefix)]
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+MODEL_IDS = "SELECT ai_model.id, ai_model.name, ai_model.tag"
+
+
+def model_performance(name: str, tps: float = 10) -> ModelPerformance:
+    return ModelPerformance(
+        ai_model=AIModelDB(name=name, tag="latest"),
+        performance=AIModelPerformanceDB(
+            status=AIModelStatusEnum.AVAILABLE, token_per_second=tps, connection_time=1
+        ),
+    )
+
+
+def test_upsert_ai_models_creates_missing_models_in_one_statement():
+    session = FakeSession({MODEL_IDS: [(1, "llama3", "latest"), (2, "qwen", "7b")]})
+    models = [
+        AIModelDB(name="llama3", tag="latest"),
+        AIModelDB(name="qwen", tag="7b"),
+        AIModelDB(name="llama3", tag="latest"),
+    ]
+
+    model_ids = asyncio.run(service.upsert_ai_models(session, models))
+
+    assert model_ids == {("llama3", "latest"): 1, ("qwen", "7b"): 2}
+    (upsert,) = session.starting_with("INSERT INTO ai_model")
+    assert upsert.count("'llama3'") == 1
+    assert upsert.endswith("ON DUPLICATE KEY UPDATE name = VALUES(name)")
+    (lookup,) = session.starting_with(MODEL_IDS)
+    assert "(ai_model.name, ai_model.tag) IN (('llama3', 'latest'), ('qwen', '7b'))" in lookup
+
+
+def test_upsert_ai_models_without_models_does_nothing():
+    session = FakeSession({})
+
+    assert asyncio.run(service.upsert_ai_models(session, [])) == {}
+    assert session.statements == []
+
+
+@pytest.fixture
+def no_suppression(monkeypatch):
+    monkeypatch.setattr(service.config.scanner, "suppress_unchanged_results", False)
+
+
+def test_model_results_are_written_with_one_statement_per_table(no_suppression):
+    names = ["a", "b", "c"]
+    session = FakeSession({MODEL_IDS: [(i, name, "latest") for i, name in enumerate(names, 1)]})
+    results = EndpointTestResult(model_performances=[model_performance(name) for name in names])
+
+    asyncio.run(service.process_models_test_results(session, 7, results))
+
+    (links,) = session.starting_with("INSERT INTO endpoint_ai_model ")
+    assert links.count("(7, ") == 3
+    assert "max_connection_time = greatest(" in links
+    (performances,) = session.starting_with("INSERT INTO ai_model_performance")
+    assert performances.count("'AVAILABLE'") == 3
+
+
+def test_models_gone_from_an_endpoint_are_marked_missing(no_suppression):
+    session = FakeSession(
+        {
+            MODEL_IDS: [(1, "a", "latest")],
+            "SELECT endpoint_ai_model.ai_model_id, endpoint_ai_model.status": [
+                (1, AIModelStatusEnum.AVAILABLE),
+                (2, AIModelStatusEnum.AVAILABLE),
+            ],
+        }
+    )
+    results = EndpointTestResult(model_performances=[model_performance("a")])
+
+    asyncio.run(service.process_models_test_results(session, 7, results))
+
+    (missing,) = session.starting_with("UPDATE endpoint_ai_model")
+    assert "endpoint_ai_model.ai_model_id IN (2)" in missing
+    assert "status='MISSING'" in missing
+    (performances,) = session.starting_with("INSERT INTO ai_model_performance")
+    assert "'MISSING'" in performances
+
+
+def previous(model_id: int, tps: float, hours_ago: float = 1) -> AIModelPerformanceDB:
+    return AIModelPerformanceDB(
+        id=100 + model_id,
+        endpoint_id=7,
+        ai_model_id=model_id,
+        status=AIModelStatusEnum.AVAILABLE,
+        token_per_second=tps,
+        connection_time=1,
+        created_at=(now() - timedelta(hours=hours_ago)).replace(tzinfo=None),
+    )
+
+
+def test_unchanged_results_only_confirm_the_latest_row():
+    names = ["same", "faster", "stale"]
+    session = FakeSession(
+        {
+            MODEL_IDS: [(i, name, "latest") for i, name in enumerate(names, 1)],
+            "SELECT ai_model_performance.": [
+                previous(1, tps=11),
+                previous(2, tps=5),
+                previous(3, tps=10, hours_ago=48),
+            ],
+        }
+    )
+    results = EndpointTestResult(model_performances=[model_performance(name) for name in names])
+
+    asyncio.run(service.process_models_test_results(session, 7, results))
+
+    (confirmed,) = session.starting_with("UPDATE ai_model_performance")
+    assert "ai_model_performance.id IN (101)" in confirmed
+    assert "samples=(ai_model_performance.samples + 1)" in confirmed
+    (inserted,) = session.starting_with("INSERT INTO ai_model_performance")
+    assert inserted.count("'AVAILABLE'") == 2
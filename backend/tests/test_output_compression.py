@@ -0,0 +1,43 @@
+import zlib
+
+from src.ai_model.utils import compress_output, decompress_output
+
+
+def test_round_trip():
+    output = "The quick brown fox 跳过了懒狗. " * 20
+
+    data, truncated = compress_output(output, max_chars=len(output))
+
+    assert not truncated
+    assert decompress_output(data) == output
+    assert len(data) < len(output.encode())
+
+
+def test_truncates_at_max_chars():
+    output = "你好" * 100
+
+    data, truncated = compress_output(output, max_chars=51)
+
+    assert truncated
+    assert decompress_output(data) == output[:51]
+
+
+def test_empty_output():
+    data, truncated = compress_output("", max_chars=10)
+
+    assert not truncated
+    assert decompress_output(data) == ""
+
+
+def test_compression_level():
+    output = "abc" * 1000
+
+    stored, _ = compress_output(output, max_chars=len(output), level=0)
+    best, _ = compress_output(output, max_chars=len(output), level=9)
+
+    assert decompress_output(stored) == decompress_output(best) == output
+    assert len(best) < len(output) < len(stored)
+
+
+def test_invalid_utf8_is_replaced():
+    assert decompress_output(zlib.compress(b"ok \xff")) == "ok �"
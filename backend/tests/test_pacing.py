@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import datetime
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+
+from src.config import ScannerConfig
+from src.endpoint import pacing
+from src.endpoint.pacing import PacingStats, ScanPacer
+from src.process_stats import ProcessStats
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+
+
+class FakeResult:
+    def __init__(self, count: int = 0, ids: Optional[list[int]] = None):
+        self.count = count
+        self.ids = ids or []
+
+    def scalar_one(self) -> int:
+        return self.count
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[int]:
+        return self.ids
+
+
+class FakeSession:
+    """Answers counts with `count` and the due endpoint lookup with the first `limit` IDs"""
+
+    def __init__(self, count: int, ids: list[int]):
+        self.count = count
+        self.ids = ids
+        self.limits: list[int] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        limit = getattr(statement, "_limit", None)
+        if limit is not None:
+            self.limits.append(limit)
+            return FakeResult(ids=self.ids[:limit])
+        return FakeResult(count=self.count)
+
+    async def commit(self) -> None:
+        pass
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.calls: list[dict] = []
+
+    async def schedule_endpoint_tests(self, endpoint_ids: list[int], run_date, **kwargs: Any):
+        self.calls.append({"endpoint_ids": endpoint_ids, "run_date": run_date, **kwargs})
+        return endpoint_ids
+
+
+@pytest.fixture
+def published(monkeypatch) -> list[tuple[str, PacingStats]]:
+    published: list[tuple[str, PacingStats]] = []
+
+    async def publish_stats(name: str, stats: PacingStats) -> None:
+        published.append((name, stats.model_copy()))
+
+    monkeypatch.setattr(pacing, "publish_stats", publish_stats)
+    return published
+
+
+@pytest.fixture
+def session(monkeypatch, published) -> FakeSession:
+    session = FakeSession(count=0, ids=list(range(1, 101)))
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+
+    monkeypatch.setattr(pacing.sessionmanager, "session", session_context)
+    set_interval(monkeypatch, hours=1)
+    monkeypatch.setattr(pacing, "now", lambda: NOW)
+    return session
+
+
+def set_interval(monkeypatch, hours: int) -> None:
+    async def get_setting(session: Any, key: Any) -> SimpleNamespace:
+        return SimpleNamespace(value=str(hours))
+
+    monkeypatch.setattr(pacing, "get_setting", get_setting)
+
+
+def make_pacer(**config: Any) -> ScanPacer:
+    pacer = ScanPacer(ScannerConfig(pacing_tick_seconds=60, **config), FakeScheduler())
+    # No previous leader to resume from
+    pacer._restored = True
+    return pacer
+
+
+def run_tick(pacer: ScanPacer, monkeypatch) -> None:
+    async def adjust_rate() -> None:
+        pass
+
+    monkeypatch.setattr(pacer, "_adjust_rate", adjust_rate)
+    asyncio.run(pacer.tick())
+
+
+def test_tick_spreads_the_due_endpoints_over_the_interval(session, monkeypatch):
+    # 600 endpoints due within the hour: 10 a minute
+    session.count = 600
+    pacer = make_pacer(pacing_jitter=0.5)
+
+    run_tick(pacer, monkeypatch)
+
+    (call,) = pacer.scheduler.calls
+    assert sorted(call["endpoint_ids"]) == list(range(1, 11))
+    assert call["run_date"] == NOW
+    assert call["spread"] == datetime.timedelta(seconds=60)
+    assert call["jitter"] == 0.5
+    assert pacer.stats.target_rate_per_minute == 10
+    assert pacer.stats.scheduled_endpoints == 10
+
+
+def test_tick_carries_fractions_of_a_test_over(session, monkeypatch):
+    # 0.5 tests a minute: one test every other tick
+    session.count = 30
+    pacer = make_pacer()
+
+    run_tick(pacer, monkeypatch)
+    run_tick(pacer, monkeypatch)
+
+    assert [len(call["endpoint_ids"]) for call in pacer.scheduler.calls] == [1]
+    assert session.limits == [1]
+
+
+def test_tick_follows_the_configured_rate_and_factor(session, monkeypatch):
+    session.count = 600
+    pacer = make_pacer(target_rate_per_minute=40)
+    pacer._stats.rate_factor = 0.5
+
+    run_tick(pacer, monkeypatch)
+
+    assert session.limits == [20]
+
+
+def test_tick_reports_the_metrics_while_paused(session, monkeypatch, published):
+    set_interval(monkeypatch, hours=0)
+    pacer = make_pacer()
+
+    run_tick(pacer, monkeypatch)
+
+    assert pacer.scheduler.calls == []
+    assert published == [(pacing.PACING_STATS, pacer.stats)]
+
+
+def adjust(pacer: ScanPacer, monkeypatch, backlog: int) -> None:
+    async def count_session():
+        yield FakeSession(count=backlog, ids=[])
+
+    monkeypatch.setattr(
+        pacing.sessionmanager, "session", contextlib.asynccontextmanager(count_session)
+    )
+    asyncio.run(pacer._adjust_rate())
+
+
+def test_adjust_rate_backs_off_while_the_queue_backs_up(session, monkeypatch):
+    pacer = make_pacer(concurrency=10, min_rate_factor=0.5)
+
+    adjust(pacer, monkeypatch, backlog=11)
+    assert pacer.stats.rate_factor == pytest.approx(0.7)
+    adjust(pacer, monkeypatch, backlog=11)
+    assert pacer.stats.rate_factor == 0.5
+
+    adjust(pacer, monkeypatch, backlog=0)
+    assert pacer.stats.rate_factor == pytest.approx(0.6)
+    assert pacer.stats.backlog == 0
+
+
+def restore(monkeypatch, updated_at: datetime.datetime) -> ScanPacer:
+    async def get_latest_stats(session: Any, name: str, model: Any) -> ProcessStats:
+        return ProcessStats[PacingStats](
+            process_id="previous-leader",
+            updated_at=updated_at,
+            stats=PacingStats(rate_factor=0.3, scheduled_endpoints=42),
+        )
+
+    monkeypatch.setattr(pacing, "get_latest_stats", get_latest_stats)
+    pacer = make_pacer()
+    asyncio.run(pacer._restore())
+    return pacer
+
+
+def test_restore_resumes_from_the_previous_leader(session, monkeypatch):
+    pacer = restore(monkeypatch, NOW.replace(tzinfo=None) - datetime.timedelta(minutes=1))
+
+    assert pacer.stats.rate_factor == 0.3
+    assert pacer.stats.scheduled_endpoints == 42
+
+
+def test_restore_ignores_stale_metrics(session, monkeypatch):
+    pacer = restore(monkeypatch, NOW.replace(tzinfo=None) - datetime.timedelta(hours=1))
+
+    assert pacer.stats.rate_factor == 1
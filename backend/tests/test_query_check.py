@@ -0,0 +1,78 @@
+import asyncio
+import contextlib
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src import query_check
+
+
+@pytest.mark.parametrize("query", query_check.HOT_QUERIES, ids=lambda query: query.name)
+def test_hot_queries_compile(query):
+    assert str(query.build().compile(dialect=mysql.dialect())).startswith("SELECT")
+
+
+class FakeResult:
+    def __init__(self, plan: list[dict]):
+        self.plan = plan
+
+    def mappings(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[dict]:
+        return self.plan
+
+
+class FakeConnection:
+    """Answers every EXPLAIN with the given plan"""
+
+    def __init__(self, plan: list[dict]):
+        self.plan = plan
+        self.explained = 0
+
+    async def execute(self, statement: Any) -> FakeResult:
+        assert str(statement.compile(dialect=mysql.dialect())).startswith("EXPLAIN SELECT")
+        self.explained += 1
+        return FakeResult(self.plan)
+
+
+def check(monkeypatch, plan: list[dict]) -> tuple[bool, FakeConnection]:
+    connection = FakeConnection(plan)
+
+    async def nothing() -> None:
+        pass
+
+    @contextlib.asynccontextmanager
+    async def connect():
+        yield connection
+
+    monkeypatch.setattr(query_check, "create_db_and_tables", nothing)
+    monkeypatch.setattr(query_check, "run_migrations", nothing)
+    monkeypatch.setattr(query_check.sessionmanager, "connect", connect)
+    monkeypatch.setattr(query_check.sessionmanager, "close", nothing)
+    return asyncio.run(query_check.check_hot_queries(rows=10, seed=False)), connection
+
+
+def test_index_plans_pass(monkeypatch, capsys):
+    passed, connection = check(
+        monkeypatch,
+        [
+            {"table": "endpoint", "key": "PRIMARY", "type": "ref"},
+            # Derived tables are built from rows read through an index
+            {"table": "<derived2>", "key": None, "type": "ALL"},
+        ],
+    )
+
+    assert passed
+    assert connection.explained == len(query_check.HOT_QUERIES)
+    assert "FAIL" not in capsys.readouterr().out
+
+
+def test_full_scans_fail(monkeypatch, capsys):
+    passed, _ = check(
+        monkeypatch, [{"table": "endpoint", "key": "ix_endpoint_host", "type": "index"}]
+    )
+
+    assert not passed
+    assert "full scan of endpoint" in capsys.readouterr().out
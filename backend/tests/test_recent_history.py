@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+from sqlalchemy.dialects import mysql
+from sqlmodel import col
+
+import src.endpoint.models  # noqa: F401
+from src.ai_model.models import AIModelPerformanceDB
+from src.ai_model.service import _recent_performances_query
+from src.database import load_recent_per_group, recent_per_group_query
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_recent_rows_are_ranked_per_group():
+    recent = recent_per_group_query(
+        [col(AIModelPerformanceDB.id)],
+        [col(AIModelPerformanceDB.endpoint_id), col(AIModelPerformanceDB.ai_model_id)],
+        [col(AIModelPerformanceDB.id).desc()],
+        3,
+        col(AIModelPerformanceDB.ai_model_id) == 5,
+    )
+
+    assert sql(recent.query) == (
+        "SELECT anon_1.id, anon_1.group_0, anon_1.group_1, anon_1.group_rank \n"
+        "FROM (SELECT ai_model_performance.id AS id, "
+        "ai_model_performance.endpoint_id AS group_0, "
+        "ai_model_performance.ai_model_id AS group_1, "
+        "row_number() OVER (PARTITION BY ai_model_performance.endpoint_id, "
+        "ai_model_performance.ai_model_id ORDER BY ai_model_performance.id DESC) AS group_rank \n"
+        "FROM ai_model_performance \n"
+        "WHERE ai_model_performance.ai_model_id = 5) AS anon_1 \n"
+        "WHERE anon_1.group_rank <= 3 ORDER BY anon_1.group_0, anon_1.group_1, anon_1.group_rank"
+    )
+
+
+class FakeSession:
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, statement: Any) -> Any:
+        self.queries += 1
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+def test_recent_rows_are_loaded_by_group_in_one_query():
+    recent = recent_per_group_query(
+        [col(AIModelPerformanceDB.id)],
+        [col(AIModelPerformanceDB.endpoint_id)],
+        [col(AIModelPerformanceDB.id).desc()],
+        10,
+    )
+    (group,) = recent.group_columns
+
+    def row(id_: int, endpoint_id: int) -> SimpleNamespace:
+        return SimpleNamespace(id=id_, _mapping={group: endpoint_id})
+
+    session = FakeSession([row(9, 1), row(4, 1), row(8, 2)])
+
+    groups = asyncio.run(load_recent_per_group(session, recent))  # type: ignore[arg-type]
+
+    assert session.queries == 1
+    assert {key: [row.id for row in rows] for key, rows in groups.items()} == {
+        (1,): [9, 4],
+        (2,): [8],
+    }
+
+
+def test_recent_model_performances_skip_the_output():
+    statement = sql(_recent_performances_query(3, [1, 2]).query)
+
+    assert "output" not in statement
+    assert "WHERE anon_1.group_rank <= 10" in statement
+    assert (
+        "WHERE ai_model_performance.ai_model_id = 3 "
+        "AND ai_model_performance.endpoint_id IN (1, 2)"
+    ) in statement
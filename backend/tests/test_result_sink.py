@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+from typing import Any, List
+
+from src.config import ScannerConfig
+from src.endpoint import result_sink
+from src.endpoint.result_sink import ResultSink
+from src.ollama.performance_test import EndpointTestResult
+
+
+def outcome(task_id: int, failed: bool = False) -> result_sink.TestOutcome:
+    results = None if failed else EndpointTestResult()
+    return result_sink.TestOutcome(
+        task_id, endpoint_id=task_id * 10, results=results, failed=failed
+    )
+
+
+def run_sink(sink: ResultSink, outcomes: List[result_sink.TestOutcome]) -> None:
+    async def run() -> None:
+        sink.start()
+        for item in outcomes:
+            await sink.put(item)
+        await sink.shutdown()
+
+    asyncio.run(run())
+
+
+def make_sink(
+    batches: list[list[int]], fail_batches: bool = False, bad_task: int = 0
+) -> ResultSink:
+    """A sink recording the task IDs of each write, which fail as asked"""
+    sink = ResultSink(ScannerConfig(result_batch_size=3, result_flush_seconds=0.05))
+
+    async def write(batch: List[result_sink.TestOutcome]) -> None:
+        task_ids = [item.task_id for item in batch]
+        batches.append(task_ids)
+        if (fail_batches and len(batch) > 1) or (bad_task in task_ids and not batch[0].failed):
+            raise RuntimeError("write failed")
+
+    sink._write = write  # type: ignore[method-assign]
+    return sink
+
+
+def test_outcomes_are_written_in_batches():
+    batches: list[list[int]] = []
+
+    run_sink(make_sink(batches), [outcome(task_id) for task_id in range(1, 8)])
+
+    assert batches == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_a_failed_batch_is_retried_one_by_one():
+    batches: list[list[int]] = []
+
+    run_sink(
+        make_sink(batches, fail_batches=True, bad_task=2),
+        [outcome(task_id) for task_id in range(1, 4)],
+    )
+
+    # The bad outcome only marks its task as failed
+    assert batches == [[1, 2, 3], [1], [2], [2], [3]]
+
+
+class FakeResult:
+    def __init__(self, ids: list[int]):
+        self.ids = ids
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[int]:
+        return self.ids
+
+
+class FakeSession:
+    def __init__(self, existing: list[int]):
+        self.existing = existing
+        self.statements: list[Any] = []
+        self.commits = 0
+
+    async def execute(self, statement: Any) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult(self.existing)
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def test_write_skips_deleted_endpoints_and_settles_every_task(monkeypatch):
+    session = FakeSession(existing=[10, 30])
+    calls: dict[str, list] = {"saved": [], "completed": [], "failed": []}
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+
+    def record(name: str, argument: int):
+        async def call(*args: Any) -> None:
+            calls[name].append(args[argument])
+
+        return call
+
+    monkeypatch.setattr(result_sink.sessionmanager, "session", session_context)
+    monkeypatch.setattr(result_sink, "save_endpoint_test_results", record("saved", 1))
+    monkeypatch.setattr(result_sink, "complete_tasks", record("completed", 1))
+    monkeypatch.setattr(result_sink, "fail_tasks", record("failed", 1))
+    sink = ResultSink(ScannerConfig())
+
+    # Endpoint 20 was deleted during its test
+    asyncio.run(sink._write([outcome(3), outcome(2), outcome(1), outcome(4, failed=True)]))
+
+    (lock,) = session.statements
+    assert lock._for_update_arg is not None
+    assert calls["saved"] == [10, 30]
+    assert calls["completed"] == [[1, 2, 3]]
+    assert calls["failed"] == [[4]]
+    assert session.commits == 1
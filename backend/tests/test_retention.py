@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import datetime
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy import literal, select
+
+from src.retention import service
+from src.retention.models import RetentionRunStatus
+
+
+class FakeConnection:
+    """Answers GET_LOCK with the given result and records the statements"""
+
+    def __init__(self, locked: int):
+        self.locked = locked
+        self.statements: list[str] = []
+        self.closed = False
+
+    async def scalar(self, statement: Any, params: dict) -> int:
+        self.statements.append(str(statement))
+        return self.locked
+
+    async def execute(self, statement: Any, params: dict) -> None:
+        self.statements.append(str(statement))
+
+    async def commit(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def calls(monkeypatch) -> dict[str, list]:
+    calls: dict[str, list] = {"executed": [], "updated": []}
+
+    async def execute(run_id: int) -> None:
+        calls["executed"].append(run_id)
+
+    async def update_run(run_id: int, **values: Any) -> None:
+        calls["updated"].append((run_id, values))
+
+    monkeypatch.setattr(service, "_execute", execute)
+    monkeypatch.setattr(service, "_update_run", update_run)
+    return calls
+
+
+def run(monkeypatch, connection: FakeConnection, run_id: int) -> None:
+    async def detached_connection() -> FakeConnection:
+        return connection
+
+    monkeypatch.setattr(service.sessionmanager, "detached_connection", detached_connection)
+    asyncio.run(service.run_retention(run_id))
+
+
+def test_run_retention_holds_the_lock_while_it_runs(monkeypatch, calls):
+    connection = FakeConnection(locked=1)
+
+    run(monkeypatch, connection, 7)
+
+    assert calls["executed"] == [7]
+    assert calls["updated"][-1][1]["status"] == RetentionRunStatus.DONE
+    assert connection.statements == [
+        "SELECT GET_LOCK(:name, 0)",
+        "SELECT RELEASE_LOCK(:name)",
+    ]
+    assert connection.closed
+
+
+def test_run_retention_skips_while_another_process_runs(monkeypatch, calls):
+    connection = FakeConnection(locked=0)
+
+    run(monkeypatch, connection, 7)
+
+    assert calls["executed"] == []
+    ((run_id, values),) = calls["updated"]
+    assert run_id == 7
+    assert values["status"] == RetentionRunStatus.FAILED
+    assert connection.statements == ["SELECT GET_LOCK(:name, 0)"]
+    assert connection.closed
+
+
+class RollupSession:
+    """Keeps the watermark and answers everything else with 5 affected rows"""
+
+    def __init__(self, watermark: Optional[datetime.datetime]):
+        self.watermark = watermark
+
+    async def get(self, model: Any, name: str) -> Any:
+        if self.watermark is None:
+            return None
+        return SimpleNamespace(rolled_up_until=self.watermark)
+
+    async def execute(self, statement: Any) -> Any:
+        return SimpleNamespace(rowcount=5, scalar=lambda: FIRST_TIMESTAMP)
+
+    def add(self, row: Any) -> None:
+        self.watermark = row.rolled_up_until
+
+    async def commit(self) -> None:
+        pass
+
+
+FIRST_TIMESTAMP = datetime.datetime(2026, 1, 1, 22, 30)
+
+
+def roll_up(
+    monkeypatch, watermark: Optional[datetime.datetime], cutoff: datetime.datetime
+) -> tuple[datetime.datetime, list[tuple], list[int]]:
+    session = RollupSession(watermark)
+    windows: list[tuple] = []
+    rolled_up_rows: list[int] = []
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+
+    def build_statement(start: datetime.datetime, end: datetime.datetime) -> Any:
+        windows.append((start, end))
+        return select(literal(1))
+
+    async def progress(rolled_up: int = 0, deleted: int = 0) -> None:
+        rolled_up_rows.append(rolled_up)
+
+    monkeypatch.setattr(service.sessionmanager, "session", session_context)
+    new_watermark = asyncio.run(
+        service._roll_up("test", select(literal(1)), cutoff, build_statement, progress)
+    )
+    return new_watermark, windows, rolled_up_rows
+
+
+def test_roll_up_starts_at_the_first_row_and_goes_one_day_at_a_time(monkeypatch):
+    cutoff = datetime.datetime(2026, 1, 3, 6)
+
+    watermark, windows, rolled_up = roll_up(monkeypatch, None, cutoff)
+
+    assert watermark == cutoff
+    assert windows == [
+        (datetime.datetime(2026, 1, 1, 22), datetime.datetime(2026, 1, 2)),
+        (datetime.datetime(2026, 1, 2), datetime.datetime(2026, 1, 3)),
+        (datetime.datetime(2026, 1, 3), cutoff),
+    ]
+    assert rolled_up == [5, 5, 5]
+
+
+def test_roll_up_resumes_from_the_watermark(monkeypatch):
+    watermark, windows, _ = roll_up(
+        monkeypatch, datetime.datetime(2026, 1, 3), datetime.datetime(2026, 1, 3, 6)
+    )
+
+    assert windows == [(datetime.datetime(2026, 1, 3), datetime.datetime(2026, 1, 3, 6))]
+    assert watermark == datetime.datetime(2026, 1, 3, 6)
+
+
+def test_roll_up_does_nothing_once_at_the_cutoff(monkeypatch):
+    cutoff = datetime.datetime(2026, 1, 1, 12)
+
+    watermark, windows, _ = roll_up(monkeypatch, cutoff, cutoff)
+
+    assert windows == []
+    assert watermark == cutoff
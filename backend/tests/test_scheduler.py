@@ -0,0 +1,111 @@
+import asyncio
+import contextlib
+import datetime
+from typing import Any
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.endpoint import scheduler
+from src.endpoint.models import TaskLane, TaskStatus
+
+RUN_DATE = datetime.datetime(2026, 1, 1, 12, 0)
+SKIP_SINCE = RUN_DATE - datetime.timedelta(minutes=10)
+
+
+class FakeResult:
+    def __init__(self, rows: list):
+        self.rows = rows
+
+    def all(self) -> list:
+        return self.rows
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+
+class FakeSession:
+    """Answers the lookup of the queued tasks with the given rows"""
+
+    def __init__(self, queued: list[tuple]):
+        self.queued = queued
+        self.statements: list[Any] = []
+
+    async def execute(self, statement: Any) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult(self.queued if len(self.statements) == 1 else [])
+
+    async def commit(self) -> None:
+        pass
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture
+def session(monkeypatch) -> FakeSession:
+    session = FakeSession(
+        [
+            # Running: skipped
+            (11, 1, TaskStatus.RUNNING, SKIP_SINCE, TaskLane.PERIODIC),
+            # Pending before the run date: skipped
+            (12, 2, TaskStatus.PENDING, SKIP_SINCE, TaskLane.PERIODIC),
+            # Pending after the run date: moved
+            (13, 3, TaskStatus.PENDING, RUN_DATE + datetime.timedelta(hours=1), TaskLane.PERIODIC),
+        ]
+    )
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+
+    monkeypatch.setattr(scheduler.sessionmanager, "session", session_context)
+    return session
+
+
+def schedule(endpoint_ids: list[int], **kwargs: Any) -> None:
+    service = scheduler.SchedulerService()
+    asyncio.run(
+        service.schedule_endpoint_tests(
+            endpoint_ids, RUN_DATE, check_endpoints=False, skip_since=SKIP_SINCE, **kwargs
+        )
+    )
+
+
+def test_schedule_endpoint_tests_skips_moves_and_creates_in_one_statement_each(session):
+    schedule([1, 2, 3, 4, 4])
+
+    queued, moved, created, _ = (sql(statement) for statement in session.statements)
+    assert "endpoint_test_task.endpoint_id IN (1, 2, 3, 4)" in queued
+    assert "WHERE endpoint_test_task.id IN (13)" in moved
+    assert (
+        "scheduled_at=least(endpoint_test_task.scheduled_at, "
+        "CASE endpoint_test_task.id WHEN 13 THEN '2026-01-01 12:00:00' END)"
+    ) in moved
+    assert "lane=" not in moved
+    assert created.count("'PENDING', 'PERIODIC', '2026-01-01 12:00:00'") == 1
+    assert "(4, 'PENDING'" in created
+
+
+def test_schedule_endpoint_tests_spreads_run_dates(session):
+    session.queued = []
+
+    schedule([1, 2, 3, 4], spread=datetime.timedelta(hours=1))
+
+    _, created, _ = (sql(statement) for statement in session.statements)
+    for minutes in (0, 15, 30, 45):
+        assert f"'2026-01-01 12:{minutes:02}:00'" in created
+
+
+def test_schedule_endpoint_tests_promotes_tasks_of_lower_lanes(session):
+    session.queued = [(21, 1, TaskStatus.PENDING, RUN_DATE, TaskLane.PERIODIC)]
+
+    schedule([1], lane=TaskLane.MANUAL)
+
+    _, moved, _ = (sql(statement) for statement in session.statements)
+    assert "WHERE endpoint_test_task.id IN (21)" in moved
+    assert (
+        "lane=CASE WHEN (endpoint_test_task.lane IN ('CIRCUIT_BREAKER', 'IMPORT', 'PERIODIC')) "
+        "THEN 'MANUAL' ELSE endpoint_test_task.lane END"
+    ) in moved
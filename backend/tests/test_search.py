@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.ai_model.models import AIModelDB
+from src.endpoint.search import endpoint_search, url_search_fields
+from src.search import escape_like, fulltext_search
+from src.user.models import UserDB
+
+
+def sql(clause) -> str:
+    return str(clause.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.mark.parametrize(
+    ("term", "escaped"),
+    [
+        ("plain", "plain"),
+        ("100%", "100\\%"),
+        ("snake_case", "snake\\_case"),
+        ("back\\slash", "back\\\\slash"),
+        ("\\%_", "\\\\\\%\\_"),
+    ],
+)
+def test_escape_like(term: str, escaped: str):
+    assert escape_like(term) == escaped
+
+
+def test_fulltext_search_requires_every_term_as_a_phrase():
+    condition, relevance = fulltext_search([UserDB.username], 'qwen "coder"')
+
+    assert relevance is condition
+    assert 'MATCH (user.username) AGAINST (\'+"qwen" +"coder"\' IN BOOLEAN MODE)' in sql(condition)
+
+
+def test_fulltext_search_falls_back_to_like_for_short_terms():
+    condition, relevance = fulltext_search([UserDB.username], " _ ")
+
+    assert relevance is None
+    assert "LIKE lower('%%\\\\_%%')" in sql(condition)
+
+
+def test_fulltext_search_keeps_short_terms_next_to_long_ones():
+    condition, relevance = fulltext_search([AIModelDB.name, AIModelDB.tag], "qwen b")
+
+    assert relevance is not None
+    assert sql(condition) == (
+        "MATCH (ai_model.name, ai_model.tag) AGAINST ('+\"qwen\"' IN BOOLEAN MODE) AND "
+        "(lower(ai_model.name) LIKE lower('%%b%%') OR lower(ai_model.tag) LIKE lower('%%b%%'))"
+    )
+
+
+def test_fulltext_search_requires_every_short_term():
+    condition, _ = fulltext_search([UserDB.username], "a b")
+
+    assert sql(condition) == (
+        "lower(user.username) LIKE lower('%%a%%') AND lower(user.username) LIKE lower('%%b%%')"
+    )
+
+
+@pytest.mark.parametrize(
+    ("url", "fields"),
+    [
+        ("http://10.0.0.1:11434", {"host": "10.0.0.1", "ip_number": 167772161}),
+        ("https://Example.com/ollama", {"host": "example.com", "ip_number": None}),
+        ("http://[::1]:11434", {"host": "::1", "ip_number": None}),
+        ("http://[broken", {"host": None, "ip_number": None}),
+    ],
+)
+def test_url_search_fields(url: str, fields: dict):
+    assert url_search_fields(url) == fields
+
+
+@pytest.mark.parametrize(
+    ("search", "expected"),
+    [
+        ("10.0.0.0/8", "endpoint.ip_number BETWEEN 167772160 AND 184549375"),
+        ("10.0.0.9 - 10.0.0.1", "endpoint.ip_number BETWEEN 167772161 AND 167772169"),
+        ("10.0.0.1", "endpoint.ip_number = 167772161"),
+        ("10.0.", "endpoint.host LIKE '10.0.%%'"),
+        ("host:Example.com", "endpoint.host = 'example.com'"),
+        ("host:ex_*", "endpoint.host LIKE 'ex\\\\_%%'"),
+        ("http://example.com", "endpoint.url LIKE 'http://example.com%%'"),
+        ("llama", "MATCH (endpoint.name, endpoint.url) AGAINST"),
+    ],
+)
+def test_endpoint_search(search: str, expected: str):
+    condition, _ = endpoint_search(search)
+
+    assert expected in sql(condition)
@@ -0,0 +1,137 @@
+import asyncio
+import datetime
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.config import ScannerConfig
+from src.endpoint import task_queue
+from src.endpoint.task_queue import retry_delay
+
+
+@pytest.mark.parametrize(
+    ("attempts", "seconds"),
+    [(0, 60), (1, 60), (2, 120), (3, 240), (5, 960)],
+)
+def test_retry_delay_doubles_with_every_attempt(attempts: int, seconds: int):
+    scanner_config = ScannerConfig(retry_delay_seconds=60)
+
+    assert retry_delay(attempts, scanner_config) == datetime.timedelta(seconds=seconds)
+
+
+def test_retry_delay_follows_the_config():
+    assert retry_delay(3, ScannerConfig(retry_delay_seconds=5)) == datetime.timedelta(seconds=20)
+    assert retry_delay(3, ScannerConfig(retry_delay_seconds=0)) == datetime.timedelta(0)
+
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0)
+
+
+class FakeResult:
+    def __init__(self, rows: list[tuple], rowcount: int = 0):
+        self.rows = rows
+        self.rowcount = rowcount
+
+    def tuples(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[tuple]:
+        return self.rows
+
+
+class FakeSession:
+    """Answers every SELECT with the given rows and records the statements as SQL"""
+
+    def __init__(self, rows: Optional[list[tuple]] = None):
+        self.rows = rows or []
+        self.statements: list[str] = []
+        self.commits = 0
+
+    async def execute(self, statement: Any) -> FakeResult:
+        self.statements.append(sql(statement))
+        return FakeResult(self.rows, rowcount=len(self.rows))
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+@pytest.fixture(autouse=True)
+def fixed_now(monkeypatch):
+    monkeypatch.setattr(task_queue, "now", lambda: NOW)
+    monkeypatch.setattr(task_queue.config.scanner, "retry_delay_seconds", 60)
+    monkeypatch.setattr(task_queue.config.scanner, "max_attempts", 3)
+    monkeypatch.setattr(task_queue.config.scanner, "lease_seconds", 300)
+
+
+def test_claim_due_tasks_locks_due_tasks_and_leases_them():
+    session = FakeSession([(1, 10), (2, 20)])
+
+    tasks = asyncio.run(task_queue.claim_due_tasks(session, "worker", 5))
+
+    assert tasks == [(1, 10), (2, 20)]
+    select, update = session.statements
+    assert "endpoint_test_task.status = 'PENDING'" in select
+    assert "endpoint_test_task.scheduled_at <= '2026-01-01 12:00:00'" in select
+    assert select.endswith(
+        "ORDER BY endpoint_test_task.scheduled_at \n LIMIT 5 FOR UPDATE SKIP LOCKED"
+    )
+    assert "WHERE endpoint_test_task.id IN (1, 2)" in update
+    assert "status='RUNNING'" in update
+    assert "worker_id='worker'" in update
+    assert "lease_expires_at='2026-01-01 12:05:00'" in update
+    assert "attempts=(endpoint_test_task.attempts + 1)" in update
+    assert session.commits == 1
+
+
+def test_claim_due_tasks_without_due_tasks_changes_nothing():
+    session = FakeSession()
+
+    assert asyncio.run(task_queue.claim_due_tasks(session, "worker", 5)) == []
+    assert len(session.statements) == 1
+    assert asyncio.run(task_queue.claim_due_tasks(session, "worker", 0)) == []
+    assert len(session.statements) == 1
+
+
+def test_fail_tasks_retries_with_backoff_until_the_last_attempt():
+    session = FakeSession()
+
+    asyncio.run(task_queue.fail_tasks(session, [1, 2]))
+
+    failed, retried = session.statements
+    assert "endpoint_test_task.attempts >= 3" in failed
+    assert "status='FAILED'" in failed
+    assert "status='PENDING'" in retried
+    assert (
+        "scheduled_at=CASE endpoint_test_task.attempts "
+        "WHEN 0 THEN '2026-01-01 12:01:00' "
+        "WHEN 1 THEN '2026-01-01 12:01:00' "
+        "WHEN 2 THEN '2026-01-01 12:02:00' "
+        "ELSE '2026-01-01 12:04:00' END"
+    ) in retried
+    for statement in (failed, retried):
+        assert "endpoint_test_task.id IN (1, 2)" in statement
+        assert "endpoint_test_task.status = 'RUNNING'" in statement
+    # The caller commits
+    assert session.commits == 0
+
+
+def test_release_expired_leases_requeues_or_fails_expired_tasks():
+    session = FakeSession()
+
+    asyncio.run(task_queue.release_expired_leases(session))
+
+    failed, released = session.statements
+    expired = (
+        "endpoint_test_task.status = 'RUNNING' AND (endpoint_test_task.lease_expires_at IS NULL "
+        "OR endpoint_test_task.lease_expires_at < '2026-01-01 12:00:00')"
+    )
+    assert expired in failed
+    assert "endpoint_test_task.attempts >= 3" in failed
+    assert expired in released
+    assert "status='PENDING'" in released
+    assert "worker_id=NULL" in released
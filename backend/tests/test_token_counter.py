@@ -0,0 +1,69 @@
+import asyncio
+import os
+
+import pytest
+
+from src.config import TokenizerConfig
+from src.endpoint.utils import (
+    TokenCounter,
+    TokenCounterBackend,
+    configure_tiktoken_cache,
+    estimate_token_count,
+)
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        ("", 0),
+        ("abcd", 1),
+        ("abcde", 2),
+        ("你好世界", 4),
+        ("こんにちは", 5),
+        ("你好 world", 2 + 2),
+    ],
+)
+def test_estimate_token_count(text: str, expected: int):
+    assert estimate_token_count(text) == expected
+
+
+@pytest.fixture
+def empty_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_falls_back_without_cached_encoding(empty_cache):
+    counter = TokenCounter(TokenizerConfig(allow_download=False))
+
+    assert counter.count("hello world") == estimate_token_count("hello world")
+    stats = counter.stats
+    assert stats.backend == TokenCounterBackend.HEURISTIC
+    assert str(empty_cache) in (stats.load_error or "")
+    assert stats.heuristic_calls == 1
+    assert stats.tiktoken_calls == 0
+
+
+def test_falls_back_for_unknown_encoding(empty_cache):
+    counter = TokenCounter(TokenizerConfig(encoding="unknown", allow_download=False))
+
+    assert counter.count("你好") == 2
+    assert counter.stats.backend == TokenCounterBackend.HEURISTIC
+
+
+def test_fallback_is_not_offloaded(empty_cache):
+    counter = TokenCounter(TokenizerConfig(allow_download=False, offload_threshold=1))
+    counter.count("")
+
+    assert asyncio.run(counter.acount("a long enough text")) == 5
+    assert counter.stats.offloaded_calls == 0
+    counter.shutdown()
+
+
+def test_configure_tiktoken_cache(tmp_path, monkeypatch):
+    monkeypatch.delenv("TIKTOKEN_CACHE_DIR", raising=False)
+    configure_tiktoken_cache(TokenizerConfig(cache_dir=None))
+    assert "TIKTOKEN_CACHE_DIR" not in os.environ
+
+    configure_tiktoken_cache(TokenizerConfig(cache_dir=str(tmp_path)))
+    assert os.environ["TIKTOKEN_CACHE_DIR"] == str(tmp_path)
@@ -0,0 +1,107 @@
+import asyncio
+import contextlib
+import datetime
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import pytest
+from sqlalchemy.dialects import mysql
+
+from src.apikey.service import _usage_query
+from src.retention import usage
+
+NOW = datetime.datetime(2026, 1, 3, 6, 1)
+CUTOFF = datetime.datetime(2026, 1, 3, 6)
+
+
+def sql(statement: Any) -> str:
+    return str(statement.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+class FakeSession:
+    """Keeps the watermark and records the statements"""
+
+    def __init__(self, watermark: Optional[datetime.datetime], first_log: datetime.datetime):
+        self.watermark = watermark
+        self.first_log = first_log
+        self.statements: list[str] = []
+        self.commits = 0
+
+    async def get(self, model: Any, name: str) -> Any:
+        if self.watermark is None:
+            return None
+        return SimpleNamespace(rolled_up_until=self.watermark)
+
+    async def execute(self, statement: Any) -> Any:
+        self.statements.append(sql(statement))
+        return SimpleNamespace(scalar=lambda: self.first_log)
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def roll_up(monkeypatch, watermark: Optional[datetime.datetime]) -> FakeSession:
+    session = FakeSession(watermark, first_log=datetime.datetime(2026, 1, 1, 22, 30))
+
+    @contextlib.asynccontextmanager
+    async def session_context():
+        yield session
+
+    monkeypatch.setattr(usage.sessionmanager, "session", session_context)
+    monkeypatch.setattr(usage, "_utcnow", lambda: NOW)
+    asyncio.run(usage.roll_up_usage())
+    return session
+
+
+def watermarks(session: FakeSession) -> list[str]:
+    return [
+        statement.split("VALUES ")[1].split(")")[0]
+        for statement in session.statements
+        if statement.startswith("INSERT INTO retention_watermark")
+    ]
+
+
+def test_roll_up_starts_at_the_first_log_and_commits_each_day(monkeypatch):
+    session = roll_up(monkeypatch, None)
+
+    assert session.commits == 3
+    assert watermarks(session) == [
+        "('api_key_usage', '2026-01-02 00:00:00'",
+        "('api_key_usage', '2026-01-03 00:00:00'",
+        "('api_key_usage', '2026-01-03 06:00:00'",
+    ]
+    hourly = [s for s in session.statements if "'HOUR'" in s and "FROM api_key_usage_log" in s]
+    assert (
+        "api_key_usage_log.timestamp >= '2026-01-01 22:00:00' "
+        "AND api_key_usage_log.timestamp < '2026-01-02 00:00:00'"
+    ) in hourly[0]
+
+
+def test_roll_up_recomputes_the_hour_and_day_of_the_watermark(monkeypatch):
+    session = roll_up(monkeypatch, datetime.datetime(2026, 1, 3, 5, 30))
+
+    hourly, daily, watermark = session.statements
+    assert "api_key_usage_log.timestamp >= '2026-01-03 05:00:00'" in hourly
+    assert "api_key_usage_rollup.bucket_start >= '2026-01-03 00:00:00'" in daily
+    assert watermark.endswith("ON DUPLICATE KEY UPDATE rolled_up_until = VALUES(rolled_up_until)")
+    assert watermarks(session) == ["('api_key_usage', '2026-01-03 06:00:00'"]
+
+
+def test_roll_up_does_nothing_once_at_the_cutoff(monkeypatch):
+    session = roll_up(monkeypatch, CUTOFF)
+
+    assert session.statements == []
+
+
+@pytest.mark.parametrize("rolled_up_until", [None, CUTOFF])
+def test_usage_adds_the_logs_from_the_watermark_on(rolled_up_until):
+    statement = sql(_usage_query([1, 2], rolled_up_until, datetime.date(2026, 1, 1)))
+
+    assert "api_key_usage_rollup.period = 'DAY'" in statement
+    assert "api_key_usage_rollup.api_key_id IN (1, 2)" in statement
+    assert "api_key_usage_log.api_key_id IN (1, 2)" in statement
+    assert ("api_key_usage_log.timestamp >= '2026-01-03 06:00:00'" in statement) == (
+        rolled_up_until is not None
+    )
+    # Only recent days are split by model
+    assert "CASE WHEN (anon_1.day >= '2026-01-01') THEN anon_1.model ELSE '' END" in statement
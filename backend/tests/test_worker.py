@@ -0,0 +1,168 @@
+import asyncio
+import contextlib
+import os
+import signal
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from src.config import ScannerConfig
+from src.endpoint import worker
+from src.endpoint.models import TaskLane
+
+
+def make_pool(**config: Any) -> worker.TestWorkerPool:
+    return worker.TestWorkerPool(
+        ScannerConfig(
+            concurrency=10,
+            manual_reserved_workers=2,
+            circuit_breaker_reserved_workers=1,
+            import_reserved_workers=3,
+            **config,
+        )
+    )
+
+
+def test_lane_capacity_keeps_the_reservations_of_higher_lanes():
+    pool = make_pool()
+
+    assert pool.lane_capacity(TaskLane.MANUAL) == 10
+    assert pool.lane_capacity(TaskLane.CIRCUIT_BREAKER) == 8
+    assert pool.lane_capacity(TaskLane.IMPORT) == 7
+    assert pool.lane_capacity(TaskLane.PERIODIC) == 4
+
+    pool._lane_in_flight[TaskLane.MANUAL] = 2
+    pool._lane_in_flight[TaskLane.PERIODIC] = 4
+
+    assert pool.lane_capacity(TaskLane.PERIODIC) == 0
+    assert pool.lane_capacity(TaskLane.MANUAL) == 4
+
+
+@pytest.fixture
+def claims(monkeypatch) -> list[tuple[TaskLane, int]]:
+    """Every claim_due_tasks call as (lane, limit), answered with one due manual task"""
+    claims: list[tuple[TaskLane, int]] = []
+
+    async def claim_due_tasks(session: Any, worker_id: str, limit: int, lane: TaskLane):
+        claims.append((lane, limit))
+        return [(100, 1)] if lane == TaskLane.MANUAL else []
+
+    @contextlib.asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(worker, "claim_due_tasks", claim_due_tasks)
+    monkeypatch.setattr(worker.sessionmanager, "session", session)
+    return claims
+
+
+def test_claim_loop_claims_lanes_in_priority_order(monkeypatch):
+    pool = make_pool(poll_interval_seconds=0)
+    claims: list[tuple[TaskLane, int]] = []
+
+    async def claim_due_tasks(session: Any, worker_id: str, limit: int, lane: TaskLane):
+        claims.append((lane, limit))
+        if lane == TaskLane.PERIODIC:
+            pool.is_running = False
+            return [(1, 10)]
+        return [(2, 20)] if lane == TaskLane.MANUAL else []
+
+    @contextlib.asynccontextmanager
+    async def session():
+        yield None
+
+    monkeypatch.setattr(worker, "claim_due_tasks", claim_due_tasks)
+    monkeypatch.setattr(worker.sessionmanager, "session", session)
+    pool.is_running = True
+    asyncio.run(pool._claim_loop())
+
+    # Each lane gets the free workers minus the reservations of the lanes above it
+    assert claims == [
+        (TaskLane.MANUAL, 10),
+        (TaskLane.CIRCUIT_BREAKER, 8),
+        (TaskLane.IMPORT, 7),
+        (TaskLane.PERIODIC, 4),
+    ]
+    # Manual tasks run first whatever their ID
+    assert pool._queue.get_nowait()[1:] == (2, 20, TaskLane.MANUAL)
+    assert pool._queue.get_nowait()[1:] == (1, 10, TaskLane.PERIODIC)
+
+
+def test_preempt_periodic_stops_one_test_per_claimed_task(claims):
+    async def preempt() -> tuple[worker.TestWorkerPool, list[asyncio.Task]]:
+        pool = make_pool()
+        jobs = [asyncio.create_task(asyncio.sleep(10)) for _ in range(3)]
+        for task_id, job in enumerate(jobs):
+            pool._jobs[task_id] = (job, TaskLane.PERIODIC)
+        await pool._preempt_periodic()
+        await asyncio.sleep(0)
+        for job in jobs:
+            job.cancel()
+        return pool, jobs
+
+    pool, jobs = asyncio.run(preempt())
+
+    # Up to one urgent task per running periodic test, manual first
+    assert claims == [(TaskLane.MANUAL, 3), (TaskLane.CIRCUIT_BREAKER, 2)]
+    assert pool._preempted == {0}
+    assert pool.lane_in_flight[TaskLane.MANUAL] == 1
+    assert pool._queue.get_nowait() == (0, 100, 1, TaskLane.MANUAL)
+
+
+def test_preempt_periodic_claims_nothing_without_periodic_tests(claims):
+    pool = make_pool()
+
+    asyncio.run(pool._preempt_periodic())
+
+    assert claims == []
+    assert pool._preempted == set()
+
+
+def test_worker_process_migrates_before_testing_and_shuts_down_on_sigterm(monkeypatch):
+    steps: list[str] = []
+
+    def step(name: str, result: Any = None) -> Any:
+        async def record(*args: Any) -> Any:
+            steps.append(name)
+            return result
+
+        return record
+
+    class FakePool:
+        def __init__(self, config: ScannerConfig):
+            self.config = config
+
+        async def start(self) -> None:
+            steps.append("pool started")
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        async def shutdown(self) -> None:
+            steps.append("pool shut down")
+
+    publisher = SimpleNamespace(
+        register=lambda name, stats: steps.append(f"publish {name}"),
+        start=step("publisher started"),
+        shutdown=step("publisher shut down"),
+    )
+    monkeypatch.setattr(worker, "create_db_and_tables", step("tables created"))
+    monkeypatch.setattr(worker, "run_migrations", step("migrated"))
+    monkeypatch.setattr(worker, "get_stats_publisher", lambda: publisher)
+    monkeypatch.setattr(worker, "TestWorkerPool", FakePool)
+    monkeypatch.setattr(worker, "get_scan_connector", lambda: SimpleNamespace(close=step("closed")))
+    monkeypatch.setattr(worker, "configure_tiktoken_cache", lambda config: None)
+    monkeypatch.setattr(worker.sessionmanager, "_engine", None)
+
+    asyncio.run(worker.run_worker_process(ScannerConfig(concurrency=3)))
+
+    assert steps == [
+        "tables created",
+        "migrated",
+        f"publish {worker.TOKEN_COUNTER_STATS}",
+        f"publish {worker.SCAN_CONNECTOR_STATS}",
+        "publisher started",
+        "pool started",
+        "pool shut down",
+        "publisher shut down",
+        "closed",
+    ]
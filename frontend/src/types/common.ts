@@ -68,4 +68,5 @@ export enum TaskStatusEnum {
   RUNNING = "running",
   DONE = "done",
   FAILED = "failed",
+  CANCELLED = "cancelled",
 }
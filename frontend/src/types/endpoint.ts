@@ -80,6 +80,7 @@ export interface BatchOperationResult {
     // 失败的节点ID及原因
     [key: string]: string;
   };
+  job_id?: number | null; // 执行该操作的后台任务 ID
 }
 
 // 端点任务信息